@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Pipeline Benchmark on a Synthetic ACISS Corpus
+Measures throughput and peak memory of every transform and validation stage and saves the
+results as JSON so runs can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, "/root/repo/epub-processing")
+from preservation_manifest import PreservationManifest, fingerprint_content
+from script_loader import load_script
+from synthetic_corpus import parse_size, write_corpus
+
+simple_transformer = load_script("simple-transformer.py")
+chapter_transformer = load_script("chapter-transformer.py")
+part_divider_processor = load_script("part-divider-processor.py")
+validate_content = load_script("validate-content.py")
+validate_all = load_script("validate-all.py", Path(__file__).resolve().parent)
+
+RESULTS_DIR = Path("/root/repo/benchmarks")
+
+class Stage:
+    """One benchmarked function, the files it runs on and the contents it is handed."""
+
+    def __init__(self, name, kind, reads, run):
+        self.name = name
+        self.kind = kind
+        self.reads = reads
+        self.run = run
+
+def stream_to_null(source_path):
+    with open(source_path, 'rb') as source, open(os.devnull, 'wb') as output:
+        chapter_transformer.stream_aciss_structure(source, output)
+
+def make_stages(manifest):
+    # Every stage is called as run(source path, output path, source content, output content)
+    return [
+        Stage('transform_chapter_to_aciss', 'chapter', ('source',),
+              lambda sp, op, source, output: simple_transformer.transform_chapter_to_aciss(source)),
+        Stage('transform_to_aciss_structure', 'chapter', ('source',),
+              lambda sp, op, source, output: chapter_transformer.transform_to_aciss_structure(source, sp.name)),
+        Stage('stream_aciss_structure', 'chapter', (),
+              lambda sp, op, source, output: stream_to_null(sp)),
+        Stage('process_part_divider', 'part', ('source',),
+              lambda sp, op, source, output: part_divider_processor.process_part_divider(source)),
+        Stage('extract_text_content', 'all', (),
+              lambda sp, op, source, output: validate_content.extract_text_content(sp)),
+        Stage('fingerprint_content', 'all', ('source',),
+              lambda sp, op, source, output: fingerprint_content(source)),
+        Stage('check_preservation', 'all', ('source', 'output'),
+              lambda sp, op, source, output: validate_content.check_preservation(manifest, sp, op, output, source)),
+        Stage('check_aciss_compliance', 'chapter', ('output',),
+              lambda sp, op, source, output: validate_all.check_aciss_compliance(output)),
+    ]
+
+def kind_of(path):
+    return 'part' if '-Part-' in path.name else 'chapter'
+
+def transform_corpus(sources, output_dir):
+    """Produce the outputs the validation stages check, the way process-all-chapters would."""
+    output_dir.mkdir(exist_ok=True)
+    for source_path in sources:
+        source = source_path.read_text(encoding='utf-8')
+        if kind_of(source_path) == 'part':
+            output = part_divider_processor.process_part_divider(source)
+        else:
+            output = simple_transformer.transform_chapter_to_aciss(source)
+        (output_dir / source_path.name).write_text(output, encoding='utf-8')
+
+def load_arguments(stage, source_path, output_dir):
+    """Read what a stage needs outside the timed call; return (arguments, bytes processed)."""
+    output_path = output_dir / source_path.name
+    source = source_path.read_text(encoding='utf-8') if 'source' in stage.reads else None
+    output = output_path.read_text(encoding='utf-8') if 'output' in stage.reads else None
+    if stage.reads:
+        size = sum(len(text.encode('utf-8')) for text in (source, output) if text is not None)
+    else:
+        size = source_path.stat().st_size
+    return (source_path, output_path, source, output), size
+
+def run_stage(stage, files, output_dir, memory_sample):
+    """Time a stage over every file, then trace its peak allocation on a sample of them."""
+    seconds = 0.0
+    total_bytes = 0
+    for source_path in files:
+        arguments, size = load_arguments(stage, source_path, output_dir)
+        start = time.perf_counter()
+        stage.run(*arguments)
+        seconds += time.perf_counter() - start
+        total_bytes += size
+
+    # Tracing slows every allocation down, so it is kept out of the timed pass
+    peak = 0
+    sample = sorted(files, key=lambda p: p.stat().st_size, reverse=True)[:memory_sample]
+    tracemalloc.start()
+    try:
+        for source_path in sample:
+            arguments, _ = load_arguments(stage, source_path, output_dir)
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            stage.run(*arguments)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+            del arguments
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'files': len(files),
+        'bytes': total_bytes,
+        'seconds': round(seconds, 6),
+        'mb_per_second': round(total_bytes / 1024 / 1024 / seconds, 3) if seconds else None,
+        'files_per_second': round(len(files) / seconds, 3) if seconds else None,
+        'peak_memory_bytes': peak,
+    }
+
+def compare_results(current, previous):
+    """Print the throughput change of every stage against an earlier results file."""
+    print(f"\n📊 Compared with {previous['created']}")
+    print("-" * 70)
+    if previous.get('corpus') != current['corpus']:
+        print("⚠️  The corpora differ; throughput is only comparable at similar chapter sizes")
+    for name, stats in current['stages'].items():
+        old = previous.get('stages', {}).get(name)
+        if not old or not old.get('mb_per_second') or not stats['mb_per_second']:
+            print(f"   {name:<30} no earlier result")
+            continue
+        ratio = stats['mb_per_second'] / old['mb_per_second']
+        marker = "🚀" if ratio >= 1.05 else "🐢" if ratio <= 0.95 else "➖"
+        memory = stats['peak_memory_bytes'] - old['peak_memory_bytes']
+        print(f"   {marker} {name:<30} {ratio:6.2f}x throughput, {memory / 1024:+10.1f} KB peak memory")
+
+def benchmark(corpus_dir, chapters, chapter_bytes, chapters_per_part, seed, stage_names, memory_sample):
+    """Generate the corpus, run every stage over it and return the results."""
+    print(f"🏗️  Generating {chapters} chapters of {chapter_bytes / 1024:.0f} KB in {corpus_dir}")
+    start = time.perf_counter()
+    sources = write_corpus(corpus_dir / "input", chapters, chapter_bytes, chapters_per_part, seed)
+    total_bytes = sum(path.stat().st_size for path in sources)
+    print(f"   {len(sources)} files, {total_bytes / 1024 / 1024:.1f} MB in {time.perf_counter() - start:.1f}s")
+
+    output_dir = corpus_dir / "output"
+    transform_corpus(sources, output_dir)
+
+    manifest = PreservationManifest(corpus_dir / ".preservation-manifest.json")
+    stages = [stage for stage in make_stages(manifest) if not stage_names or stage.name in stage_names]
+
+    results = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'corpus': {
+            'chapters': chapters,
+            'parts': sum(1 for path in sources if kind_of(path) == 'part'),
+            'chapter_bytes': chapter_bytes,
+            'total_bytes': total_bytes,
+            'seed': seed,
+        },
+        'stages': {},
+    }
+
+    print(f"\n{'Stage':<32}{'Files':>7}{'MB/s':>10}{'Files/s':>10}{'Peak MB':>10}")
+    print("-" * 69)
+    for stage in stages:
+        files = [path for path in sources if stage.kind in ('all', kind_of(path))]
+        stats = run_stage(stage, files, output_dir, memory_sample)
+        results['stages'][stage.name] = stats
+        print(f"{stage.name:<32}{stats['files']:>7}{stats['mb_per_second'] or 0:>10.2f}"
+              f"{stats['files_per_second'] or 0:>10.1f}{stats['peak_memory_bytes'] / 1024 / 1024:>10.2f}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on a synthetic ACISS corpus.")
+    parser.add_argument("--chapters", "-n", type=int, default=20, help="number of chapters (default: 20)")
+    parser.add_argument("--chapter-size", "-s", default="36KB", help="size of each chapter, e.g. 10KB or 10MB (default: 36KB)")
+    parser.add_argument("--chapters-per-part", type=int, default=4, help="chapters between part dividers (default: 4)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the generated text (default: 0)")
+    parser.add_argument("--stage", action="append", dest="stages", metavar="NAME", help="only run this stage (repeatable)")
+    parser.add_argument("--memory-sample", type=int, default=3,
+                        help="number of largest files traced for peak memory (default: 3)")
+    parser.add_argument("--corpus-dir", help="generate the corpus here and keep it (default: a temporary folder)")
+    parser.add_argument("--output", "-o", help="results file (default: benchmarks/<timestamp>.json)")
+    parser.add_argument("--compare", metavar="FILE", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    print("⏱️  PIPELINE BENCHMARK")
+    print("=" * 69)
+
+    chapter_bytes = parse_size(args.chapter_size)
+    if args.corpus_dir:
+        corpus_dir = Path(args.corpus_dir)
+        corpus_dir.mkdir(parents=True, exist_ok=True)
+        results = benchmark(corpus_dir, args.chapters, chapter_bytes, args.chapters_per_part,
+                            args.seed, args.stages, args.memory_sample)
+    else:
+        with tempfile.TemporaryDirectory(prefix="aciss-benchmark-") as tmp:
+            results = benchmark(Path(tmp), args.chapters, chapter_bytes, args.chapters_per_part,
+                                args.seed, args.stages, args.memory_sample)
+
+    if args.output:
+        output_file = Path(args.output)
+    else:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        output_file = RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results saved to {output_file}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare_results(results, json.load(f))
+    return True
+
+if __name__ == "__main__":
+    try:
+        success = main()
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"💥 Benchmark error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
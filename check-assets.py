@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Asset Reference Check for the EPUB Package
+Reports missing and mis-cased references, manifest gaps and orphaned files from the asset graph.
+"""
+import argparse
+import sys
+
+sys.path.insert(0, "/root/repo/epub-processing")
+from asset_graph import OPF_SOURCE, AssetGraph
+
+def main():
+    parser = argparse.ArgumentParser(description="Check asset references in Complete/OEBPS.")
+    parser.add_argument("--uses", metavar="FILE", help="list the documents that reference FILE (relative to OEBPS)")
+    args = parser.parse_args()
+
+    graph = AssetGraph()
+    reindexed = graph.update()
+
+    if args.uses:
+        for user in graph.users_of(args.uses):
+            print(user)
+        return True
+
+    print("🔗 ASSET REFERENCE CHECK")
+    print("=" * 70)
+    print(f"📁 {len(graph.files)} files, {len(graph.sources)} indexed documents ({reindexed} re-indexed)")
+
+    all_ok = True
+
+    missing = graph.missing()
+    manifest_missing = [m for m in missing if m[0] == OPF_SOURCE]
+    document_missing = [m for m in missing if m[0] != OPF_SOURCE]
+
+    print("\n1. DOCUMENT REFERENCES")
+    print("-" * 40)
+    if not document_missing:
+        print("✅ All references from XHTML and CSS resolve")
+    for source, raw, target, case_match in document_missing:
+        all_ok = False
+        if case_match:
+            print(f"❌ {source}: {raw} differs in case from {case_match}")
+        else:
+            print(f"❌ {source}: missing {raw}")
+
+    print("\n2. OPF MANIFEST")
+    print("-" * 40)
+    if not manifest_missing:
+        print(f"✅ All {len(graph.manifest_items())} manifest items exist")
+    for _, raw, target, case_match in manifest_missing:
+        all_ok = False
+        if case_match:
+            print(f"❌ Manifest item {raw} differs in case from {case_match}")
+        else:
+            print(f"❌ Manifest item not found: {raw}")
+    for target in graph.unlisted():
+        all_ok = False
+        print(f"❌ {target} is referenced by {', '.join(graph.users_of(target))} but not in the manifest")
+
+    print("\n3. FILE NAMES AND ORPHANS")
+    print("-" * 40)
+    for group in graph.case_collisions():
+        all_ok = False
+        print(f"❌ File names differ only by case: {', '.join(group)}")
+    orphans = graph.orphans()
+    for orphan in orphans:
+        print(f"⚠️  Not referenced anywhere: {orphan}")
+    if not orphans:
+        print("✅ Every file is referenced")
+
+    print("\n" + "=" * 70)
+    if all_ok:
+        print("🎉 All asset references are consistent")
+    else:
+        print("⚠️  Asset reference problems found")
+    return all_ok
+
+if __name__ == "__main__":
+    try:
+        success = main()
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"💥 Asset check error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
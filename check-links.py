@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Link and Endnote Check for the EPUB Package
+Reports dangling links, endnotes without backlinks, duplicate ids and unused endnotes across the book.
+"""
+import argparse
+import sys
+
+sys.path.insert(0, "/root/repo/epub-processing")
+from link_index import LinkIndex
+
+SECTIONS = (
+    ('dangling', "DANGLING REFERENCES", "All in-book links resolve", '❌'),
+    ('backlink', "ENDNOTE BACKLINKS", "Every referenced endnote links back", '❌'),
+    ('duplicate', "DUPLICATE IDS", "No id is used twice in a document", '❌'),
+    ('unused', "UNUSED ENDNOTES", "Every endnote is referenced", '⚠️ '),
+)
+
+def main():
+    parser = argparse.ArgumentParser(description="Check in-book links and endnotes in Complete/OEBPS.")
+    parser.add_argument("--document", metavar="FILE", help="only report problems in FILE (relative to OEBPS)")
+    args = parser.parse_args()
+
+    index = LinkIndex()
+    rechecked = index.update()
+    counts = index.counts()
+
+    print("🔗 LINK AND ENDNOTE CHECK")
+    print("=" * 70)
+    print(f"📁 {len(index.documents)} documents, {counts['ids']} ids, {counts['links']} in-book links, "
+          f"{counts['notes']} endnotes ({len(rechecked)} re-checked)")
+
+    all_ok = True
+    for number, (kind, title, clean, icon) in enumerate(SECTIONS, 1):
+        problems = [problem for problem in index.problems_of_kind(kind)
+                    if args.document is None or problem[0] == args.document]
+        print(f"\n{number}. {title}")
+        print("-" * 40)
+        if not problems:
+            print(f"✅ {clean}")
+        for document, line, message in problems:
+            print(f"{icon} {document}:{line}: {message}")
+        if problems and icon == '❌':
+            all_ok = False
+
+    print("\n" + "=" * 70)
+    if all_ok:
+        print("🎉 All links and endnotes are consistent")
+    else:
+        print("⚠️  Link problems found")
+    return all_ok
+
+if __name__ == "__main__":
+    try:
+        success = main()
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"💥 Link check error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -8,11 +8,20 @@ Comprehensive validation script to ensure all chapters retain:
 """
 
 import os
-import re
+import sys
 from pathlib import Path
 from lxml import etree
 import difflib
 
+sys.path.insert(0, "/root/repo/epub-processing")
+from asset_graph import AssetGraph, is_image
+from document_cache import DocumentCache
+
+def parse_xhtml(content):
+    """Parse XHTML text with lxml"""
+    parser = etree.XMLParser()
+    return etree.fromstring(content.encode('utf-8'), parser)
+
 def validate_file_structure():
     """Check that all expected files exist"""
     text_dir = Path("/root/repo/Complete/OEBPS/text")
@@ -46,15 +55,15 @@ def validate_file_structure():
         print("✅ All expected files present")
         return True
 
-def validate_xhtml_structure(file_path):
+def validate_xhtml_structure(file_path, documents=None):
     """Validate XHTML structure and check for errors"""
+    documents = documents or DocumentCache(parse_xhtml)
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Parse XHTML
-        parser = etree.XMLParser()
-        doc = etree.fromstring(content.encode('utf-8'), parser)
+        with documents.open(file_path) as document:
+            content = document.text
+            
+            # Parse XHTML
+            doc = document.tree
         
         errors = []
         
@@ -80,11 +89,12 @@ def validate_xhtml_structure(file_path):
     except Exception as e:
         return False, [f"XML parsing error: {str(e)}"]
 
-def validate_content_sections(file_path):
+def validate_content_sections(file_path, documents=None):
     """Check that all expected content sections are present"""
+    documents = documents or DocumentCache(parse_xhtml)
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        with documents.open(file_path) as document:
+            content = document.text
         
         sections_found = []
         
@@ -165,33 +175,63 @@ def validate_font_and_css_integration():
     except Exception as e:
         return False, f"Error reading CSS: {str(e)}"
 
-def validate_image_references():
+def load_asset_graph():
+    """Bring the asset reference graph up to date"""
+    graph = AssetGraph()
+    graph.update()
+    return graph
+
+def find_image_issues(xhtml_file, graph=None):
+    """Check the image references of one file against the asset graph"""
+    graph = graph or load_asset_graph()
+    
+    image_issues = []
+    
+    try:
+        source = Path(xhtml_file).relative_to(graph.oebps_dir).as_posix()
+        for _, img_src, target, case_match in graph.missing([source]):
+            if not is_image(target):
+                continue
+            if case_match:
+                image_issues.append(f"{xhtml_file.name}: Image {img_src} differs in case from {case_match}")
+            else:
+                image_issues.append(f"{xhtml_file.name}: Missing image {img_src}")
+                        
+    except Exception as e:
+        image_issues.append(f"{xhtml_file.name}: Error checking images - {str(e)}")
+    
+    return image_issues
+
+def validate_image_references(graph=None):
     """Check that image references are correct"""
     text_dir = Path("/root/repo/Complete/OEBPS/text")
-    images_dir = Path("/root/repo/Complete/OEBPS/images")
+    graph = graph or load_asset_graph()
     
     image_issues = []
-    
     for xhtml_file in text_dir.glob("*.xhtml"):
-        try:
-            with open(xhtml_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Find image references
-            img_tags = re.findall(r'<img[^>]+src=["\']([^"\']+)["\'][^>]*>', content)
-            
-            for img_src in img_tags:
-                # Convert relative path to absolute
-                if img_src.startswith('../images/'):
-                    img_path = images_dir / img_src.replace('../images/', '')
-                    if not img_path.exists():
-                        image_issues.append(f"{xhtml_file.name}: Missing image {img_src}")
-                        
-        except Exception as e:
-            image_issues.append(f"{xhtml_file.name}: Error checking images - {str(e)}")
+        image_issues.extend(find_image_issues(xhtml_file, graph))
     
     return len(image_issues) == 0, image_issues
 
+def run_document_checks(xhtml_files):
+    """Run every per-file check, one file at a time, reading and parsing each file once"""
+    documents = DocumentCache(parse_xhtml)
+    graph = load_asset_graph()
+    results = []
+    
+    for xhtml_file in xhtml_files:
+        is_chapter = 'chapter' in xhtml_file.name.lower()
+        # Structure and (for chapters) content checks share the document;
+        # it is released as soon as the last of them is done with it
+        documents.expect(xhtml_file, 2 if is_chapter else 1)
+        
+        structure = validate_xhtml_structure(xhtml_file, documents)
+        sections = validate_content_sections(xhtml_file, documents) if is_chapter else None
+        image_issues = find_image_issues(xhtml_file, graph)
+        results.append((xhtml_file, structure, sections, image_issues))
+    
+    return results
+
 def main():
     """Run comprehensive validation"""
     print("🔍 COMPREHENSIVE EPUB CONTENT VALIDATION")
@@ -206,14 +246,17 @@ def main():
     if not structure_ok:
         all_passed = False
     
+    # Per-file checks run together so each file is read and parsed once;
+    # their results are reported phase by phase below
+    text_dir = Path("/root/repo/Complete/OEBPS/text")
+    document_results = run_document_checks(sorted(text_dir.glob("*.xhtml")))
+    
     # 2. XHTML validation for each file
     print("\n2. XHTML STRUCTURE VALIDATION")
     print("-" * 30)
-    text_dir = Path("/root/repo/Complete/OEBPS/text")
     xhtml_errors = 0
     
-    for xhtml_file in sorted(text_dir.glob("*.xhtml")):
-        valid, errors = validate_xhtml_structure(xhtml_file)
+    for xhtml_file, (valid, errors), _, _ in document_results:
         if valid:
             print(f"✅ {xhtml_file.name}: Valid XHTML")
         else:
@@ -227,9 +270,8 @@ def main():
     print("\n3. CONTENT SECTIONS VALIDATION")
     print("-" * 30)
     
-    for xhtml_file in sorted(text_dir.glob("*.xhtml")):
-        if 'chapter' in xhtml_file.name.lower():
-            sections = validate_content_sections(xhtml_file)
+    for xhtml_file, _, sections, _ in document_results:
+        if sections is not None:
             print(f"📄 {xhtml_file.name}:")
             for section in sections:
                 print(f"    ✅ {section}")
@@ -250,7 +292,11 @@ def main():
     # 5. Image reference validation
     print("\n5. IMAGE REFERENCE VALIDATION")
     print("-" * 30)
-    images_ok, image_issues = validate_image_references()
+    # Issues are listed in directory order, as the standalone check reports them
+    issues_by_file = {xhtml_file: issues for xhtml_file, _, _, issues in document_results}
+    image_issues = [issue for xhtml_file in text_dir.glob("*.xhtml")
+                    for issue in issues_by_file.get(xhtml_file, [])]
+    images_ok = len(image_issues) == 0
     if images_ok:
         print("✅ All image references are valid")
     else:
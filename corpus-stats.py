@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Corpus Statistics for EPUB Books
+Reports word counts, reading time, sentence lengths and section balance per document and section for
+one or more books, and writes the book's length and reading time into its OPF metadata.
+"""
+import argparse
+import math
+import re
+import sys
+from pathlib import Path
+
+sys.path.insert(0, "/root/repo/epub-processing")
+from corpus_stats import QUANTILES, WORDS_PER_MINUTE, WORDS_PER_PAGE, CorpusStats, reading_minutes
+from output_writer import write_if_changed
+from text_index import OEBPS_DIR
+
+# Properties written after schema:numberOfPages, in this order
+LENGTH_PROPERTIES = ('schema:numberOfPages', 'schema:wordCount', 'schema:timeRequired')
+
+def iso_duration(minutes):
+    """ISO 8601 duration of a reading time, rounded to the minute (e.g. PT7H25M)."""
+    hours, minutes = divmod(max(1, round(minutes)), 60)
+    return f"PT{hours}H{minutes}M" if hours else f"PT{minutes}M"
+
+def set_metadata(opf_text, values):
+    """Set <meta property> values in an OPF, adding missing ones after the last length property present."""
+    for prop in LENGTH_PROPERTIES:
+        if prop not in values:
+            continue
+        pattern = re.compile(rf'(<meta property="{re.escape(prop)}">)[^<]*(</meta>)')
+        if pattern.search(opf_text):
+            opf_text = pattern.sub(lambda m: f"{m.group(1)}{values[prop]}{m.group(2)}", opf_text, count=1)
+            continue
+        anchor = None
+        for previous in LENGTH_PROPERTIES[:LENGTH_PROPERTIES.index(prop)]:
+            anchor = re.search(rf'\n([ \t]*)<meta property="{re.escape(previous)}">[^<]*</meta>', opf_text) or anchor
+        if anchor is None:
+            anchor = re.search(r'\n([ \t]*)<meta property="dcterms:modified">[^<]*</meta>', opf_text)
+        if anchor is None:
+            raise ValueError(f"no place for {prop} in the OPF metadata")
+        line = f'\n{anchor.group(1)}<meta property="{prop}">{values[prop]}</meta>'
+        opf_text = opf_text[:anchor.end()] + line + opf_text[anchor.end():]
+    return opf_text
+
+def format_ratio(value, spec):
+    return "—" if math.isnan(value) else format(value, spec)
+
+def main():
+    parser = argparse.ArgumentParser(description="Word counts, reading time and section balance of EPUB books.")
+    parser.add_argument("--book", action="append", type=Path, metavar="OEBPS_DIR",
+                        help=f"book to analyse, repeatable (default: {OEBPS_DIR})")
+    parser.add_argument("--sections", action="store_true", help="also list the sections of every document")
+    parser.add_argument("--no-opf", action="store_true", help="do not write the statistics into the OPF metadata")
+    args = parser.parse_args()
+
+    books = args.book or [OEBPS_DIR]
+    stats = CorpusStats(books)
+
+    print("📊 CORPUS STATISTICS")
+    print("=" * 70)
+    print(f"📁 {len(stats.books)} book(s), {len(stats.documents)} spine documents, {len(stats.sections)} sections, "
+          f"{len(stats.sentence_words)} sentences ({WORDS_PER_MINUTE} words/min, {WORDS_PER_PAGE} words/page)")
+    if stats.skipped:
+        print(f"ℹ️  Not counted (navigation or generated): {', '.join(stats.skipped)}")
+
+    quantile_names = '/'.join(f"p{round(q * 100)}" for q in QUANTILES)
+    for book, record in enumerate(stats.books):
+        words = int(stats.book_words[book])
+        print(f"\n📖 {record['title']}")
+        print("-" * 70)
+        print(f"{'Document':<44}{'Words':>7}{'Min':>5}  {'Sentence mean, ' + quantile_names:<26}"
+              f"{'Sections':>9}{'CV':>6}{'Max':>6}")
+        for doc in range(len(stats.documents)):
+            if stats.documents[doc]['book'] != book:
+                continue
+            name = stats.documents[doc]['path'].rsplit('/', 1)[-1]
+            if len(name) > 42:
+                name = name[:41] + '…'
+            sentences = (f"{format_ratio(stats.sentence_mean[doc], '.1f')}, "
+                         f"{'/'.join(format_ratio(value, '.0f') for value in stats.sentence_quantiles[doc])}")
+            print(f"{name:<44}{stats.document_words[doc]:>7}{reading_minutes(stats.document_words[doc]):>5.0f}  "
+                  f"{sentences:<26}{stats.body_sections[doc]:>9}"
+                  f"{format_ratio(stats.section_variation[doc], '.2f'):>6}"
+                  f"{format_ratio(stats.largest_share[doc], '.0%'):>6}")
+            if args.sections:
+                for heading, section_words, body in stats.document_sections(doc):
+                    marker = ' ' if body else '·'
+                    label = heading or '(opening)'
+                    if len(label) > 40:
+                        label = label[:39] + '…'
+                    print(f"  {marker} {label:<40}{section_words:>7}{reading_minutes(section_words):>5.0f}")
+
+        minutes = reading_minutes(words)
+        print(f"\n📝 {words:,} words, about {stats.pages(book)} pages, {minutes / 60:.1f} hours of reading")
+
+        if args.no_opf:
+            continue
+        if record['opf'] is None:
+            print("⚠️  No OPF found; metadata not written")
+            continue
+        opf_text = record['opf'].read_text(encoding='utf-8')
+        updated = set_metadata(opf_text, {'schema:numberOfPages': str(stats.pages(book)),
+                                          'schema:wordCount': str(words),
+                                          'schema:timeRequired': iso_duration(minutes)})
+        changed = write_if_changed(record['opf'], updated)
+        print(f"{'📝 Updated' if changed else '✅ Unchanged:'} {record['opf']}")
+
+    print("\n" + "=" * 70)
+    print("CV: spread of body section lengths relative to their mean; Max: share of the longest body section")
+    return True
+
+if __name__ == "__main__":
+    try:
+        success = main()
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"💥 Corpus statistics error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
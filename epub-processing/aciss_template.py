@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Shared ACISS Chapter Template
+Compiles the ACISS chapter layout once into static byte chunks and slots, then writes a chapter model
+into it chunk by chunk, copying every section straight from the source bytes it was extracted from.
+"""
+import io
+import re
+
+# Bytes copied from the source per read
+COPY_SIZE = 64 * 1024
+
+SLOT_PATTERN = re.compile(r'\{(\w+)\}')
+
+# A "&" that does not start an entity or character reference
+BARE_AMPERSAND_PATTERN = re.compile(r'&(?!(?:[A-Za-z][\w.-]*|#\d+|#x[0-9A-Fa-f]+);)')
+
+REFERENCE_PATTERN = re.compile(r'(&(?:[A-Za-z][\w.-]*|#\d+|#x[0-9A-Fa-f]+);)')
+
+# The ACISS chapter layout; {name} marks a slot
+CHAPTER_SKELETON = '''<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="en" lang="en">
+<head>
+    <meta charset="utf-8"/>
+    <title>Chapter {roman} - {title}</title>
+    <meta name="viewport" content="width=device-width, initial-scale=1"/>
+    <link rel="stylesheet" type="text/css" href="../styles/fonts.css"/>
+    <link rel="stylesheet" type="text/css" href="../styles/style.css"/>
+</head>
+<body class="chapter-page">
+
+<!-- PAGE 1: TITLE PAGE -->
+<section class="chap-title">
+    <!-- Roman numeral with brushstroke background - TOP CENTERED -->
+    <div class="chapter-number-container">
+        <div class="chapter-number-brush">
+            <img class="brushstroke-img" src="../images/brushstroke.JPEG" alt="" />
+            <div class="chapter-number-text">{roman}</div>
+        </div>
+    </div>
+    
+    <!-- Vertical title stack with accent bar -->
+    <div class="chapter-title-container">
+        <div class="title-stack">
+            <div class="title-bar"></div>
+            <div class="title-lines">
+                {title_lines}
+            </div>
+        </div>
+    </div>
+    
+    <!-- Bible quote in pill container -->
+    <div class="bible-quote-container">
+        <div class="bible-quote-text">{quote_text}</div>
+        <div class="bible-quote-reference">{quote_ref}</div>
+    </div>
+    
+    <!-- Introduction -->
+    <div class="introduction-heading">Introduction</div>
+    <div class="introduction-paragraph dropcap-first-letter">
+        {introduction}
+    </div>
+</section>
+
+<!-- PAGE BREAK -->
+<div class="page-break"></div>
+
+<!-- PAGES 2-4: BODY CONTENT -->
+<section class="chap-body">
+    <div class="content-area">
+{body}
+    </div>
+</section>
+
+<!-- PAGE BREAK -->
+<div class="page-break"></div>
+
+<!-- PAGE 5: ENDNOTES -->
+<aside class="endnotes">
+    {endnotes}
+</aside>
+
+<!-- PAGE BREAK -->
+<div class="page-break"></div>
+
+<!-- PAGE 6: QUIZ & WORKSHEET -->
+<section class="quiz-container chap-quiz avoid-break">
+    {quiz}
+</section>
+
+<section class="worksheet avoid-break">
+    {worksheet}
+</section>
+
+<!-- CLOSING -->
+<section class="closing">
+    {closing}
+</section>
+
+</body>
+</html>'''
+
+def escape_text(text):
+    """Escape text taken from the source for XHTML, leaving its entity references as they are."""
+    return BARE_AMPERSAND_PATTERN.sub('&amp;', text).replace('<', '&lt;').replace('>', '&gt;')
+
+def upper_text(text):
+    """Upper-case escaped text without touching its entity references (&amp; must stay &amp;)."""
+    return ''.join(part if index % 2 else part.upper() for index, part in enumerate(REFERENCE_PATTERN.split(text)))
+
+def break_title_into_lines(title_words, max_lines=6):
+    """Break title words into vertical lines (3-6 lines maximum)."""
+    if len(title_words) <= max_lines:
+        return title_words
+
+    # For longer titles, combine shorter words
+    lines = []
+    current_line = []
+    for word in title_words:
+        if len(word) <= 3 and len(current_line) == 1 and len(current_line[0]) <= 4:
+            current_line.append(word)
+        else:
+            if current_line:
+                lines.append(' '.join(current_line))
+            current_line = [word]
+
+    if current_line:
+        lines.append(' '.join(current_line))
+
+    return lines[:max_lines]
+
+def title_lines_html(lines):
+    """The title stack's lines, each upper-cased in its own title-line div."""
+    return '\n                '.join(f'<div class="title-line">{upper_text(escape_text(line))}</div>' for line in lines)
+
+# How each field slot turns its value into XHTML; every other slot is a section copied from the source
+CHAPTER_ESCAPES = {
+    'roman': escape_text,
+    'title': escape_text,
+    'title_lines': title_lines_html,
+}
+
+def read_range(source, start, end):
+    """Bytes start:end of a seekable binary source, in pieces of at most COPY_SIZE."""
+    source.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        chunk = source.read(min(COPY_SIZE, remaining))
+        if not chunk:
+            break
+        yield chunk
+        remaining -= len(chunk)
+
+class Slot:
+    """A place in a compiled template: a field escaped on the way in, or a section copied raw."""
+    __slots__ = ('name', 'escape')
+
+    def __init__(self, name, escape=None):
+        self.name = name
+        self.escape = escape
+
+class CompiledTemplate:
+    """A template split once into encoded static chunks and the slots between them.
+
+    Rendering yields the chunks and each slot's bytes in order, so an output
+    is written piece by piece with writelines and the document is never
+    joined into one string.
+    """
+    __slots__ = ('pieces',)
+
+    def __init__(self, text, escapes, encoding='utf-8'):
+        self.pieces = []
+        for index, piece in enumerate(SLOT_PATTERN.split(text)):
+            if index % 2:
+                self.pieces.append(Slot(piece, escapes.get(piece)))
+            elif piece:
+                self.pieces.append(piece.encode(encoding))
+
+    def chunks(self, fields, sections, source, encoding='utf-8'):
+        """Yield the rendered bytes: fields from the fields dict, sections as (start, end) ranges of source."""
+        for piece in self.pieces:
+            if isinstance(piece, bytes):
+                yield piece
+            elif piece.escape is not None:
+                yield piece.escape(fields[piece.name]).encode(encoding)
+            else:
+                for start, end in sections.get(piece.name, ()):
+                    yield from read_range(source, start, end)
+
+CHAPTER_TEMPLATE = CompiledTemplate(CHAPTER_SKELETON, CHAPTER_ESCAPES)
+
+def chapter_fields(model):
+    """The field slot values of a chapter model, before escaping."""
+    return {
+        'roman': model.roman,
+        'title': ' '.join(model.title_words) if model.title_words else "Chapter",
+        'title_lines': break_title_into_lines(model.title_words),
+    }
+
+def write_chapter(model, source, output):
+    """Write a chapter in ACISS structure to a binary output from its model and seekable binary source."""
+    output.writelines(CHAPTER_TEMPLATE.chunks(chapter_fields(model), model.sections, source))
+
+def render_chapter(model, source):
+    """The chapter in ACISS structure as text, from its model and the source bytes it was extracted from."""
+    return b''.join(CHAPTER_TEMPLATE.chunks(chapter_fields(model), model.sections, io.BytesIO(source))).decode('utf-8')
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Asset Reference Graph for the EPUB Package
+Indexes which documents reference which images, stylesheets, fonts and manifest items,
+updated incrementally and stored on disk.
+"""
+import json
+import os
+import posixpath
+import re
+from pathlib import Path
+from urllib.parse import unquote
+
+from build_cache import script_version
+from css_rules import strip_comments
+
+OEBPS_DIR = Path("/root/repo/Complete/OEBPS")
+GRAPH_FILE = Path("/root/repo/Complete/.asset-graph.json")
+
+# The OPF lives in text/ but its hrefs are relative to OEBPS/ (see package-epub.py)
+OPF_SOURCE = "text/content.opf"
+
+GRAPH_VERSION = script_version(__file__)
+
+SOURCE_SUFFIXES = {'.xhtml', '.html', '.css', '.opf'}
+IMAGE_SUFFIXES = {'.jpeg', '.jpg', '.png', '.gif', '.svg', '.webp'}
+
+XHTML_REF_PATTERN = re.compile(r'\s(?:src|href|xlink:href|poster)\s*=\s*(["\'])(.*?)\1', re.IGNORECASE)
+CSS_URL_PATTERN = re.compile(r'''url\(\s*(['"]?)(.*?)\1\s*\)''')
+CSS_IMPORT_PATTERN = re.compile(r'''@import\s+(["'])(.*?)\1''')
+OPF_ITEM_PATTERN = re.compile(r'<item\b[^>]*?\shref\s*=\s*(["\'])(.*?)\1', re.IGNORECASE)
+SCHEME_PATTERN = re.compile(r'^[a-zA-Z][a-zA-Z0-9+.-]*:')
+
+def extract_references(relative_path, content):
+    """Return the raw local references of one source file, in document order."""
+    suffix = posixpath.splitext(relative_path)[1].lower()
+    if relative_path == OPF_SOURCE or suffix == '.opf':
+        return [m.group(2) for m in OPF_ITEM_PATTERN.finditer(content)]
+    if suffix == '.css':
+        css = strip_comments(content)
+        return [m.group(2) for m in CSS_URL_PATTERN.finditer(css)] + \
+               [m.group(2) for m in CSS_IMPORT_PATTERN.finditer(css)]
+    return [m.group(2) for m in XHTML_REF_PATTERN.finditer(content)]
+
+def resolve_reference(relative_path, raw):
+    """Resolve a raw href against its source, relative to OEBPS; None for external or in-page links."""
+    href = raw.strip().split('#', 1)[0].split('?', 1)[0]
+    if not href or SCHEME_PATTERN.match(href) or href.startswith('/'):
+        return None
+    base = '' if relative_path == OPF_SOURCE else posixpath.dirname(relative_path)
+    return posixpath.normpath(posixpath.join(base, unquote(href)))
+
+def is_image(target):
+    return posixpath.splitext(target)[1].lower() in IMAGE_SUFFIXES
+
+class AssetGraph:
+    """Reference graph from XHTML, CSS and the OPF to the files of the package.
+
+    Each source file's references are stored with its mtime and size and
+    re-extracted only when those change. The files of the package are
+    listed with one directory scan per folder, so existence and
+    case-mismatch checks are set lookups instead of stat calls.
+    """
+
+    def __init__(self, oebps_dir=OEBPS_DIR, graph_file=GRAPH_FILE):
+        self.oebps_dir = Path(oebps_dir)
+        self.graph_file = Path(graph_file)
+        self.sources = {}
+        self.files = set()
+        self.files_by_lower = {}
+        self.users = {}
+        if self.graph_file.exists():
+            try:
+                with open(self.graph_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == GRAPH_VERSION:
+                    self.sources = data['sources']
+            except (OSError, ValueError, KeyError):
+                pass
+
+    def _scan(self, directory, prefix, found):
+        """List a folder once, recursing into subfolders; return {relative path: DirEntry}."""
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                relative = prefix + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    self._scan(entry.path, relative + '/', found)
+                else:
+                    found[relative] = entry
+        return found
+
+    def update(self):
+        """Rescan the package and re-index changed sources; return the number re-indexed."""
+        entries = self._scan(self.oebps_dir, '', {})
+        self.files = set(entries)
+        self.files_by_lower = {}
+        for relative in entries:
+            self.files_by_lower.setdefault(relative.lower(), []).append(relative)
+
+        changed = 0
+        for relative in list(self.sources):
+            if relative not in entries:
+                del self.sources[relative]
+                changed += 1
+
+        for relative, entry in entries.items():
+            if posixpath.splitext(relative)[1].lower() not in SOURCE_SUFFIXES:
+                continue
+            stat = entry.stat()
+            known = self.sources.get(relative)
+            if known and known['mtime_ns'] == stat.st_mtime_ns and known['size'] == stat.st_size:
+                continue
+            with open(entry.path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            references = []
+            for raw in extract_references(relative, content):
+                target = resolve_reference(relative, raw)
+                if target is not None:
+                    references.append([raw, target])
+            self.sources[relative] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'refs': references}
+            changed += 1
+
+        self.users = {}
+        for relative, source in self.sources.items():
+            for _, target in source['refs']:
+                self.users.setdefault(target, set()).add(relative)
+
+        if changed:
+            self.save()
+        return changed
+
+    def save(self):
+        """Write the graph atomically."""
+        tmp_file = self.graph_file.with_name(self.graph_file.name + '.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': GRAPH_VERSION, 'sources': self.sources}, f)
+        os.replace(tmp_file, self.graph_file)
+
+    def references(self, source):
+        """(raw href, resolved target) pairs of one source file."""
+        entry = self.sources.get(source)
+        return [tuple(ref) for ref in entry['refs']] if entry else []
+
+    def users_of(self, target):
+        """Source files that reference a target."""
+        return sorted(self.users.get(target, ()))
+
+    def exists(self, target):
+        return target in self.files
+
+    def case_match(self, target):
+        """The file a missing target matches when case is ignored, if exactly one does."""
+        matches = self.files_by_lower.get(target.lower(), [])
+        return matches[0] if len(matches) == 1 and matches[0] != target else None
+
+    def missing(self, sources=None):
+        """(source, raw href, target, case match or None) for every reference to a missing file."""
+        problems = []
+        for source in sorted(self.sources if sources is None else sources):
+            for raw, target in self.references(source):
+                if target not in self.files:
+                    problems.append((source, raw, target, self.case_match(target)))
+        return problems
+
+    def manifest_items(self):
+        """Targets listed in the OPF manifest, in manifest order."""
+        return [target for _, target in self.references(OPF_SOURCE)]
+
+    def unlisted(self):
+        """Existing files referenced by XHTML or CSS that the OPF manifest does not list."""
+        listed = set(self.manifest_items())
+        return sorted(target for target, users in self.users.items()
+                      if target in self.files and target not in listed and users - {OPF_SOURCE})
+
+    def orphans(self):
+        """Files nothing references, not even the OPF."""
+        return sorted(f for f in self.files if f != OPF_SOURCE and f not in self.users)
+
+    def case_collisions(self):
+        """Groups of files whose names differ only by case."""
+        return [sorted(group) for group in self.files_by_lower.values() if len(group) > 1]
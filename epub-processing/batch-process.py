@@ -2,12 +2,21 @@
 """
 Direct Batch Processing of All Chapters
 """
+import argparse
 import glob
 import sys
+import time
 from pathlib import Path
-from simple_transformer import process_chapter
 
-def main():
+from build_cache import BuildCache, local_modules, script_version
+from preservation_manifest import PreservationManifest
+from run_log import NULL_RUN_LOG, add_log_arguments, open_run_log
+from script_loader import SCRIPT_DIR, load_script
+from stage_profiler import NULL_PROFILER, StageProfiler, default_profile_output, profile_call
+
+process_chapter = load_script("simple-transformer.py").process_chapter
+
+def main(force=False, profile=NULL_PROFILER, profile_file=None, profile_output=None, run_log=NULL_RUN_LOG):
     input_dir = Path("/root/repo/epub-processing/input")
     output_dir = Path("/root/repo/epub-processing/output")
     
@@ -19,13 +28,41 @@ def main():
     
     success_count = 0
     failure_count = 0
+    changed_count = 0
+    
+    cache = BuildCache(force=force)
+    version = script_version(*local_modules(SCRIPT_DIR / "simple-transformer.py"))
+    manifest = PreservationManifest()
     
     for chapter_file in chapter_files:
         input_path = Path(chapter_file)
         output_path = output_dir / input_path.name
         
         try:
-            success = process_chapter(str(input_path), str(output_path))
+            cached = cache.lookup('transform', input_path.name, version, [input_path], output_path)
+            if cached is not None:
+                success = cached['success']
+                print(f"⏭️  Unchanged, skipping {input_path.name}")
+                run_log.file(input_path, output_path, 'success' if success else 'failed',
+                             reason=cached['reason'], cached=True, stats=cached)
+            else:
+                stats = {}
+                start = time.perf_counter()
+                if profile_file == input_path.name:
+                    success = profile_call(profile_output or default_profile_output(input_path.name),
+                                           process_chapter, str(input_path), str(output_path), manifest, profile, stats)
+                else:
+                    success = process_chapter(str(input_path), str(output_path), manifest, profile, stats)
+                elapsed = time.perf_counter() - start
+                if stats.get('changed'):
+                    changed_count += 1
+                reason = "" if success else "Content preservation issue"
+                cache.record('transform', input_path.name, version, [input_path], output_path,
+                             {'success': success, 'reason': reason, 'input_chars': stats.get('input_chars'),
+                              'output_chars': stats.get('output_chars')})
+                run_log.file(input_path, output_path, 'success' if success else 'failed',
+                             elapsed=elapsed, reason=reason, stats=stats)
+            
             if success:
                 success_count += 1
             else:
@@ -33,11 +70,17 @@ def main():
         except Exception as e:
             print(f"💥 {input_path.name}: {e}")
             failure_count += 1
+            run_log.file(input_path, output_path, 'error', reason=str(e))
+    
+    cache.save()
+    manifest.save()
+    run_log.summary(force=force, changed=changed_count)
     
     print("=" * 70)
     print(f"📊 BATCH PROCESSING COMPLETE:")
     print(f"   ✅ Successful: {success_count}")
     print(f"   ⚠️  With issues: {failure_count}")
+    print(f"   📝 Outputs changed: {changed_count}")
     
     if failure_count == 0:
         print("🎉 All chapters transformed successfully!")
@@ -47,5 +90,26 @@ def main():
         return success_count > 0
 
 if __name__ == "__main__":
-    success = main()
+    parser = argparse.ArgumentParser(description="Transform all chapters to ACISS.")
+    parser.add_argument("--force", action="store_true", help="ignore the build cache and reprocess every file")
+    parser.add_argument("--profile", action="store_true",
+                        help="time each stage of every file and print the slowest (implies --force)")
+    parser.add_argument("--profile-file", metavar="NAME", help="also profile this input file with cProfile")
+    parser.add_argument("--profile-output", metavar="PATH",
+                        help="where --profile-file writes: .prof for cProfile, .folded for flamegraph stacks "
+                             "(default: profiles/<name>.prof)")
+    add_log_arguments(parser)
+    args = parser.parse_args()
+    
+    profiling = args.profile or args.profile_file
+    profile = StageProfiler() if profiling else NULL_PROFILER
+    success = main(force=args.force or bool(profiling), profile=profile, profile_file=args.profile_file,
+                   profile_output=args.profile_output,
+                   run_log=open_run_log("batch-process", args.log, not args.no_log))
+    if profiling:
+        print()
+        for line in profile.report():
+            print(line)
+    if args.profile_file:
+        print(f"🔬 Profile of {args.profile_file}: {args.profile_output or default_profile_output(args.profile_file)}")
     sys.exit(0 if success else 1)
\ No newline at end of file
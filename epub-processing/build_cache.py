@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Incremental Build Cache for EPUB Processing
+Remembers transform and validation results keyed by content digests so unchanged files are skipped.
+"""
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+CACHE_FILE = Path("/root/repo/epub-processing/.build-cache.json")
+
+IMPORT_PATTERN = re.compile(r'^\s*(?:from\s+(\w+)\s+import|import\s+(\w+))', re.MULTILINE)
+
+def digest_bytes(data):
+    """Return the hex SHA-256 digest of some bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+def script_version(*script_paths):
+    """Digest the source of the scripts that produce a result, so code changes invalidate it."""
+    h = hashlib.sha256()
+    for script_path in script_paths:
+        with open(script_path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+def local_modules(script_path):
+    """The script and every module beside it that it imports, directly or through each other, sorted.
+
+    A result depends on all of them, so script_version(*local_modules(path))
+    changes whenever any code the script runs from this directory changes.
+    Standard library and third-party imports have no file beside the script
+    and are left out.
+    """
+    script_path = Path(script_path).resolve()
+    found = set()
+    pending = [script_path]
+    while pending:
+        path = pending.pop()
+        if path in found:
+            continue
+        found.add(path)
+        for names in IMPORT_PATTERN.findall(path.read_text(encoding='utf-8')):
+            module = script_path.with_name(f"{names[0] or names[1]}.py")
+            if module.exists():
+                pending.append(module)
+    return sorted(found)
+
+class BuildCache:
+    """Persistent cache of per-file stage results.
+
+    Each stage entry is keyed by the input file and stores the digest of the
+    input plus the producing script version, the digest of the output it
+    wrote, and the result. File digests are themselves cached against
+    (mtime, size), so an unchanged file costs one stat call per run.
+    """
+
+    def __init__(self, cache_file=CACHE_FILE, force=False):
+        self.cache_file = Path(cache_file)
+        self.force = force
+        self.data = {'files': {}, 'stages': {}}
+        if self.cache_file.exists():
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    self.data = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+    def file_digest(self, path):
+        """Digest a file, reusing the stored digest while its mtime and size are unchanged."""
+        path = Path(path)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+
+        key = str(path.resolve())
+        known = self.data['files'].get(key)
+        if known and known['mtime_ns'] == stat.st_mtime_ns and known['size'] == stat.st_size:
+            return known['sha256']
+
+        with open(path, 'rb') as f:
+            digest = digest_bytes(f.read())
+        self.data['files'][key] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': digest}
+        return digest
+
+    def _key(self, version, *input_paths):
+        return digest_bytes('\0'.join([version] + [self.file_digest(p) or '' for p in input_paths]).encode('utf-8'))
+
+    def lookup(self, stage, name, version, input_paths, output_path):
+        """Return the cached result if the inputs and the output on disk are unchanged, else None."""
+        if self.force:
+            return None
+
+        entry = self.data['stages'].get(stage, {}).get(name)
+        if not entry or entry['key'] != self._key(version, *input_paths):
+            return None
+        if self.file_digest(output_path) != entry['output']:
+            return None
+        return entry['result']
+
+    def record(self, stage, name, version, input_paths, output_path, result):
+        """Store the result of a stage run for later lookups."""
+        self.data['stages'].setdefault(stage, {})[name] = {
+            'key': self._key(version, *input_paths),
+            'output': self.file_digest(output_path),
+            'result': result,
+        }
+
+    def save(self):
+        """Write the cache atomically."""
+        tmp_file = self.cache_file.with_name(self.cache_file.name + '.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f)
+        os.replace(tmp_file, self.cache_file)
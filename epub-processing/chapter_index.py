@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Single-Scan Section Index for Loaded Chapters
+Finds the start and end offsets of every ACISS section in one pass over the tags of a chapter,
+so sections are only copied out of the source when a template is rendered.
+"""
+import re
+
+from section_stream import CHAPTER_HELD, CHAPTER_SECTIONS, CHAPTER_WRAPPERS, rules_by_tag, find_rule
+
+# Comments and CDATA are matched only so that tags inside them are skipped
+TAG_PATTERN = (r'<!--.*?-->|<!\[CDATA\[.*?\]\]>'
+               r'|<(/?)({tags})(?=[\s/>])((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>')
+
+CLASS_PATTERN = re.compile(r'(?:^|\s)class\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+
+# The whitespace bytes.strip() removes, so indexed and streamed sections strip alike
+WHITESPACE = ' \t\n\r\x0b\x0c'
+
+def class_attribute(attributes):
+    """The class attribute of a start tag's attribute text, as find_rule expects it."""
+    match = CLASS_PATTERN.search(attributes)
+    if match is None:
+        return {}
+    return {'class': match.group(1) if match.group(1) is not None else match.group(2)}
+
+class ChapterIndex:
+    """Offsets of every section of one chapter into its source text.
+
+    Each occurrence of a section is a flat tuple (start, end, start, end, ...)
+    of the fragments it is made of; a section with other sections nested in
+    it (the body holding endnotes and quiz) has one fragment per stretch
+    between them, and unwrapped wrapper tags are left out the same way.
+    """
+    __slots__ = ('source', 'spans')
+
+    def __init__(self, source, spans):
+        self.source = source
+        self.spans = spans
+
+    def __contains__(self, name):
+        return name in self.spans
+
+    def fragments(self, name, occurrence=0):
+        """(start, end) pairs of one occurrence, without its leading and trailing whitespace."""
+        offsets = self.spans.get(name, ())
+        if occurrence >= len(offsets):
+            return []
+        flat = offsets[occurrence]
+        pairs = [(flat[i], flat[i + 1]) for i in range(0, len(flat), 2)]
+        source = self.source
+        while pairs:
+            start, end = pairs[0]
+            while start < end and source[start] in WHITESPACE:
+                start += 1
+            if start < end:
+                pairs[0] = (start, end)
+                break
+            pairs.pop(0)
+        while pairs:
+            start, end = pairs[-1]
+            while end > start and source[end - 1] in WHITESPACE:
+                end -= 1
+            if end > start:
+                pairs[-1] = (start, end)
+                break
+            pairs.pop()
+        return pairs
+
+    def text(self, name):
+        """The first occurrence of a section, stripped, or '' if the chapter has none."""
+        return ''.join(self.source[start:end] for start, end in self.fragments(name))
+
+    def values(self, names=CHAPTER_HELD):
+        """Every occurrence of the named sections as written, e.g. all title words: {name: [text, ...]}."""
+        return {name: [''.join(self.source[flat[i]:flat[i + 1]] for i in range(0, len(flat), 2))
+                       for flat in self.spans.get(name, ())]
+                for name in names}
+
+def index_chapter(source, sections=CHAPTER_SECTIONS, wrappers=CHAPTER_WRAPPERS, held=CHAPTER_HELD):
+    """Index a chapter's sections in one scan over the tags the rules name.
+
+    Sections are chosen the way a chapter model chooses them while
+    streaming: held sections only until the first other section starts,
+    other sections only once, a repeat left as ordinary content of its
+    parent, and wrappers unwrapped under the same rule. Unclosed elements
+    are closed by their parent's end tag, so loosely written HTML indexes
+    as well as well-formed XHTML.
+    """
+    sections = rules_by_tag(sections)
+    wrappers = rules_by_tag(wrappers)
+    tags = '|'.join(re.escape(tag) for tag in sorted(sections.keys() | wrappers.keys()))
+    spans = {}
+    fragments = {}     # section -> fragment offsets of its open occurrence
+    stack = []         # (tag, section it belongs to, 'section', 'wrapper' or None)
+    target = None
+    cursor = 0
+    streaming = False
+
+    def route(end):
+        if target is not None and end > cursor:
+            fragments[target].extend((cursor, end))
+
+    for match in re.finditer(TAG_PATTERN.format(tags=tags), source, re.DOTALL):
+        closing, tag, attributes = match.group(1, 2, 3)
+        if tag is None:
+            continue
+
+        if not closing:
+            self_closing = attributes.endswith('/')
+            name = section = None
+            attrs = class_attribute(attributes)
+            name = find_rule(sections, tag, attrs)
+            if name is not None:
+                if name in held:
+                    if streaming:
+                        name = None
+                elif name in spans:
+                    name = None
+                else:
+                    streaming = True
+            if name is None:
+                section = find_rule(wrappers, tag, attrs)
+                if section is None or not stack or stack[-1][1:] != (section, 'section'):
+                    section = None
+
+            if name is not None:
+                route(match.start())
+                occurrence = []
+                spans.setdefault(name, []).append(occurrence)
+                if not self_closing:
+                    fragments[name] = occurrence
+                    stack.append((tag, name, 'section'))
+                    target = name
+                cursor = match.end()
+            elif section is not None:
+                route(match.start())
+                cursor = match.end()
+                if not self_closing:
+                    stack.append((tag, section, 'wrapper'))
+            elif not self_closing:
+                stack.append((tag, target, None))
+            continue
+
+        for depth in range(len(stack) - 1, -1, -1):
+            if stack[depth][0] == tag:
+                break
+        else:
+            continue
+        while len(stack) > depth:
+            _, capture, kind = stack.pop()
+            if kind is None:
+                continue
+            route(match.start())
+            # Only the element the end tag belongs to loses it; unclosed ones inside just end here
+            cursor = match.end() if len(stack) == depth else match.start()
+            if kind == 'section':
+                del fragments[capture]
+                target = stack[-1][1] if stack else None
+
+    route(len(source))
+    return ChapterIndex(source, {name: [tuple(flat) for flat in occurrences] for name, occurrences in spans.items()})
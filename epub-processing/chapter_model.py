@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Parse-Once Chapter Models
+Extracts a chapter's title fields, section offsets and quiz once and keeps them on disk keyed by the
+source's digest, so templates re-render a chapter and build its quiz key without parsing it again.
+"""
+import hashlib
+import json
+import re
+from pathlib import Path
+from xml.parsers.expat import ExpatError
+
+from build_cache import script_version
+from chapter_index import class_attribute, index_chapter
+from output_writer import READ_SIZE, write_if_changed
+from section_stream import CHAPTER_HELD, stream_sections
+
+MODEL_DIR = Path("/root/repo/epub-processing/.chapter-models")
+
+# Models depend on how sections are found and parsed, so editing any of these files invalidates them
+MODEL_VERSION = script_version(__file__, Path(__file__).with_name('section_stream.py'),
+                               Path(__file__).with_name('chapter_index.py'))
+
+# Sections whose text the model keeps besides the held title sections
+KEPT_SECTIONS = ('quiz',)
+
+QUESTION_PATTERN = re.compile(r'<h3\b[^>]*>(.*?)</h3\s*>', re.DOTALL)
+PARAGRAPH_PATTERN = re.compile(r'<p\b[^>]*>(.*?)</p\s*>', re.DOTALL)
+OPTION_PATTERN = re.compile(r'<li\b([^>]*)>(.*?)</li\s*>', re.DOTALL)
+LABEL_PATTERN = re.compile(r'\s*<span\b[^>]*\bopt-label\b[^>]*>(.*?)</span\s*>\s*', re.DOTALL)
+
+# Options written as plain lines of one paragraph: "a) Daily"
+TEXT_OPTION_PATTERN = re.compile(r'\s*([A-Za-z])\)\s*(.*?)\s*')
+
+def file_digest(path):
+    """Hex SHA-256 of a file, read in bounded pieces."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(READ_SIZE):
+            h.update(chunk)
+    return h.hexdigest()
+
+def title_fields(values):
+    """Roman numeral and title words from the chapter's number, title words and <title>."""
+    title_text = ''.join(values['title'][:1])
+
+    # The Roman numeral from the chapter-number-text, else from the <title>
+    numbers = [text for text in values['number'] if re.fullmatch(r'[IVXLC]+', text)]
+    title_match = re.match(r'\s*Chapter ([IVXLC]+)', title_text)
+    roman_num = numbers[0] if numbers else title_match.group(1) if title_match else "I"
+
+    # Title words from chapter-title-word elements
+    title_words = [word for word in values['title_word'] if '<' not in word]
+    if not title_words:
+        # Fallback - extract from title tag
+        title_match = re.search(r'Chapter [IVXLC]+ [–—-] ([^<]+)', title_text)
+        if title_match:
+            title_words = title_match.group(1).strip().split()
+
+    return roman_num, title_words
+
+def parse_quiz(quiz):
+    """Questions of a quiz section: [{'heading', 'question', 'options': [[label, text, correct], ...]}].
+
+    Options are either quiz-option list items with an opt-label, or the
+    lines of one paragraph ("a) ..."), whose labels are upper-cased to match.
+    An option is marked correct by a "correct" class on its list item.
+    """
+    questions = []
+    parts = QUESTION_PATTERN.split(quiz)
+    for heading, block in zip(parts[1::2], parts[2::2]):
+        question = ''
+        options = []
+        for attributes, item in OPTION_PATTERN.findall(block):
+            classes = class_attribute(attributes).get('class', '').split()
+            if 'quiz-option' not in classes:
+                continue
+            label = LABEL_PATTERN.match(item)
+            options.append([label.group(1).strip() if label else '',
+                            item[label.end():].strip() if label else item.strip(),
+                            'correct' in classes])
+        for paragraph in PARAGRAPH_PATTERN.findall(block):
+            lines = [TEXT_OPTION_PATTERN.fullmatch(line) for line in paragraph.splitlines() if line.strip()]
+            if lines and all(lines) and not options:
+                options = [[f"{line.group(1).upper()})", line.group(2), False] for line in lines]
+            elif not question:
+                question = paragraph.strip()
+        questions.append({'heading': heading.strip(), 'question': question, 'options': options})
+    return questions
+
+class ChapterModel:
+    """What templates need of one chapter, extracted once.
+
+    sections maps every section but the held title ones to the (start, end)
+    byte ranges of its first occurrence in the source, without leading and
+    trailing whitespace, so rendering copies them straight from the file.
+    """
+    __slots__ = ('digest', 'characters', 'roman', 'title_words', 'sections', 'quiz')
+
+    def __init__(self, digest, characters, roman, title_words, sections, quiz):
+        self.digest = digest
+        self.characters = characters
+        self.roman = roman
+        self.title_words = title_words
+        self.sections = sections
+        self.quiz = quiz
+
+    def to_record(self):
+        return {
+            'digest': self.digest,
+            'characters': self.characters,
+            'roman': self.roman,
+            'title_words': self.title_words,
+            'sections': {name: [list(pair) for pair in pairs] for name, pairs in self.sections.items()},
+            'quiz': self.quiz,
+        }
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(record['digest'], record['characters'], record['roman'], record['title_words'],
+                   {name: [tuple(pair) for pair in pairs] for name, pairs in record['sections'].items()},
+                   record['quiz'])
+
+class Span:
+    """Byte ranges of one section as its pieces stream past, leading and trailing whitespace left out."""
+    __slots__ = ('ranges', 'end')
+
+    def __init__(self):
+        self.ranges = []
+        self.end = None    # offset just past the last non-whitespace byte so far
+
+    def add(self, chunk, offset):
+        if not self.ranges:
+            content = chunk.lstrip()
+            if not content:
+                return
+            offset += len(chunk) - len(content)
+            chunk = content
+        if self.ranges and self.ranges[-1][1] == offset:
+            self.ranges[-1][1] = offset + len(chunk)
+        else:
+            self.ranges.append([offset, offset + len(chunk)])
+        content = chunk.rstrip()
+        if content:
+            self.end = offset + len(content)
+
+    def pairs(self):
+        pairs = []
+        for start, end in self.ranges:
+            if start >= self.end:
+                break
+            pairs.append((start, min(end, self.end)))
+        return pairs
+
+class ModelBuilder:
+    """Sink for stream_sections that builds a chapter model from one pass over the source.
+
+    Held title sections are taken only before the first other section and
+    kept as text, like the quiz; every other section is taken once and kept
+    only as offsets.
+    """
+
+    def __init__(self, held=CHAPTER_HELD, kept=KEPT_SECTIONS):
+        self.held = held
+        self.texts = {name: [] for name in held + kept}
+        self.open = {}
+        self.spans = {}
+
+    def start(self, name):
+        if name in self.held:
+            if self.spans:
+                return False
+        elif name in self.spans:
+            return False
+        else:
+            self.spans[name] = Span()
+        if name in self.texts:
+            self.open[name] = []
+            self.texts[name].append(self.open[name])
+        return True
+
+    def data(self, name, chunk, offset):
+        if name in self.open:
+            self.open[name].append(chunk)
+        if name in self.spans:
+            self.spans[name].add(chunk, offset)
+
+    def end(self, name):
+        self.open.pop(name, None)
+
+    def close(self):
+        pass
+
+    def model(self, digest, characters):
+        values = {name: [b''.join(parts).decode('utf-8') for parts in texts] for name, texts in self.texts.items()}
+        roman_num, title_words = title_fields(values)
+        quiz = values['quiz'][0].strip() if values['quiz'] else ''
+        return ChapterModel(digest, characters, roman_num, title_words,
+                            {name: span.pairs() for name, span in self.spans.items()}, parse_quiz(quiz))
+
+def byte_offsets(text, offsets):
+    """Map character offsets into text to offsets into its UTF-8 encoding."""
+    mapping = {}
+    chars = position = 0
+    for offset in sorted(set(offsets)):
+        position += len(text[chars:offset].encode('utf-8'))
+        chars = offset
+        mapping[offset] = position
+    return mapping
+
+def model_from_text(text, digest=None):
+    """Build a chapter model from loaded text; offsets refer to text.encode('utf-8')."""
+    chapter = index_chapter(text)
+    roman_num, title_words = title_fields(chapter.values())
+    fragments = {name: chapter.fragments(name) for name in chapter.spans if name not in CHAPTER_HELD}
+    mapping = byte_offsets(text, [offset for pairs in fragments.values() for pair in pairs for offset in pair])
+    sections = {name: [(mapping[start], mapping[end]) for start, end in pairs] for name, pairs in fragments.items()}
+    return ChapterModel(digest, len(text), roman_num, title_words, sections, parse_quiz(chapter.text('quiz')))
+
+def build_model(source, digest=None):
+    """Extract the model of a seekable binary chapter file in one streamed pass.
+
+    A chapter that is not well-formed XML is loaded and indexed instead.
+    """
+    builder = ModelBuilder()
+    try:
+        characters = stream_sections(source, builder)
+    except ExpatError:
+        source.seek(0)
+        return model_from_text(source.read().decode('utf-8'), digest)
+    return builder.model(digest, characters)
+
+class ModelStore:
+    """Chapter models on disk, one compact JSON record per source digest.
+
+    A model is built the first time a source's content is seen, or after
+    the extraction code changes, and read back from then on; since the key
+    is the content itself, the same chapter in any path or book shares it.
+    """
+
+    def __init__(self, directory=MODEL_DIR):
+        self.directory = Path(directory)
+        self.built = 0
+        self.loaded = 0
+
+    def path_for(self, digest):
+        return self.directory / f"{digest}.json"
+
+    def get(self, source_path):
+        """The model of a chapter file, built and stored only if it is not on disk yet."""
+        digest = file_digest(source_path)
+        model_path = self.path_for(digest)
+        try:
+            with open(model_path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+            if record.get('version') == MODEL_VERSION:
+                self.loaded += 1
+                return ChapterModel.from_record(record)
+        except (OSError, ValueError, KeyError):
+            pass
+
+        with open(source_path, 'rb') as source:
+            model = build_model(source, digest)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        write_if_changed(model_path, json.dumps({'version': MODEL_VERSION, **model.to_record()},
+                                                ensure_ascii=False, separators=(',', ':')))
+        self.built += 1
+        return model
+
+if __name__ == "__main__":
+    # Build or load the model of everything currently in input/
+    store = ModelStore()
+    sources = sorted(Path("/root/repo/epub-processing/input").glob("*-chapter-*.xhtml"))
+    for source in sources:
+        model = store.get(source)
+        print(f"{source.name}: Chapter {model.roman}, {len(model.sections)} sections, {len(model.quiz)} quiz questions")
+    print(f"Built {store.built}, loaded {store.loaded} models in {MODEL_DIR}")
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Corpus Statistics for EPUB Catalogs
+Tokenizes every document of one or more books once into flat word and sentence length arrays, and
+computes word counts, reading time, sentence lengths and section balance for the whole catalog with
+NumPy instead of per-file loops.
+"""
+import re
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import numpy as np
+
+from preservation_manifest import normalize_text_content
+from text_index import BLOCK_PATTERN, OEBPS_DIR, TITLE_PATTERN, book_documents, book_title
+
+# Average silent reading rate for non-fiction, and words on a typical printed trade page
+WORDS_PER_MINUTE = 238
+WORDS_PER_PAGE = 250
+
+# Sentence length quantiles reported per document
+QUANTILES = (0.1, 0.5, 0.9)
+
+# A word keeps its inner apostrophes and hyphens ("don't", "self-care")
+WORD_PATTERN = re.compile(r"\w+(?:['’-]\w+)*")
+
+# A sentence ends at . ! ? or …, after any closing quotes or brackets, before whitespace
+SENTENCE_BREAK_PATTERN = re.compile(r'(?<=[.!?…])["”’)\]]*\s+')
+
+BODY_PATTERN = re.compile(r'<body\b[^>]*>(.*)</body\s*>', re.DOTALL | re.IGNORECASE)
+CLASS_PATTERN = re.compile(r'\bclass\s*=\s*["\']([^"\']*)["\']', re.IGNORECASE)
+
+# Headings that start a section; lower levels stay inside it
+SECTION_HEADINGS = {'h1', 'h2'}
+
+# Chapter apparatus sections, left out of the section balance
+APPARATUS_CLASSES = {'endnotes-title', 'quiz-title', 'worksheet-title'}
+
+OPF_NS = {'opf': 'http://www.idpf.org/2007/opf'}
+
+# Spine documents that are navigation, or generated from text the chapters already hold, are not counted
+NAVIGATION_TYPE_PATTERN = re.compile(r'epub:type\s*=\s*["\'][^"\']*\b(?:toc|landmarks|page-list)\b')
+REPEATED_CONTENT_PATTERN = re.compile(r'class\s*=\s*["\'][^"\']*\bquiz-key-chapter\b')
+
+def document_blocks(content):
+    """(tag, class names, normalized text) of every non-empty block of a document's body, in order.
+
+    Text outside the blocks (in a div or span of its own) comes as a block
+    with an empty tag between its neighbours, so every word of the body is
+    counted once and falls in the section it appears in.
+    """
+    body = BODY_PATTERN.search(content)
+    body = body.group(1) if body else content
+    blocks = []
+    end = 0
+    for match in BLOCK_PATTERN.finditer(body):
+        loose = normalize_text_content(body[end:match.start()])
+        if loose:
+            blocks.append(('', set(), loose))
+        end = match.end()
+        text = normalize_text_content(match.group(2))
+        if text:
+            start_tag = match.group(0)[:match.start(2) - match.start()]
+            css_class = CLASS_PATTERN.search(start_tag)
+            blocks.append((match.group(1).lower(), set(css_class.group(1).split()) if css_class else set(), text))
+    loose = normalize_text_content(body[end:])
+    if loose:
+        blocks.append(('', set(), loose))
+    return blocks
+
+def sentence_lengths(text):
+    """Word count of every sentence of a block's text."""
+    return [count for count in (len(WORD_PATTERN.findall(sentence))
+                                for sentence in SENTENCE_BREAK_PATTERN.split(text)) if count]
+
+def reading_minutes(words):
+    return words / WORDS_PER_MINUTE
+
+def find_opf(oebps_dir):
+    opfs = sorted(Path(oebps_dir).glob("**/*.opf"))
+    return opfs[0] if opfs else None
+
+def spine_documents(oebps_dir, opf_file):
+    """{relative path: path} of the linear spine documents that exist on disk, in reading order.
+
+    Manifest hrefs are relative to OEBPS (the OPF itself lives in text/).
+    The nav document and itemrefs with linear="no" are left out.
+    """
+    root = ET.parse(opf_file).getroot()
+    items = {item.get('id'): item for item in root.iterfind('.//opf:manifest/opf:item', OPF_NS)}
+    documents = {}
+    for itemref in root.iterfind('.//opf:spine/opf:itemref', OPF_NS):
+        item = items.get(itemref.get('idref'))
+        if item is None or itemref.get('linear') == 'no' or 'nav' in (item.get('properties') or '').split():
+            continue
+        path = Path(oebps_dir) / item.get('href')
+        if path.is_file():
+            documents[item.get('href')] = str(path)
+    return documents
+
+def is_content_document(content):
+    """False for a table of contents or other navigation page, and for the generated quiz key."""
+    return not NAVIGATION_TYPE_PATTERN.search(content) and not REPEATED_CONTENT_PATTERN.search(content)
+
+def grouped_quantiles(values, groups, group_count, quantiles):
+    """Linearly interpolated quantiles of values per group, as a (groups, quantiles) array; NaN for empty groups."""
+    order = np.lexsort((values, groups))
+    ordered = values[order].astype(np.float64)
+    counts = np.bincount(groups, minlength=group_count)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    result = np.full((group_count, len(quantiles)), np.nan)
+    present = counts > 0
+    last = counts[present] - 1
+    for column, quantile in enumerate(quantiles):
+        rank = quantile * last
+        low = np.floor(rank).astype(np.int64)
+        high = np.minimum(low + 1, last)
+        fraction = rank - low
+        base = starts[present]
+        result[present, column] = ordered[base + low] * (1 - fraction) + ordered[base + high] * fraction
+    return result
+
+class CorpusStats:
+    """Statistics of a catalog of books, computed from flat per-block and per-sentence arrays.
+
+    Only the linear content documents of each book's spine are counted.
+    Scanning reads and tokenizes each document once, appending to flat
+    lists of block word counts, sentence word counts and the section or
+    document each belongs to. Every total is then a bincount over those
+    arrays, so the whole catalog is summarized in a few vectorized passes
+    rather than a loop per file.
+    """
+
+    def __init__(self, oebps_dirs=(OEBPS_DIR,)):
+        self.books = []
+        self.documents = []
+        self.skipped = []    # relative paths of spine documents that are not counted
+        self.sections = []   # {'document', 'heading', 'body'}
+        block_words, block_section = [], []
+        sentence_words, sentence_document = [], []
+
+        for oebps_dir in oebps_dirs:
+            book = len(self.books)
+            opf = find_opf(oebps_dir)
+            self.books.append({'path': str(Path(oebps_dir).resolve()), 'title': book_title(oebps_dir), 'opf': opf})
+            # Without an OPF every document counts, in file name order
+            documents = spine_documents(oebps_dir, opf) if opf else book_documents(oebps_dir)
+            for relative, path in documents.items():
+                with open(path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                if not is_content_document(content):
+                    self.skipped.append(relative)
+                    continue
+                title = TITLE_PATTERN.search(content)
+                doc = len(self.documents)
+                self.documents.append({'book': book, 'path': relative,
+                                       'title': normalize_text_content(title.group(1)) if title else relative})
+                section = len(self.sections)
+                self.sections.append({'document': doc, 'heading': '', 'body': True})
+                has_text = False
+
+                # A section heading starts a new section unless the current one has no text yet
+                for tag, classes, text in document_blocks(content):
+                    if tag in SECTION_HEADINGS:
+                        if has_text:
+                            section = len(self.sections)
+                            self.sections.append({'document': doc, 'heading': '', 'body': True})
+                            has_text = False
+                        if not self.sections[section]['heading']:
+                            self.sections[section]['heading'] = text
+                        if classes & APPARATUS_CLASSES:
+                            self.sections[section]['body'] = False
+                    if tag.startswith('h'):
+                        block_words.append(len(WORD_PATTERN.findall(text)))
+                    else:
+                        lengths = sentence_lengths(text)
+                        block_words.append(sum(lengths))
+                        sentence_words.extend(lengths)
+                        sentence_document.extend([doc] * len(lengths))
+                        has_text = True
+                    block_section.append(section)
+
+        self.block_words = np.array(block_words, dtype=np.int64)
+        self.block_section = np.array(block_section, dtype=np.int64)
+        self.sentence_words = np.array(sentence_words, dtype=np.int64)
+        self.sentence_document = np.array(sentence_document, dtype=np.int64)
+        self.section_document = np.array([s['document'] for s in self.sections], dtype=np.int64)
+        self.section_body = np.array([s['body'] for s in self.sections], dtype=bool)
+        self.document_book = np.array([d['book'] for d in self.documents], dtype=np.int64)
+        self._summarize()
+
+    def _summarize(self):
+        documents, sections = len(self.documents), len(self.sections)
+
+        self.section_words = np.bincount(self.block_section, weights=self.block_words,
+                                         minlength=sections).astype(np.int64)
+        self.document_words = np.bincount(self.section_document, weights=self.section_words,
+                                          minlength=documents).astype(np.int64)
+        self.book_words = np.bincount(self.document_book, weights=self.document_words,
+                                      minlength=len(self.books)).astype(np.int64)
+
+        self.sentence_count = np.bincount(self.sentence_document, minlength=documents)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.sentence_mean = np.bincount(self.sentence_document, weights=self.sentence_words,
+                                             minlength=documents) / self.sentence_count
+        self.sentence_quantiles = grouped_quantiles(self.sentence_words, self.sentence_document,
+                                                    documents, QUANTILES)
+
+        # Balance of the body sections that have words: spread relative to the mean, and the largest share
+        balanced = self.section_body & (self.section_words > 0)
+        owners = self.section_document[balanced]
+        words = self.section_words[balanced].astype(np.float64)
+        self.body_sections = np.bincount(owners, minlength=documents)
+        body_words = np.bincount(owners, weights=words, minlength=documents)
+        squares = np.bincount(owners, weights=words * words, minlength=documents)
+        largest = np.zeros(documents)
+        np.maximum.at(largest, owners, words)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = body_words / self.body_sections
+            spread = np.sqrt(np.maximum(squares / self.body_sections - mean * mean, 0))
+            self.section_variation = np.where(self.body_sections > 1, spread / mean, np.nan)
+            self.largest_share = np.where(self.body_sections > 1, largest / body_words, np.nan)
+
+    def pages(self, book=0):
+        """Estimated printed page count of a book."""
+        return max(1, int(np.ceil(self.book_words[book] / WORDS_PER_PAGE)))
+
+    def document_sections(self, doc):
+        """(heading, words, body) of every section of a document, in order."""
+        return [(self.sections[i]['heading'], int(self.section_words[i]), bool(self.section_body[i]))
+                for i in np.flatnonzero(self.section_document == doc)]
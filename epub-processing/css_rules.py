@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+CSS Rule Parsing for EPUB Stylesheets
+Splits stylesheets into rules, selectors and declarations for the font and CSS build stages.
+"""
+import re
+
+COMMENT_PATTERN = re.compile(r'/\*.*?\*/', re.DOTALL)
+
+# At-rules whose block holds further rules rather than declarations
+GROUPING_AT_RULES = {'@media', '@supports', '@document'}
+
+# One compound selector: optional type, then any ids, classes, attributes and pseudos
+COMPOUND_PATTERN = re.compile(
+    r'(?P<tag>[a-zA-Z][\w-]*|\*)?'
+    r'(?P<rest>(?:#[\w-]+|\.[\w-]+|\[[^\]]*\]|::?[\w-]+(?:\([^)]*\))?)*)'
+)
+SIMPLE_PART_PATTERN = re.compile(r'#[\w-]+|\.[\w-]+|\[[^\]]*\]|::?[\w-]+(?:\([^)]*\))?')
+COMBINATOR_PATTERN = re.compile(r'\s*([>+~])\s*|\s+')
+
+# Legacy pseudo-elements that may be written with a single colon
+LEGACY_PSEUDO_ELEMENTS = {':before', ':after', ':first-line', ':first-letter'}
+
+class StyleRule:
+    """A qualified rule: selectors plus the raw declaration block."""
+    __slots__ = ('selectors', 'declarations', 'media')
+
+    def __init__(self, selectors, declarations, media):
+        self.selectors = selectors
+        self.declarations = declarations
+        self.media = media
+
+class AtRule:
+    """An at-rule; grouping rules carry parsed children, others their raw block (or None)."""
+    __slots__ = ('name', 'prelude', 'block', 'children')
+
+    def __init__(self, name, prelude, block, children):
+        self.name = name
+        self.prelude = prelude
+        self.block = block
+        self.children = children
+
+class Compound:
+    """One compound selector such as 'p.first:first-child'."""
+    __slots__ = ('tag', 'ids', 'classes', 'attributes', 'pseudo_classes', 'pseudo_elements')
+
+    def __init__(self, tag, ids, classes, attributes, pseudo_classes, pseudo_elements):
+        self.tag = tag
+        self.ids = ids
+        self.classes = classes
+        self.attributes = attributes
+        self.pseudo_classes = pseudo_classes
+        self.pseudo_elements = pseudo_elements
+
+def strip_comments(css):
+    """Remove /* ... */ comments."""
+    return COMMENT_PATTERN.sub('', css)
+
+def split_top_level(text, separator):
+    """Split on a separator character outside strings, brackets and parentheses."""
+    parts = []
+    depth = 0
+    quote = None
+    start = 0
+    for i, char in enumerate(text):
+        if quote:
+            if char == quote and text[i - 1] != '\\':
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+def iter_blocks(css):
+    """Yield (prelude, block) pairs at the top level; block is None for statements like @import."""
+    depth = 0
+    quote = None
+    start = 0
+    block_start = None
+    for i, char in enumerate(css):
+        if quote:
+            if char == quote and css[i - 1] != '\\':
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char == '{':
+            if depth == 0:
+                block_start = i
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                yield css[start:block_start].strip(), css[block_start + 1:i]
+                start = i + 1
+        elif char == ';' and depth == 0:
+            statement = css[start:i].strip()
+            if statement:
+                yield statement, None
+            start = i + 1
+
+def parse_stylesheet(css, media=()):
+    """Parse stylesheet text into a list of StyleRule and AtRule nodes."""
+    nodes = []
+    for prelude, block in iter_blocks(strip_comments(css)):
+        if prelude.startswith('@'):
+            name = prelude.split(None, 1)[0].split('(')[0].lower()
+            if name in GROUPING_AT_RULES and block is not None:
+                children = parse_stylesheet(block, media + (prelude,))
+                nodes.append(AtRule(name, prelude, None, children))
+            else:
+                nodes.append(AtRule(name, prelude, block, None))
+        elif block is not None:
+            selectors = [s.strip() for s in split_top_level(prelude, ',') if s.strip()]
+            nodes.append(StyleRule(selectors, block, media))
+    return nodes
+
+def iter_style_rules(nodes):
+    """Yield every StyleRule, descending into grouping at-rules."""
+    for node in nodes:
+        if isinstance(node, StyleRule):
+            yield node
+        elif node.children is not None:
+            yield from iter_style_rules(node.children)
+
+def parse_declarations(block):
+    """Return the (property, value, important) triples of a declaration block, in order."""
+    declarations = []
+    for declaration in split_top_level(block, ';'):
+        if ':' not in declaration:
+            continue
+        prop, value = declaration.split(':', 1)
+        value = value.strip()
+        important = value.lower().endswith('!important')
+        if important:
+            value = value[:-len('!important')].strip()
+        prop = prop.strip()
+        # Custom property names are case-sensitive
+        if not prop.startswith('--'):
+            prop = prop.lower()
+        declarations.append((prop, value, important))
+    return declarations
+
+def parse_compound(text):
+    """Parse a single compound selector."""
+    match = COMPOUND_PATTERN.fullmatch(text)
+    if not match:
+        return None
+    ids, classes, attributes, pseudo_classes, pseudo_elements = [], [], [], [], []
+    for part in SIMPLE_PART_PATTERN.findall(match.group('rest')):
+        if part.startswith('#'):
+            ids.append(part[1:])
+        elif part.startswith('.'):
+            classes.append(part[1:])
+        elif part.startswith('['):
+            attributes.append(part)
+        elif part.startswith('::') or part.lower() in LEGACY_PSEUDO_ELEMENTS:
+            pseudo_elements.append(part)
+        else:
+            pseudo_classes.append(part)
+    tag = match.group('tag')
+    return Compound(tag.lower() if tag and tag != '*' else None,
+                    ids, classes, attributes, pseudo_classes, pseudo_elements)
+
+def parse_selector(selector):
+    """Parse a complex selector into [(combinator, Compound), ...], left to right.
+
+    The combinator of the first compound is None; the others are ' ', '>', '+' or '~'.
+    Returns None for selectors this parser does not understand.
+    """
+    parts = []
+    combinator = None
+    position = 0
+    selector = selector.strip()
+    while position < len(selector):
+        match = COMPOUND_PATTERN.match(selector, position)
+        if not match or match.end() == position:
+            return None
+        compound = parse_compound(match.group(0))
+        if compound is None:
+            return None
+        parts.append((combinator, compound))
+        position = match.end()
+        if position < len(selector):
+            separator = COMBINATOR_PATTERN.match(selector, position)
+            if not separator:
+                return None
+            combinator = separator.group(1) or ' '
+            position = separator.end()
+    return parts or None
+
+def specificity(parts):
+    """CSS specificity of a parsed selector as an (ids, classes, types) tuple."""
+    ids = classes = types = 0
+    for _, compound in parts:
+        ids += len(compound.ids)
+        classes += len(compound.classes) + len(compound.attributes) + len(compound.pseudo_classes)
+        types += (1 if compound.tag else 0) + len(compound.pseudo_elements)
+    return ids, classes, types
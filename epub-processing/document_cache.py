@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Parse-Once Document Cache for EPUB Validation
+Reads each document once, parses it at most once, and shares both between checks.
+"""
+from contextlib import contextmanager
+from pathlib import Path
+
+class Document:
+    """Raw text of one document plus its lazily parsed tree."""
+    __slots__ = ('path', 'text', '_parse', '_tree', '_error')
+
+    def __init__(self, path, text, parse):
+        self.path = path
+        self.text = text
+        self._parse = parse
+        self._tree = None
+        self._error = None
+
+    @property
+    def tree(self):
+        """The parsed document; a parse error is raised again on every access."""
+        if self._error is not None:
+            raise self._error
+        if self._tree is None:
+            try:
+                self._tree = self._parse(self.text)
+            except Exception as e:
+                self._error = e
+                raise
+        return self._tree
+
+class DocumentCache:
+    """Shares documents between checks and releases each after its last expected use.
+
+    Call expect(path, uses) with the number of checks that will open a
+    document; the entry is dropped when the last of them closes it, so only
+    the documents currently being checked stay in memory. A document that
+    was never expected is released after a single use.
+    """
+
+    def __init__(self, parser=None):
+        self.parser = parser
+        self.entries = {}
+        self.uses = {}
+        self.reads = 0
+        self.parses = 0
+
+    def _key(self, path):
+        return str(Path(path).resolve())
+
+    def _parse(self, text):
+        if self.parser is None:
+            raise ValueError("No parser configured for this document cache")
+        self.parses += 1
+        return self.parser(text)
+
+    def expect(self, path, uses):
+        """Register how many more times a document will be opened."""
+        key = self._key(path)
+        self.uses[key] = self.uses.get(key, 0) + uses
+
+    def get(self, path):
+        """Return the cached document, reading it on first use."""
+        key = self._key(path)
+        document = self.entries.get(key)
+        if document is None:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            self.reads += 1
+            document = Document(Path(path), text, self._parse)
+            self.entries[key] = document
+        return document
+
+    def release(self, path):
+        """Count one finished use, dropping the document after the last one."""
+        key = self._key(path)
+        remaining = self.uses.get(key, 1) - 1
+        if remaining > 0:
+            self.uses[key] = remaining
+        else:
+            self.uses.pop(key, None)
+            self.entries.pop(key, None)
+
+    @contextmanager
+    def open(self, path):
+        """Use a document for one check, releasing it afterwards even if the check fails."""
+        try:
+            yield self.get(path)
+        finally:
+            self.release(path)
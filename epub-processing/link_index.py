@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Anchor and Endnote Link Index for the EPUB Package
+Records every id, in-book link and endnote of each document, updated incrementally and stored on disk,
+and checks links across the whole book with hash lookups.
+"""
+import json
+import os
+import posixpath
+import re
+from html.parser import HTMLParser
+from pathlib import Path
+from urllib.parse import unquote
+
+from build_cache import script_version
+
+OEBPS_DIR = Path("/root/repo/Complete/OEBPS")
+INDEX_FILE = Path("/root/repo/Complete/.link-index.json")
+
+INDEX_VERSION = script_version(__file__)
+
+DOCUMENT_SUFFIXES = {'.xhtml', '.html'}
+
+# Endnotes are footnote-item entries, or list items with ids like fn-3 / fn3
+NOTE_CLASS = 'footnote-item'
+NOTE_ID_PATTERN = re.compile(r'fn-?\d+')
+
+# Elements that never have an end tag, so they never enclose anything
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+SCHEME_PATTERN = re.compile(r'^[a-zA-Z][a-zA-Z0-9+.-]*:')
+
+def resolve_link(relative_path, href):
+    """(target document, fragment) of an in-book href, relative to OEBPS; None for external links."""
+    href = href.strip()
+    if SCHEME_PATTERN.match(href) or href.startswith('/'):
+        return None
+    path, _, fragment = href.partition('#')
+    path = path.split('?', 1)[0]
+    if not path:
+        return relative_path, unquote(fragment)
+    return posixpath.normpath(posixpath.join(posixpath.dirname(relative_path), unquote(path))), unquote(fragment)
+
+class LinkCollector(HTMLParser):
+    """Collects the ids, links and endnotes of one document with their line numbers.
+
+    Each link also records the nearest id enclosing it (the anchor an
+    endnote links back to, e.g. the <sup id="fnref-3"> around it) and the
+    endnote it sits in, if any.
+    """
+
+    def __init__(self, relative_path):
+        super().__init__(convert_charrefs=True)
+        self.relative_path = relative_path
+        self.ids = []      # [id, line]
+        self.links = []    # [href, target, fragment, line, enclosing id, enclosing note]
+        self.notes = []    # [id, line]
+        self.stack = []    # (tag, nearest id, enclosing note) per open element
+
+    def handle_starttag(self, tag, attrs):
+        self._element(tag, dict(attrs), tag not in VOID_ELEMENTS)
+
+    def handle_startendtag(self, tag, attrs):
+        self._element(tag, dict(attrs), False)
+
+    def _element(self, tag, attrs, opens):
+        line = self.getpos()[0]
+        anchor, note = self.stack[-1][1:] if self.stack else (None, None)
+        element_id = attrs.get('id')
+        if element_id:
+            self.ids.append([element_id, line])
+            anchor = element_id
+            classes = (attrs.get('class') or '').split()
+            if NOTE_CLASS in classes or (tag == 'li' and NOTE_ID_PATTERN.fullmatch(element_id)):
+                self.notes.append([element_id, line])
+                note = element_id
+        href = attrs.get('href')
+        if tag in ('a', 'area') and href is not None:
+            resolved = resolve_link(self.relative_path, href)
+            if resolved is not None:
+                self.links.append([href, resolved[0], resolved[1], line, anchor, note])
+        if opens:
+            self.stack.append((tag, anchor, note))
+
+    def handle_endtag(self, tag):
+        # Unclosed elements inside are closed by their parent's end tag
+        for depth in range(len(self.stack) - 1, -1, -1):
+            if self.stack[depth][0] == tag:
+                del self.stack[depth:]
+                return
+
+class LinkIndex:
+    """Ids, links and endnotes of every document in the package, and the link problems found in each.
+
+    Documents are re-parsed only when their mtime or size changes. Checking
+    builds hash maps of ids, incoming links and endnote backlinks from the
+    stored records in one linear pass; the problems of a document are then
+    only recomputed if it or a document it links to or from changed.
+    """
+
+    def __init__(self, oebps_dir=OEBPS_DIR, index_file=INDEX_FILE):
+        self.oebps_dir = Path(oebps_dir)
+        self.index_file = Path(index_file)
+        self.documents = {}
+        self.problems = {}
+        if self.index_file.exists():
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == INDEX_VERSION:
+                    self.documents = data['documents']
+                    self.problems = data['problems']
+            except (OSError, ValueError, KeyError):
+                pass
+
+    def _scan(self):
+        """{relative path: path} of every XHTML document under OEBPS."""
+        found = {}
+        for root, dirs, files in os.walk(self.oebps_dir):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for name in files:
+                if posixpath.splitext(name)[1].lower() in DOCUMENT_SUFFIXES:
+                    path = os.path.join(root, name)
+                    found[Path(path).relative_to(self.oebps_dir).as_posix()] = path
+        return found
+
+    def update(self):
+        """Re-index changed documents, recheck the ones they affect, and return the set of documents rechecked."""
+        paths = self._scan()
+        # Documents a changed or removed document used to link to lose those links, so they are rechecked too
+        old_targets = set()
+        changed = {relative for relative in self.documents if relative not in paths}
+        for relative in changed:
+            old_targets |= {link[1] for link in self.documents.pop(relative)['links']}
+            self.problems.pop(relative, None)
+
+        for relative, path in paths.items():
+            stat = os.stat(path)
+            known = self.documents.get(relative)
+            if known and known['mtime_ns'] == stat.st_mtime_ns and known['size'] == stat.st_size:
+                continue
+            if known:
+                old_targets |= {link[1] for link in known['links']}
+            collector = LinkCollector(relative)
+            with open(path, 'r', encoding='utf-8') as f:
+                collector.feed(f.read())
+            collector.close()
+            self.documents[relative] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+                                        'ids': collector.ids, 'links': collector.links, 'notes': collector.notes}
+            changed.add(relative)
+
+        self._build_maps()
+
+        # A document's problems depend on the documents it links to and the ones linking to it
+        recheck = changed | old_targets
+        for relative, document in self.documents.items():
+            targets = {link[1] for link in document['links']}
+            if relative in changed:
+                recheck |= targets
+            elif targets & changed:
+                recheck.add(relative)
+        recheck = {relative for relative in recheck if relative in self.documents} | \
+                  {relative for relative in self.documents if relative not in self.problems}
+        for relative in recheck:
+            self.problems[relative] = self.check_document(relative)
+
+        if changed or recheck:
+            self.save()
+        return recheck
+
+    def _build_maps(self):
+        self.ids = {relative: {element_id for element_id, _ in document['ids']}
+                    for relative, document in self.documents.items()}
+        self.notes = {relative: {note_id for note_id, _ in document['notes']}
+                      for relative, document in self.documents.items()}
+        self.incoming = {}
+        self.backlinks = set()
+        for relative, document in self.documents.items():
+            for _, target, fragment, _, _, note in document['links']:
+                key = (target, fragment)
+                self.incoming[key] = self.incoming.get(key, 0) + 1
+                if note is not None:
+                    self.backlinks.add((relative, note, target, fragment))
+
+    def check_document(self, relative):
+        """[kind, line, message] of every link problem of one document, in document order.
+
+        Kinds are 'dangling' (missing document or id), 'backlink' (an endnote
+        that does not link back to its reference), 'duplicate' (an id used
+        twice) and 'unused' (an endnote nothing links to).
+        """
+        document = self.documents[relative]
+        problems = []
+
+        first_use = {}
+        for element_id, line in document['ids']:
+            if element_id in first_use:
+                problems.append(['duplicate', line, f'id "{element_id}" already used on line {first_use[element_id]}'])
+            else:
+                first_use[element_id] = line
+
+        for href, target, fragment, line, anchor, note in document['links']:
+            if target not in self.ids:
+                if posixpath.splitext(target)[1].lower() in DOCUMENT_SUFFIXES:
+                    problems.append(['dangling', line, f'{href}: no document {target}'])
+                continue
+            if fragment and fragment not in self.ids[target]:
+                problems.append(['dangling', line, f'{href}: no id "{fragment}" in {target}'])
+            elif fragment in self.notes[target] and note is None:
+                if anchor is None:
+                    problems.append(['backlink', line, f'{href}: reference has no id for endnote {fragment} to link back to'])
+                elif (target, fragment, relative, anchor) not in self.backlinks:
+                    problems.append(['backlink', line, f'{href}: endnote {fragment} does not link back to #{anchor}'])
+
+        for note_id, line in document['notes']:
+            if not self.incoming.get((relative, note_id)):
+                problems.append(['unused', line, f'endnote "{note_id}" is never referenced'])
+
+        problems.sort(key=lambda problem: problem[1])
+        return problems
+
+    def save(self):
+        """Write the index atomically."""
+        tmp_file = self.index_file.with_name(self.index_file.name + '.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': INDEX_VERSION, 'documents': self.documents, 'problems': self.problems}, f)
+        os.replace(tmp_file, self.index_file)
+
+    def problems_of_kind(self, kind):
+        """(document, line, message) of every problem of one kind, by document."""
+        return [(relative, line, message)
+                for relative in sorted(self.problems)
+                for problem_kind, line, message in self.problems[relative] if problem_kind == kind]
+
+    def counts(self):
+        """Totals of ids, in-book links and endnotes across the package."""
+        return {
+            'ids': sum(len(document['ids']) for document in self.documents.values()),
+            'links': sum(len(document['links']) for document in self.documents.values()),
+            'notes': sum(len(document['notes']) for document in self.documents.values()),
+        }
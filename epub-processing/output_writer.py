@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Write-If-Changed Atomic Output for the Transformers
+Writes each output through a temporary file that replaces the target only when the content differs,
+so a crash never leaves a half-written file and unchanged files keep their mtime.
+"""
+import hashlib
+import os
+from pathlib import Path
+
+# Bytes hashed per read when comparing against an existing file
+READ_SIZE = 1024 * 1024
+
+def file_matches(path, size, digest):
+    """True if the file at path has exactly this size and SHA-256 digest."""
+    try:
+        if os.stat(path).st_size != size:
+            return False
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while chunk := f.read(READ_SIZE):
+                h.update(chunk)
+    except FileNotFoundError:
+        return False
+    return h.digest() == digest
+
+class OutputFile:
+    """Binary file-like output that only replaces its target if what was written differs.
+
+    Writes go to a temporary file beside the target while being hashed; on
+    commit the target is compared by size and digest and either replaced
+    atomically with os.replace or left untouched. Used as a context manager
+    it commits on success and discards the temporary file on an exception.
+    After commit, changed tells which happened. A tee, if given, is also
+    written every chunk (e.g. to fingerprint the output as it goes).
+    """
+
+    def __init__(self, path, tee=None):
+        self.path = Path(path)
+        self.tee = tee
+        self.tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        self.handle = open(self.tmp_path, 'wb')
+        self.hash = hashlib.sha256()
+        self.size = 0
+        self.changed = None
+
+    def write(self, data):
+        self.handle.write(data)
+        self.hash.update(data)
+        if self.tee is not None:
+            self.tee.write(data)
+        self.size += len(data)
+
+    def writelines(self, chunks):
+        for chunk in chunks:
+            self.write(chunk)
+
+    def commit(self):
+        """Replace the target if the content changed; return True if it did."""
+        self.handle.close()
+        if file_matches(self.path, self.size, self.hash.digest()):
+            os.unlink(self.tmp_path)
+            self.changed = False
+        else:
+            os.replace(self.tmp_path, self.path)
+            self.changed = True
+        return self.changed
+
+    def discard(self):
+        self.handle.close()
+        try:
+            os.unlink(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+        return False
+
+def write_if_changed(path, content, encoding='utf-8'):
+    """Write str, bytes or an iterable of str/bytes chunks to path unless it already holds them.
+
+    Returns True if the file was (atomically) replaced, False if it was
+    already identical and so left alone, mtime included.
+    """
+    if isinstance(content, str):
+        content = content.encode(encoding)
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        # Whole content in hand: compare first, so an unchanged file costs no write at all
+        if file_matches(path, len(content), hashlib.sha256(content).digest()):
+            return False
+        content = (content,)
+
+    with OutputFile(path) as output:
+        for chunk in content:
+            output.write(chunk.encode(encoding) if isinstance(chunk, str) else chunk)
+    return output.changed
@@ -7,6 +7,9 @@ import re
 import sys
 from pathlib import Path
 
+from output_writer import write_if_changed
+from stage_profiler import NULL_PROFILER, NULL_TIMER
+
 def process_part_divider(content):
     """Process part divider file to clean structure and fix references."""
     
@@ -54,30 +57,47 @@ def verify_part_content(original, processed):
     
     return orig_text == proc_text
 
-def process_part_file(input_file, output_file):
-    """Process a part divider file."""
+def report_part(output_name, original, processed):
+    """Verify a part divider and return (preserved, report lines)."""
+    if verify_part_content(original, processed):
+        return True, [f"✅ Part divider processed successfully: {output_name}"]
+    return False, [f"⚠️  Content verification issue: {output_name}"]
+
+def transform_document(input_file, output_name, original_content, manifest=None, timer=NULL_TIMER):
+    """Transform and check already-read content; return (processed content, preserved, report lines)."""
+    processed_content = process_part_divider(original_content)
+    timer.lap('rewrite')
+    preserved, lines = report_part(output_name, original_content, processed_content)
+    timer.lap('preserve')
+    return processed_content, preserved, lines
+
+def process_part_file(input_file, output_file, profile=NULL_PROFILER, stats=None):
+    """Process a part divider file; character counts go into stats if given."""
     print(f"🔄 Processing part divider: {Path(input_file).name}")
+    timer = profile.timer(Path(input_file).name)
     
     # Read original content
     with open(input_file, 'r', encoding='utf-8') as f:
         original_content = f.read()
+    timer.lap('read')
     
     # Process content
     processed_content = process_part_divider(original_content)
+    timer.lap('rewrite')
     
-    # Write output
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(processed_content)
+    # Write output (left untouched if it already holds this content)
+    changed = write_if_changed(output_file, processed_content)
+    timer.lap('write')
+    if stats is not None:
+        stats.update(input_chars=len(original_content), output_chars=len(processed_content), changed=changed)
     
     # Verify content preservation
-    preserved = verify_part_content(original_content, processed_content)
-    
-    if preserved:
-        print(f"✅ Part divider processed successfully: {Path(output_file).name}")
-        return True
-    else:
-        print(f"⚠️  Content verification issue: {Path(output_file).name}")
-        return False
+    preserved, lines = report_part(Path(output_file).name, original_content, processed_content)
+    timer.lap('preserve')
+    
+    for line in lines:
+        print(line)
+    return preserved
 
 if __name__ == "__main__":
     if len(sys.argv) != 3:
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Paragraph-Anchored Diff for Content Preservation Reports
+Aligns two documents on their headings and paragraphs, then diffs words only inside changed blocks.
+"""
+import re
+from difflib import SequenceMatcher
+
+from preservation_manifest import normalize_text_content
+
+# Tags that start or end a block of text; the text between two of them is diffed as one unit
+BLOCK_TAG_PATTERN = re.compile(
+    r'<(/?)(h[1-6]|p|div|section|aside|article|header|footer|nav|blockquote|li|ul|ol|dl|dt|dd|'
+    r'table|tr|td|th|figure|figcaption|head|body|title)\b[^>]*>',
+    re.IGNORECASE
+)
+
+# Changed regions longer than this are reported whole instead of word-diffed,
+# so a badly mangled chapter cannot make the report quadratic
+WORD_DIFF_LIMIT = 2000
+
+MAX_REPORTED_SPANS = 20
+EXCERPT_LENGTH = 80
+
+NO_SECTION = "before the first heading"
+
+class Block:
+    """Normalized text of one block plus the heading of the section it belongs to."""
+    __slots__ = ('text', 'section')
+
+    def __init__(self, text, section):
+        self.text = text
+        self.section = section
+
+class DiffSpan:
+    """One dropped, added or changed run of words."""
+    __slots__ = ('kind', 'section', 'original', 'processed')
+
+    def __init__(self, kind, section, original, processed):
+        self.kind = kind
+        self.section = section
+        self.original = original
+        self.processed = processed
+
+def split_into_blocks(content):
+    """Split XHTML into normalized text blocks at block-level tags, tracking the current section."""
+    blocks = []
+    section = NO_SECTION
+    in_heading = False
+    position = 0
+
+    def add(raw):
+        nonlocal section
+        text = normalize_text_content(raw)
+        if text:
+            if in_heading:
+                section = text
+            blocks.append(Block(text, section))
+
+    for match in BLOCK_TAG_PATTERN.finditer(content):
+        add(content[position:match.start()])
+        if match.group(2).lower().startswith('h') and match.group(2)[1:].isdigit():
+            in_heading = not match.group(1)
+        position = match.end()
+    add(content[position:])
+    return blocks
+
+def diff_words(original_text, processed_text, section):
+    """Word-level spans between two texts known to differ."""
+    original_words = original_text.split()
+    processed_words = processed_text.split()
+    if len(original_words) > WORD_DIFF_LIMIT or len(processed_words) > WORD_DIFF_LIMIT:
+        return [DiffSpan('changed', section, original_text, processed_text)]
+
+    spans = []
+    matcher = SequenceMatcher(None, original_words, processed_words, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'delete':
+            spans.append(DiffSpan('dropped', section, ' '.join(original_words[i1:i2]), ''))
+        elif tag == 'insert':
+            spans.append(DiffSpan('added', section, '', ' '.join(processed_words[j1:j2])))
+        elif tag == 'replace':
+            spans.append(DiffSpan('changed', section, ' '.join(original_words[i1:i2]),
+                                  ' '.join(processed_words[j1:j2])))
+    return spans
+
+def diff_documents(original_content, processed_content):
+    """Return every DiffSpan between the text of two XHTML documents.
+
+    Blocks are aligned by their exact text first, which is close to linear
+    when most paragraphs survive unchanged; words are only compared inside
+    the runs of blocks that did not align. Runs whose joined text is equal
+    (a paragraph split or merged by new markup) are not differences.
+    """
+    original_blocks = split_into_blocks(original_content)
+    processed_blocks = split_into_blocks(processed_content)
+
+    matcher = SequenceMatcher(None, [b.text for b in original_blocks], [b.text for b in processed_blocks],
+                              autojunk=False)
+    spans = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        original_run = original_blocks[i1:i2]
+        processed_run = processed_blocks[j1:j2]
+        original_text = ' '.join(b.text for b in original_run)
+        processed_text = ' '.join(b.text for b in processed_run)
+        if original_text == processed_text:
+            continue
+
+        if tag == 'delete':
+            spans.extend(DiffSpan('dropped', b.section, b.text, '') for b in original_run)
+        elif tag == 'insert':
+            spans.extend(DiffSpan('added', b.section, '', b.text) for b in processed_run)
+        else:
+            spans.extend(diff_words(original_text, processed_text, original_run[0].section))
+    return spans
+
+def excerpt(text):
+    if len(text) <= EXCERPT_LENGTH:
+        return text
+    return text[:EXCERPT_LENGTH - 1] + "…"
+
+def format_diff(spans, limit=MAX_REPORTED_SPANS):
+    """Report lines for a list of DiffSpans, in document order."""
+    lines = []
+    for span in spans[:limit]:
+        where = f"in “{excerpt(span.section)}”"
+        if span.kind == 'dropped':
+            lines.append(f"   ➖ Dropped {where}: “{excerpt(span.original)}”")
+        elif span.kind == 'added':
+            lines.append(f"   ➕ Added {where}: “{excerpt(span.processed)}”")
+        else:
+            lines.append(f"   ✏️  Changed {where}: “{excerpt(span.original)}” → “{excerpt(span.processed)}”")
+    if len(spans) > limit:
+        lines.append(f"   … and {len(spans) - limit} more differences")
+    return lines
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Preservation Fingerprint Manifest for EPUB Processing
+Stores a normalized-text digest of each source document, so preservation checks only need to
+hash the processed output.
+"""
+import codecs
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+
+from build_cache import digest_bytes, script_version
+
+MANIFEST_FILE = Path("/root/repo/epub-processing/.preservation-manifest.json")
+INPUT_DIR = Path("/root/repo/epub-processing/input")
+
+# Digests depend on the normalization below, so editing this file invalidates them
+MANIFEST_VERSION = script_version(__file__)
+
+TAG_PATTERN = re.compile(r'<[^>]+>')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+LEADING_ARROW_PATTERN = re.compile(r'^\s*→\s*', re.MULTILINE)  # Line number prefixes
+WORKSHEET_LINE_PATTERN = re.compile(r'\s*___+\s*')  # Worksheet lines
+
+# Applied in this order, so "&amp;nbsp;" ends up as a space
+HTML_ENTITIES = {
+    '&quot;': '"',
+    '&apos;': "'",
+    '&lt;': '<',
+    '&gt;': '>',
+    '&amp;': '&',
+    '&#x27;': "'",
+    '&nbsp;': ' '
+}
+
+# Longest text the entity replacements turn into one character ("&amp;nbsp;")
+ENTITY_SPAN = 10
+
+def normalize_text_content(content):
+    """Reduce already-loaded XHTML to its normalized text content."""
+    # Remove XML/HTML tags
+    text = TAG_PATTERN.sub('', content)
+
+    # Remove XML declarations and DOCTYPE
+    text = re.sub(r'<\?xml[^>]*\?>', '', text)
+    text = re.sub(r'<!DOCTYPE[^>]*>', '', text)
+
+    # Remove HTML entities
+    for entity, char in HTML_ENTITIES.items():
+        text = text.replace(entity, char)
+
+    # Normalize whitespace
+    text = WHITESPACE_PATTERN.sub(' ', text)
+    text = text.strip()
+
+    # Remove common formatting artifacts
+    text = LEADING_ARROW_PATTERN.sub('', text)
+    text = WORKSHEET_LINE_PATTERN.sub('', text)
+
+    return text
+
+def fingerprint_content(content):
+    """Digest the normalized text of a document."""
+    text = normalize_text_content(content)
+    return {
+        'digest': digest_bytes(text.encode('utf-8')),
+        'length': len(text),
+    }
+
+class TextFingerprint:
+    """Fingerprint of a document's normalized text, fed its content in pieces as it is written.
+
+    Gives the digest and length fingerprint_content would, without holding
+    the document: each step of normalize_text_content runs on every piece,
+    carrying over only what a match could still span (an open tag, the
+    last few characters after an ampersand, a run of whitespace or
+    underscores). The declaration and DOCTYPE steps need no pass of their
+    own, as the tag step already removes both. Usable as the tee of an
+    OutputFile: write() takes UTF-8 bytes.
+    """
+
+    def __init__(self):
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.hash = hashlib.sha256()
+        self.characters = 0   # characters fed, before normalization
+        self.length = 0       # characters of normalized text
+        self.tag_tail = ''
+        self.entity_tail = ''
+        self.started = False
+        self.pending_space = False
+        self.leading = ''     # text held until a leading "→" can be ruled out
+        self.at_start = True
+        self.line_tail = ''
+
+    def write(self, data):
+        self.feed(self.decoder.decode(data))
+
+    def feed(self, text):
+        self.characters += len(text)
+        text = self.tag_tail + text
+        # A tag match ends at the first ">" after its "<", so only text after the last ">" can be cut short
+        open_at = text.find('<', text.rfind('>') + 1)
+        if open_at == -1:
+            self.tag_tail = ''
+        else:
+            text, self.tag_tail = text[:open_at], text[open_at:]
+        self._entities(TAG_PATTERN.sub('', text))
+
+    def _entities(self, text, final=False):
+        text = self.entity_tail + text
+        self.entity_tail = ''
+        if not final:
+            amp = text.rfind('&', max(0, len(text) - ENTITY_SPAN + 1))
+            if amp != -1:
+                text, self.entity_tail = text[:amp], text[amp:]
+        for entity, char in HTML_ENTITIES.items():
+            text = text.replace(entity, char)
+        self._whitespace(text, final)
+
+    def _whitespace(self, text, final):
+        out = []
+        for i, piece in enumerate(WHITESPACE_PATTERN.split(text)):
+            if i:
+                self.pending_space = True
+            if piece:
+                if self.pending_space and self.started:
+                    out.append(' ')
+                out.append(piece)
+                self.started = True
+                self.pending_space = False
+        self._artifacts(''.join(out), final)
+
+    def _artifacts(self, text, final):
+        if self.at_start:
+            text = self.leading + text
+            if len(text) < 2 and not final:
+                self.leading = text
+                return
+            self.leading = ''
+            self.at_start = False
+            text = LEADING_ARROW_PATTERN.sub('', text, count=1)
+
+        text = self.line_tail + text
+        self.line_tail = ''
+        if not final:
+            # Worksheet line matches are made of spaces and underscores only, so none spans the cut
+            tail = len(text.rstrip(' _'))
+            text, self.line_tail = text[:tail], text[tail:]
+        text = WORKSHEET_LINE_PATTERN.sub('', text)
+        self.hash.update(text.encode('utf-8'))
+        self.length += len(text)
+
+    def close(self):
+        """Finish the text and return its fingerprint: {'digest', 'length'}."""
+        remaining = self.decoder.decode(b'', final=True)
+        if remaining:
+            self.feed(remaining)
+        # A "<" never closed by a ">" is kept as text
+        text, self.tag_tail = self.tag_tail, ''
+        self._entities(text, final=True)
+        return {'digest': self.hash.hexdigest(), 'length': self.length}
+
+class PreservationManifest:
+    """Persistent store of source document fingerprints.
+
+    Entries are keyed by the source path and recomputed whenever the file's
+    mtime or size changes, so a document is fingerprinted once when it
+    enters input/ and never again while it stays the same.
+    """
+
+    def __init__(self, manifest_file=MANIFEST_FILE):
+        self.manifest_file = Path(manifest_file)
+        self.entries = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+        if self.manifest_file.exists():
+            try:
+                with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == MANIFEST_VERSION:
+                    self.entries = data['documents']
+            except (OSError, ValueError, KeyError):
+                pass
+
+    def source_fingerprint(self, source_path, content=None):
+        """Return the fingerprint of a source document, computing it only if the file changed."""
+        source_path = Path(source_path)
+        stat = source_path.stat()
+        key = str(source_path.resolve())
+
+        entry = self.entries.get(key)
+        if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return entry['fingerprint']
+
+        if content is None:
+            with open(source_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        fingerprint = fingerprint_content(content)
+        with self.lock:
+            self.entries[key] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'fingerprint': fingerprint}
+            self.dirty = True
+        return fingerprint
+
+    def compare(self, source_path, processed_content, source_content=None):
+        """Check processed content against the stored source fingerprint.
+
+        Returns (preserved, source fingerprint, processed fingerprint).
+        """
+        return self.compare_fingerprint(source_path, fingerprint_content(processed_content), source_content)
+
+    def compare_fingerprint(self, source_path, processed, source_content=None):
+        """Check an already computed processed fingerprint (e.g. from a TextFingerprint) against the source's.
+
+        Returns what compare returns.
+        """
+        source = self.source_fingerprint(source_path, source_content)
+        return source['digest'] == processed['digest'], source, processed
+
+    def save(self):
+        """Write the manifest atomically if anything was recorded."""
+        if not self.dirty:
+            return
+        with self.lock:
+            tmp_file = self.manifest_file.with_name(self.manifest_file.name + '.tmp')
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({'version': MANIFEST_VERSION, 'documents': self.entries}, f)
+            os.replace(tmp_file, self.manifest_file)
+            self.dirty = False
+
+if __name__ == "__main__":
+    # Fingerprint everything currently in input/
+    manifest = PreservationManifest()
+    sources = sorted(INPUT_DIR.glob("*.xhtml"))
+    for source in sources:
+        fingerprint = manifest.source_fingerprint(source)
+        print(f"{source.name}: {fingerprint['length']} characters")
+    manifest.save()
+    print(f"Recorded {len(sources)} documents in {MANIFEST_FILE}")
@@ -1,67 +1,289 @@
 #!/usr/bin/env python3
 """
-Batch Process All Chapters with ACISS Transformation
+Batch Process All Chapters and Part Dividers with ACISS Transformation
+Runs the transformers in a pool of worker processes, largest files first, or as a pipeline
+that overlaps reads and writes with the transforms.
 """
+import argparse
+import asyncio
+import contextlib
+import functools
+import glob
+import io
 import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-import subprocess
-import glob
 
-def process_all_chapters():
-    """Process all 16 chapter files."""
-    
-    input_dir = Path("/root/repo/epub-processing/input")
-    output_dir = Path("/root/repo/epub-processing/output")
-    transformer_script = Path("/root/repo/epub-processing/simple-transformer.py")
-    
-    # Find all chapter files (not part dividers)
-    chapter_files = sorted(glob.glob(str(input_dir / "*-chapter-*.xhtml")))
-    
-    print(f"🚀 Starting batch processing of {len(chapter_files)} chapter files...")
+from build_cache import BuildCache, local_modules, script_version
+from output_writer import write_if_changed
+from preservation_manifest import PreservationManifest
+from run_log import NULL_RUN_LOG, add_log_arguments, open_run_log
+from script_loader import SCRIPT_DIR, load_script
+from stage_profiler import NULL_PROFILER, LapTimer, StageProfiler, default_profile_output, profile_call
+from transform_pipeline import run_pipeline
+
+INPUT_DIR = Path("/root/repo/epub-processing/input")
+OUTPUT_DIR = Path("/root/repo/epub-processing/output")
+
+# File kind -> (glob pattern, transformer script, processing function)
+PROCESSORS = {
+    'chapter': ("*-chapter-*.xhtml", "simple-transformer.py", "process_chapter"),
+    'part': ("*-Part-*.xhtml", "part-divider-processor.py", "process_part_file"),
+}
+
+def find_jobs(kinds):
+    """Collect (kind, input path) jobs, largest files first."""
+    jobs = []
+    for kind in kinds:
+        pattern = PROCESSORS[kind][0]
+        jobs.extend((kind, Path(f)) for f in glob.glob(str(INPUT_DIR / pattern)))
+
+    # Starting the biggest files first keeps the slowest one from being
+    # picked up last and leaving a single worker running on its own
+    jobs.sort(key=lambda job: (-job[1].stat().st_size, job[1].name))
+    return jobs
+
+# Loaded once per worker process by worker_manifest; the parent fingerprints
+# every pending input first, so workers only ever read it
+_worker_manifest = None
+
+def worker_manifest():
+    """The preservation manifest of this worker process, loaded on its first job."""
+    global _worker_manifest
+    if _worker_manifest is None:
+        _worker_manifest = PreservationManifest()
+    return _worker_manifest
+
+def run_job(kind, input_path, output_path, timed=False, profile_output=None):
+    """Run one transformer inside a worker process, capturing its console output.
+
+    Returns (success, output, stage timings, stats); the timings are empty
+    unless timed, and stats holds the character counts and elapsed seconds.
+    With a profile_output the whole call is also profiled into that file.
+    """
+    _, script_name, function_name = PROCESSORS[kind]
+    process = getattr(load_script(script_name), function_name)
+    if kind == 'chapter':
+        process = functools.partial(process, manifest=worker_manifest())
+    profile = StageProfiler() if timed else NULL_PROFILER
+    stats = {}
+
+    captured = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(captured):
+        if profile_output:
+            success = profile_call(profile_output, process, str(input_path), str(output_path),
+                                   profile=profile, stats=stats)
+        else:
+            success = process(str(input_path), str(output_path), profile=profile, stats=stats)
+    stats['elapsed'] = time.perf_counter() - start
+    timings = profile.files.get(input_path.name, {}) if timed else {}
+    return success, captured.getvalue().strip(), timings, stats
+
+def read_job(job):
+    with open(job[1], 'r', encoding='utf-8') as f:
+        return f.read()
+
+def transform_job(job, content):
+    """Transform already-read content inside a worker process of the pipeline.
+
+    Returns (processed content, success, report lines, stage timings, input characters).
+    """
+    kind, input_path, output_path = job
+    transform_document = load_script(PROCESSORS[kind][1]).transform_document
+    timings = {}
+    processed, success, lines = transform_document(str(input_path), output_path.name, content,
+                                                   worker_manifest(), LapTimer(timings))
+    return processed, success, lines, timings, len(content)
+
+def write_job(job, result):
+    """Write a transformed file unless it is unchanged; return the result with whether it changed."""
+    return result + (write_if_changed(job[2], result[0]),)
+
+def process_all_chapters(kinds=('chapter', 'part'), jobs=None, force=False, profile=None, profile_file=None,
+                         profile_output=None, run_log=NULL_RUN_LOG, pipeline=False, io_workers=4, queue_size=None):
+    """Process all chapter and part divider files in parallel, skipping unchanged ones.
+
+    With a StageProfiler every transformed file's stages are timed into it;
+    profile_file names one input to run under cProfile (or folded stacks)
+    into profile_output. Every file and the run totals are recorded in run_log.
+    With pipeline, reads and writes run on io_workers threads alongside the
+    transforms instead of inside them; results are the same either way.
+    """
+
+    work = find_jobs(kinds)
+    chapter_count = sum(1 for kind, _ in work if kind == 'chapter')
+    part_count = len(work) - chapter_count
+
+    print(f"🚀 Starting batch processing of {chapter_count} chapter and {part_count} part divider files...")
     print("=" * 60)
-    
+
     processed_count = 0
     failed_count = 0
-    
-    for chapter_file in chapter_files:
-        input_path = Path(chapter_file)
-        output_path = output_dir / input_path.name
-        
-        try:
-            # Run the transformer
-            result = subprocess.run([
-                "python3", str(transformer_script),
-                str(input_path), str(output_path)
-            ], capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                processed_count += 1
-                print(f"✅ {input_path.name}")
-            else:
-                failed_count += 1
-                print(f"❌ {input_path.name}: {result.stderr.strip()}")
-                
-        except Exception as e:
+    changed_count = 0
+
+    cache = BuildCache(force=force)
+    # Each kind's results depend on its transformer and every module it imports from here
+    versions = {kind: script_version(*local_modules(SCRIPT_DIR / PROCESSORS[kind][1])) for kind in kinds}
+
+    # Replay cached results for inputs whose transform output is still on disk
+    pending = []
+    for kind, input_path in work:
+        output_path = OUTPUT_DIR / input_path.name
+        cached = cache.lookup('transform', input_path.name, versions[kind], [input_path], output_path)
+        if cached is None:
+            pending.append((kind, input_path, output_path))
+        elif cached['success']:
+            processed_count += 1
+            print(f"✅ {input_path.name} (unchanged)")
+            run_log.file(input_path, output_path, 'success', cached=True, stats=cached)
+        else:
             failed_count += 1
-            print(f"❌ {input_path.name}: {e}")
-    
+            print(f"❌ {input_path.name}: {cached['reason']} (unchanged)")
+            run_log.file(input_path, output_path, 'failed', reason=cached['reason'], cached=True, stats=cached)
+
+    # Fingerprint new or changed inputs up front so the workers only ever
+    # read the preservation manifest and never race to write it
+    manifest = PreservationManifest()
+    for kind, input_path, _ in pending:
+        if kind == 'chapter':
+            manifest.source_fingerprint(input_path)
+    manifest.save()
+
+    def finish(kind, input_path, output_path, success, reason, stats, timings):
+        nonlocal processed_count, failed_count, changed_count
+        if profile is not None:
+            profile.merge(input_path.name, timings)
+        if stats.get('changed'):
+            changed_count += 1
+
+        if success:
+            processed_count += 1
+            print(f"✅ {input_path.name}")
+        else:
+            failed_count += 1
+            print(f"❌ {input_path.name}: {reason}")
+
+        cache.record('transform', input_path.name, versions[kind], [input_path], output_path,
+                     {'success': success, 'reason': reason, 'input_chars': stats.get('input_chars'),
+                      'output_chars': stats.get('output_chars')})
+        run_log.file(input_path, output_path, 'success' if success else 'failed',
+                     elapsed=stats['elapsed'], reason=reason, stats=stats)
+
+    def fail(input_path, output_path, error):
+        nonlocal failed_count
+        failed_count += 1
+        print(f"❌ {input_path.name}: {error}")
+        run_log.file(input_path, output_path, 'error', reason=str(error))
+
+    def pipeline_done(job, result, error, timings):
+        kind, input_path, output_path = job
+        if error is not None:
+            fail(input_path, output_path, error)
+            return
+        processed, success, lines, worker_timings, input_chars, changed = result
+        timings.update(worker_timings)
+        stats = {'input_chars': input_chars, 'output_chars': len(processed), 'changed': changed,
+                 'elapsed': sum(timings.values())}
+        finish(kind, input_path, output_path, success, "" if success else lines[-1].strip(), stats, timings)
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        if pipeline:
+            asyncio.run(run_pipeline(pending, read_job, transform_job, write_job, pipeline_done, executor,
+                                     cpu_workers=jobs or os.cpu_count(), io_workers=io_workers,
+                                     queue_size=queue_size))
+        else:
+            futures = {}
+            for kind, input_path, output_path in pending:
+                profile_output_for_job = None
+                if profile_file == input_path.name:
+                    profile_output_for_job = profile_output or default_profile_output(input_path.name)
+                future = executor.submit(run_job, kind, input_path, output_path, profile is not None,
+                                         profile_output_for_job)
+                futures[future] = (kind, input_path, output_path)
+
+            for future in as_completed(futures):
+                kind, input_path, output_path = futures[future]
+                try:
+                    success, output, timings, stats = future.result()
+                except Exception as e:
+                    fail(input_path, output_path, e)
+                    continue
+                reason = "" if success else (output.splitlines()[-1].strip() if output else "")
+                finish(kind, input_path, output_path, success, reason, stats, timings)
+
+    cache.save()
+    run_log.summary(kinds=list(kinds), jobs=jobs, force=force, pipeline=pipeline, changed=changed_count)
+
     print("=" * 60)
     print(f"📊 Processing Summary:")
     print(f"   ✅ Successfully processed: {processed_count}")
     print(f"   ❌ Failed: {failed_count}")
-    print(f"   📁 Total chapters: {len(chapter_files)}")
-    
+    print(f"   📝 Outputs changed: {changed_count}")
+    print(f"   📖 Chapters: {chapter_count}")
+    print(f"   📑 Part dividers: {part_count}")
+    print(f"   📁 Total files: {len(work)}")
+
     if failed_count == 0:
-        print("🎉 All chapters processed successfully!")
+        print("🎉 All files processed successfully!")
         return True
     else:
-        print("⚠️  Some chapters failed processing.")
+        print("⚠️  Some files failed processing.")
         return False
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Transform all chapters and part dividers to ACISS.")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count(),
+                        help="number of worker processes (default: CPU count)")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--chapters-only", action="store_true", help="process chapter files only")
+    group.add_argument("--parts-only", action="store_true", help="process part divider files only")
+    parser.add_argument("--force", action="store_true", help="ignore the build cache and reprocess every file")
+    parser.add_argument("--profile", action="store_true",
+                        help="time each stage of every file and print the slowest (implies --force)")
+    parser.add_argument("--profile-file", metavar="NAME",
+                        help="also profile this input file, e.g. 9-chapter-i-unveiling-your-creative-odyssey.xhtml")
+    parser.add_argument("--profile-output", metavar="PATH",
+                        help="where --profile-file writes: .prof for cProfile, .folded for flamegraph stacks "
+                             "(default: profiles/<name>.prof)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="overlap reads and writes with the transforms (helps on slow or network storage)")
+    parser.add_argument("--io-workers", type=int, default=4,
+                        help="threads reading and writing files in --pipeline mode (default: 4)")
+    parser.add_argument("--queue-size", type=int,
+                        help="files buffered between pipeline stages (default: twice --jobs)")
+    add_log_arguments(parser)
+    args = parser.parse_args()
+    if args.pipeline and args.profile_file:
+        parser.error("--profile-file profiles a whole transformer call and cannot be combined with --pipeline")
+    return args
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.chapters_only:
+        kinds = ('chapter',)
+    elif args.parts_only:
+        kinds = ('part',)
+    else:
+        kinds = ('chapter', 'part')
+
     try:
-        success = process_all_chapters()
+        # Profiling reprocesses everything; cached files would time nothing
+        profile = StageProfiler() if args.profile or args.profile_file else None
+        success = process_all_chapters(kinds, jobs=args.jobs, force=args.force or profile is not None,
+                                       profile=profile, profile_file=args.profile_file,
+                                       profile_output=args.profile_output,
+                                       run_log=open_run_log("process-all-chapters", args.log, not args.no_log),
+                                       pipeline=args.pipeline, io_workers=args.io_workers,
+                                       queue_size=args.queue_size)
+        if profile is not None:
+            print()
+            for line in profile.report():
+                print(line)
+        if args.profile_file:
+            print(f"🔬 Profile of {args.profile_file}: {args.profile_output or default_profile_output(args.profile_file)}")
         sys.exit(0 if success else 1)
     except Exception as e:
         print(f"💥 Fatal error: {e}")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Structured Run Log for the Batch Drivers
+Appends one JSON record per processed file and one summary record per run to a JSONL file.
+"""
+import json
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+RUN_LOG_FILE = Path("/root/repo/epub-processing/run-log.jsonl")
+
+def file_size(path):
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return None
+
+class RunLog:
+    """JSONL records of one driver run.
+
+    Every record carries the run id and driver name, so logs of many runs
+    (and many books) can be concatenated and grouped. Records are flushed as
+    they are written, so a crashed run still leaves its finished files.
+    """
+
+    def __init__(self, driver, log_file=RUN_LOG_FILE):
+        self.driver = driver
+        self.log_file = Path(log_file)
+        self.run_id = uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.counts = {}
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.log_file.parent.mkdir(parents=True, exist_ok=True)
+        self.handle = open(self.log_file, 'a', encoding='utf-8')
+
+    def _write(self, record):
+        self.handle.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.handle.flush()
+
+    def file(self, input_path, output_path, result, elapsed=None, reason="", cached=False, stats=None):
+        """Record one file: its sizes, character counts, time taken, result and whether its output changed."""
+        stats = stats or {}
+        input_bytes = file_size(input_path)
+        output_bytes = file_size(output_path) if output_path else None
+        self.counts[result] = self.counts.get(result, 0) + 1
+        self.input_bytes += input_bytes or 0
+        self.output_bytes += output_bytes or 0
+        self._write({
+            'type': 'file',
+            'run_id': self.run_id,
+            'driver': self.driver,
+            'path': str(input_path),
+            'output_path': str(output_path) if output_path else None,
+            'input_bytes': input_bytes,
+            'output_bytes': output_bytes,
+            'input_chars': stats.get('input_chars'),
+            'output_chars': stats.get('output_chars'),
+            'elapsed_seconds': round(elapsed, 6) if elapsed is not None else None,
+            'result': result,
+            'reason': reason or None,
+            'cached': cached,
+            'changed': stats.get('changed', False),
+        })
+
+    def summary(self, **extra):
+        """Record the run totals and close the log."""
+        elapsed = time.perf_counter() - self.started
+        files = sum(self.counts.values())
+        self._write({
+            'type': 'summary',
+            'run_id': self.run_id,
+            'driver': self.driver,
+            'finished': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'host': socket.gethostname(),
+            'files': files,
+            'results': self.counts,
+            'input_bytes': self.input_bytes,
+            'output_bytes': self.output_bytes,
+            'elapsed_seconds': round(elapsed, 6),
+            'files_per_second': round(files / elapsed, 3) if elapsed else None,
+            'mb_per_second': round(self.input_bytes / 1024 / 1024 / elapsed, 3) if elapsed else None,
+            **extra,
+        })
+        self.close()
+
+    def close(self):
+        if not self.handle.closed:
+            self.handle.close()
+
+class NullRunLog:
+    """Stands in for a RunLog when logging is off."""
+
+    def file(self, *args, **kwargs):
+        pass
+
+    def summary(self, **extra):
+        pass
+
+    def close(self):
+        pass
+
+NULL_RUN_LOG = NullRunLog()
+
+def open_run_log(driver, log_file=RUN_LOG_FILE, enabled=True):
+    return RunLog(driver, log_file) if enabled else NULL_RUN_LOG
+
+def add_log_arguments(parser):
+    """The --log and --no-log options every driver shares."""
+    parser.add_argument("--log", metavar="PATH", default=str(RUN_LOG_FILE),
+                        help=f"append JSONL run records to PATH (default: {RUN_LOG_FILE.name})")
+    parser.add_argument("--no-log", action="store_true", help="do not write run records")
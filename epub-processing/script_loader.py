@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""
+Script Loader for EPUB Processing
+Imports the hyphen-named processing scripts as regular modules.
+"""
+import importlib.util
+import sys
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+def load_script(script_name, directory=SCRIPT_DIR):
+    """Import a processing script such as 'simple-transformer.py' and return it as a module."""
+    module_name = Path(script_name).stem.replace('-', '_')
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+
+    spec = importlib.util.spec_from_file_location(module_name, Path(directory) / script_name)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Streaming Section Extraction for Large Chapters
+Parses a chapter incrementally with expat and hands each ACISS section's bytes and their offsets
+to a sink as they are read, so memory stays bounded whatever the chapter size.
+"""
+import re
+from xml.parsers import expat
+
+# Bytes read from the source per parser call
+CHUNK_SIZE = 64 * 1024
+
+# (name, tag, class) of every element whose content is extracted; class None matches any element of the tag
+CHAPTER_SECTIONS = (
+    ('title', 'title', None),
+    ('number', 'div', 'chapter-number-text'),
+    ('title_word', 'h1', 'chapter-title-word'),
+    ('quote_text', 'blockquote', 'bible-quote-text'),
+    ('quote_ref', 'figcaption', 'bible-quote-reference'),
+    ('introduction', 'div', 'introduction-paragraph'),
+    ('body', 'section', 'chap-body'),
+    ('endnotes', 'aside', 'endnotes'),
+    ('quiz', 'section', 'quiz-container'),
+    ('worksheet', 'section', 'worksheet'),
+    ('closing', 'section', 'image-quote'),
+)
+
+# Title sections, which only count until the first other section starts and are kept as text
+CHAPTER_HELD = ('title', 'number', 'title_word')
+
+# (section, tag, class) of wrappers whose tags are dropped when they are a direct child of the section
+CHAPTER_WRAPPERS = (
+    ('body', 'div', 'content-area'),
+)
+
+# UTF-8 continuation bytes; everything else starts a character
+CONTINUATION_BYTES = bytes(range(0x80, 0xC0))
+
+START_TAG_PATTERN = re.compile(rb'<[^>"\']*(?:(?:"[^"]*"|\'[^\']*\')[^>"\']*)*>')
+
+def rules_by_tag(rules):
+    """Group (name, tag, class) rules by tag, so most elements cost a single lookup."""
+    grouped = {}
+    for name, tag, class_name in rules:
+        grouped.setdefault(tag, []).append((name, class_name))
+    return grouped
+
+def find_rule(grouped, tag, attrs):
+    """Name of the first rule an element matches, or None."""
+    rules = grouped.get(tag)
+    if rules:
+        classes = attrs.get('class', '').split()
+        for name, class_name in rules:
+            if class_name is None or class_name in classes:
+                return name
+    return None
+
+class SectionStream:
+    """Routes the raw bytes of each extracted section to a sink while the document is parsed.
+
+    The sink's start(name) is called when a section's start tag is seen and
+    decides whether it is captured; data(name, raw bytes, offset) then
+    delivers its content piece by piece, exactly as written in the source
+    and with the byte offset of each piece in it, and end(name)
+    follows its end tag. A section nested in another is delivered on its own
+    and left out of the outer one. A wrapper is unwrapped when no other
+    element the rules name lies between it and its section. Only the bytes
+    not yet routed are kept.
+    """
+
+    def __init__(self, sink, sections=CHAPTER_SECTIONS, wrappers=CHAPTER_WRAPPERS):
+        self.sink = sink
+        self.sections = rules_by_tag(sections)
+        self.wrappers = rules_by_tag(wrappers)
+        self.tags = self.sections.keys() | self.wrappers.keys()
+        self.parser = expat.ParserCreate()
+        self.parser.StartElementHandler = self._start
+        self.parser.EndElementHandler = self._end
+        self.parser.CharacterDataHandler = self._seen
+        self.buffer = bytearray()
+        self.base = 0      # offset of buffer[0] in the document
+        self.cursor = 0    # everything before this offset has been routed
+        self.safe = 0      # everything before this offset has been tokenized
+        self.target = None
+        self.stack = []    # (section it belongs to, 'section', 'wrapper' or None) per open element of self.tags
+        self.characters = 0
+
+    def _route(self, end):
+        if end > self.cursor:
+            if self.target is not None:
+                self.sink.data(self.target, bytes(self.buffer[self.cursor - self.base:end - self.base]), self.cursor)
+            self.cursor = end
+
+    def _skip_tag(self, position):
+        """Route everything before a tag that belongs to no section, then step over it."""
+        self._route(position)
+        match = START_TAG_PATTERN.match(self.buffer, position - self.base)
+        self.cursor = self.safe = self.base + match.end()
+
+    def _seen(self, data):
+        self.safe = self.parser.CurrentByteIndex
+
+    def _start(self, tag, attrs):
+        position = self.parser.CurrentByteIndex
+        self.safe = position
+        if tag not in self.tags:
+            return
+        name = find_rule(self.sections, tag, attrs)
+        if name is not None and self.sink.start(name):
+            self._skip_tag(position)
+            self.target = name
+            self.stack.append((name, 'section'))
+            return
+
+        section = find_rule(self.wrappers, tag, attrs)
+        if section is not None and self.stack and self.stack[-1] == (section, 'section'):
+            self._skip_tag(position)
+            self.stack.append((section, 'wrapper'))
+            return
+        self.stack.append((self.target, None))
+
+    def _end(self, tag):
+        position = self.parser.CurrentByteIndex
+        self.safe = position
+        if tag not in self.tags:
+            return
+        capture, kind = self.stack.pop()
+        if kind == 'section':
+            self._route(position)
+            self.sink.end(capture)
+            self._skip_tag(position)
+            self.target = self.stack[-1][0] if self.stack else None
+        elif kind == 'wrapper':
+            self._skip_tag(position)
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        self.characters += len(chunk.translate(None, CONTINUATION_BYTES))
+        self.parser.Parse(chunk, False)
+        # Bytes up to the last event are settled; route them and let them go
+        self._route(self.safe)
+        del self.buffer[:self.cursor - self.base]
+        self.base = self.cursor
+
+    def close(self):
+        self.parser.Parse(b'', True)
+        self._route(self.base + len(self.buffer))
+        self.buffer.clear()
+
+def stream_sections(source, sink, sections=CHAPTER_SECTIONS, wrappers=CHAPTER_WRAPPERS, chunk_size=CHUNK_SIZE):
+    """Parse a binary source file in chunks, delivering its sections to sink; return its character count.
+
+    Raises expat.ExpatError if the source is not well-formed XML.
+    """
+    stream = SectionStream(sink, sections, wrappers)
+    while chunk := source.read(chunk_size):
+        stream.feed(chunk)
+    stream.close()
+    sink.close()
+    return stream.characters
@@ -7,154 +7,155 @@ import re
 import sys
 from pathlib import Path
 
-def transform_chapter_to_aciss(content):
-    """Transform chapter using direct replacements to ensure content preservation."""
-    
-    # Step 1: Update the title page structure
+from output_writer import write_if_changed
+from preservation_diff import diff_documents, format_diff
+from preservation_manifest import PreservationManifest
+from stage_profiler import NULL_PROFILER, NULL_TIMER
+
+# Each ACISS rewrite is one alternative of a single master pattern, so the
+# chapter is tokenized in one left-to-right scan and the output is joined once.
+# Alternatives are listed in the order the original rule cascade applied them.
+ACISS_REWRITE_RULES = [
     # Replace chapter-title-stack with title-stack + title-bar + title-lines
-    content = re.sub(
-        r'<div class="chapter-title-stack">\s*<div class="chapter-title-vertical"[^>]*></div>\s*<div>',
-        '''<div class="title-stack">
+    ('title_stack', r'div class="chapter-title-stack">\s*<div class="chapter-title-vertical"[^>]*></div>\s*<div>'),
+    # Replace chapter-title-word with title-line, then fold every run of three
+    # closing divs into two (the title-line close counts towards the run)
+    ('div_run', r'(?:h1 class="chapter-title chapter-title-word">(?P<title_word>[^<]+)</h1>|/div>)(?:\s*</div>)*'),
+    # Page breaks before the body, the endnotes and the quiz
+    ('body_break', r'/section>\s*(?=<section class="chap-body")'),
+    ('endnotes_break', r'/section>\s*(?=<aside class="endnotes")'),
+    ('quiz_break', r'/aside>\s*(?=<section class="quiz-container)'),
+    # ACISS class compatibility
+    ('body_class', r'body class="chap-title">'),
+    ('quiz_class', r'section class="quiz-container chap-quiz"'),
+    ('worksheet_class', r'section class="worksheet"'),
+    ('closing', r'section class="image-quote"'),
+    ('title_comment', r'section class="chap-title">'),
+]
+
+ACISS_REWRITE_PATTERN = re.compile(
+    '<(?:' + '|'.join(f'(?P<{name}>{pattern})' for name, pattern in ACISS_REWRITE_RULES) + ')'
+)
+
+ACISS_REPLACEMENTS = {
+    'title_stack': '''<div class="title-stack">
             <div class="title-bar"></div>
             <div class="title-lines">''',
-        content,
-        flags=re.DOTALL
-    )
-    
-    # Replace chapter-title-word with title-line
-    content = re.sub(
-        r'<h1 class="chapter-title chapter-title-word">([^<]+)</h1>',
-        r'<div class="title-line">\1</div>',
-        content
-    )
-    
-    # Close the title-lines and title-stack properly
-    content = re.sub(
-        r'</div>\s*</div>\s*</div>',
-        '''</div>
-        </div>''',
-        content
-    )
-    
-    # Step 2: Add page breaks between sections
-    # Add page break after chap-title section
-    content = re.sub(
-        r'</section>\s*<section class="chap-body"',
-        '''</section>
+    'body_break': '''</section>
 
 <!-- PAGE BREAK -->
 <div class="page-break"></div>
 
 <!-- PAGES 2-4: BODY CONTENT -->
-<section class="chap-body"''',
-        content,
-        flags=re.DOTALL
-    )
-    
-    # Add page break before endnotes
-    content = re.sub(
-        r'</section>\s*<aside class="endnotes"',
-        '''</section>
+''',
+    'endnotes_break': '''</section>
 
 <!-- PAGE BREAK -->
 <div class="page-break"></div>
 
 <!-- PAGE 5: ENDNOTES -->
-<aside class="endnotes"''',
-        content,
-        flags=re.DOTALL
-    )
-    
-    # Add page break before quiz
-    content = re.sub(
-        r'</aside>\s*<section class="quiz-container',
-        '''</aside>
+''',
+    'quiz_break': '''</aside>
 
 <!-- PAGE BREAK -->
 <div class="page-break"></div>
 
 <!-- PAGE 6: QUIZ & WORKSHEET -->
-<section class="quiz-container''',
-        content,
-        flags=re.DOTALL
-    )
-    
-    # Step 3: Add ACISS class compatibility
-    # Update body class to chapter-page
-    content = re.sub(
-        r'<body class="chap-title">',
-        '<body class="chapter-page">',
-        content
-    )
-    
-    # Add avoid-break classes to quiz and worksheet sections
-    content = re.sub(
-        r'<section class="quiz-container chap-quiz"',
-        '<section class="quiz-container chap-quiz avoid-break"',
-        content
-    )
-    
-    content = re.sub(
-        r'<section class="worksheet"',
-        '<section class="worksheet avoid-break"',
-        content
-    )
-    
-    # Step 4: Update closing section to use ACISS closing class
-    content = re.sub(
-        r'<section class="image-quote"',
-        '<section class="closing">',
-        content
-    )
-    
-    # Step 5: Add ACISS comments for clarity
-    content = re.sub(
-        r'<section class="chap-title">',
-        '''<!-- PAGE 1: TITLE PAGE -->
+''',
+    'body_class': '<body class="chapter-page">',
+    'quiz_class': '<section class="quiz-container chap-quiz avoid-break"',
+    'worksheet_class': '<section class="worksheet avoid-break"',
+    'closing': '<section class="closing">',
+    'title_comment': '''<!-- PAGE 1: TITLE PAGE -->
 <section class="chap-title">''',
-        content
-    )
-    
-    return content
-
-def verify_content_preservation(original, processed):
-    """Verify that all text content is preserved."""
-    def extract_text(html):
-        # Remove HTML tags and normalize whitespace
-        text = re.sub(r'<[^>]+>', '', html)
-        text = re.sub(r'\s+', ' ', text)
-        return text.strip()
-    
-    original_text = extract_text(original)
-    processed_text = extract_text(processed)
+}
+
+DIV_RUN_GAP = re.compile(r'(\s*)</div>')
+
+FOLDED_DIV_CLOSE = '''</div>
+        </div>'''
+
+def rewrite_div_run(match):
+    """Fold a run of closing divs three at a time, leaving any remainder untouched."""
+    title_word = match.group('title_word')
+    first_end = match.end('title_word') + len('</h1>') if title_word is not None else match.start() + len('</div>')
+    gaps = [''] + DIV_RUN_GAP.findall(match.string, first_end, match.end())
+    
+    parts = [f'<div class="title-line">{title_word}'] if title_word is not None else []
+    index = 0
+    while index < len(gaps):
+        parts.append(gaps[index])
+        if len(gaps) - index >= 3:
+            parts.append(FOLDED_DIV_CLOSE)
+            index += 3
+        else:
+            parts.append('</div>')
+            index += 1
+    return ''.join(parts)
+
+def rewrite_aciss_token(match):
+    """Return the ACISS replacement for a single matched token."""
+    if match.lastgroup == 'div_run':
+        return rewrite_div_run(match)
+    return ACISS_REPLACEMENTS[match.lastgroup]
+
+def transform_chapter_to_aciss(content):
+    """Transform chapter in a single scan, applying every ACISS rewrite to preserve content."""
+    return ACISS_REWRITE_PATTERN.sub(rewrite_aciss_token, content)
+
+def verify_content_preservation(manifest, input_file, original, processed):
+    """Verify that all text content is preserved, against the input's stored fingerprint."""
+    preserved, source, result = manifest.compare(input_file, processed, original)
+    return preserved, source['length'], result['length']
+
+def report_preservation(manifest, input_file, output_name, original, processed):
+    """Check preservation and return (preserved, report lines)."""
+    preserved, orig_len, proc_len = verify_content_preservation(manifest, input_file, original, processed)
+    if preserved:
+        return True, [f"✅ CONTENT 100% PRESERVED: {output_name}"]
     
-    return original_text == processed_text, len(original_text), len(processed_text)
+    lines = [f"⚠️  Content preservation issue: {output_name}"]
+    lines.extend(format_diff(diff_documents(original, processed)))
+    lines.append(f"   Original: {orig_len} chars, Processed: {proc_len} chars")
+    return False, lines
+
+def transform_document(input_file, output_name, original_content, manifest, timer=NULL_TIMER):
+    """Transform and check already-read content; return (processed content, preserved, report lines)."""
+    processed_content = transform_chapter_to_aciss(original_content)
+    timer.lap('rewrite')
+    preserved, lines = report_preservation(manifest, input_file, output_name, original_content, processed_content)
+    timer.lap('preserve')
+    return processed_content, preserved, lines
 
-def process_chapter(input_file, output_file):
-    """Process a chapter file with ACISS transformation."""
+def process_chapter(input_file, output_file, manifest, profile=NULL_PROFILER, stats=None):
+    """Process a chapter file with ACISS transformation; character counts go into stats if given."""
     print(f"🔄 Processing {Path(input_file).name}...")
+    timer = profile.timer(Path(input_file).name)
     
     # Read original
     with open(input_file, 'r', encoding='utf-8') as f:
         original_content = f.read()
+    timer.lap('read')
     
-    # Transform
+    # Transform (a single scan, so there is no separate extract stage)
     processed_content = transform_chapter_to_aciss(original_content)
+    timer.lap('rewrite')
     
-    # Write output
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(processed_content)
+    # Write output (left untouched if it already holds this content)
+    changed = write_if_changed(output_file, processed_content)
+    timer.lap('write')
+    if stats is not None:
+        stats.update(input_chars=len(original_content), output_chars=len(processed_content), changed=changed)
     
     # Verify preservation
-    preserved, orig_len, proc_len = verify_content_preservation(original_content, processed_content)
+    preserved, lines = report_preservation(
+        manifest, input_file, Path(output_file).name, original_content, processed_content
+    )
+    timer.lap('preserve')
     
-    if preserved:
-        print(f"✅ CONTENT 100% PRESERVED: {Path(output_file).name}")
-        return True
-    else:
-        print(f"⚠️  Content preservation issue: {Path(output_file).name}")
-        print(f"   Original: {orig_len} chars, Processed: {proc_len} chars")
-        return False
+    for line in lines:
+        print(line)
+    return preserved
 
 if __name__ == "__main__":
     if len(sys.argv) != 3:
@@ -165,7 +166,9 @@ if __name__ == "__main__":
     output_file = sys.argv[2]
     
     try:
-        success = process_chapter(input_file, output_file)
+        manifest = PreservationManifest()
+        success = process_chapter(input_file, output_file, manifest)
+        manifest.save()
         sys.exit(0 if success else 1)
     except Exception as e:
         print(f"❌ Error: {e}")
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Per-Stage Timing for the Transform and Validation Scripts
+Times read, extract, rewrite, write, preserve and validate for every file, and can profile
+one chosen file with cProfile or as folded stacks for flamegraph tools.
+"""
+import cProfile
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+STAGES = ('read', 'extract', 'rewrite', 'write', 'preserve', 'validate')
+
+PROFILE_DIR = Path("/root/repo/profiles")
+
+class LapTimer:
+    """Charges the time since the previous lap to a stage of one file."""
+
+    def __init__(self, timings):
+        self.timings = timings
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0.0) + now - self.last
+        self.last = now
+
+class NullTimer:
+    def lap(self, stage):
+        pass
+
+NULL_TIMER = NullTimer()
+
+class StageProfiler:
+    """Seconds spent per file and stage, mergeable across worker processes."""
+
+    def __init__(self):
+        self.files = {}
+
+    def timer(self, file_name):
+        return LapTimer(self.files.setdefault(file_name, {}))
+
+    def merge(self, file_name, timings):
+        """Add timings recorded elsewhere (e.g. returned by a worker process)."""
+        own = self.files.setdefault(file_name, {})
+        for stage, seconds in timings.items():
+            own[stage] = own.get(stage, 0.0) + seconds
+
+    def report(self, limit=10):
+        """Summary lines: time per stage, then the slowest files with their slowest stage."""
+        totals = Counter()
+        for timings in self.files.values():
+            totals.update(timings)
+        grand_total = sum(totals.values())
+        if not grand_total:
+            return ["⏱️  No stages were timed"]
+
+        lines = [f"⏱️  STAGE TIMINGS ({len(self.files)} files, {grand_total * 1000:.1f} ms)", "-" * 60]
+        ordered = [s for s in STAGES if s in totals] + sorted(s for s in totals if s not in STAGES)
+        for stage in ordered:
+            share = totals[stage] / grand_total * 100
+            lines.append(f"   {stage:<10} {totals[stage] * 1000:10.2f} ms  {share:5.1f}%  {'█' * round(share / 4)}")
+
+        lines.append("")
+        lines.append(f"🐢 Slowest files (top {min(limit, len(self.files))})")
+        lines.append("-" * 60)
+        slowest = sorted(self.files.items(), key=lambda item: sum(item[1].values()), reverse=True)[:limit]
+        for name, timings in slowest:
+            total = sum(timings.values())
+            stage, seconds = max(timings.items(), key=lambda item: item[1])
+            lines.append(f"   {total * 1000:8.2f} ms  {name}  (mostly {stage}: {seconds * 1000:.2f} ms)")
+        return lines
+
+class NullProfiler:
+    """Stands in for a StageProfiler when timing is off, so callers never branch."""
+
+    def timer(self, file_name):
+        return NULL_TIMER
+
+    def merge(self, file_name, timings):
+        pass
+
+NULL_PROFILER = NullProfiler()
+
+class FoldedStackProfiler:
+    """Exact call stacks via sys.setprofile, written in the folded format of flamegraph.pl and speedscope.
+
+    A sampling profiler would see nothing of a chapter that transforms in a
+    millisecond, so every call and return is followed instead and the time
+    between events is charged to the full stack, in microseconds.
+    """
+
+    def __init__(self):
+        self.stack = []
+        self.totals = Counter()
+        self.last = 0
+
+    def _event(self, frame, event, arg):
+        now = time.perf_counter_ns()
+        if self.stack:
+            self.totals[';'.join(self.stack)] += now - self.last
+        if event == 'call':
+            code = frame.f_code
+            self.stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+        elif event == 'c_call':
+            self.stack.append(f"{getattr(arg, '__qualname__', repr(arg))} (builtin)")
+        elif self.stack:
+            self.stack.pop()
+        self.last = time.perf_counter_ns()
+
+    def run(self, function, *args, **kwargs):
+        self.last = time.perf_counter_ns()
+        sys.setprofile(self._event)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            sys.setprofile(None)
+
+    def write(self, output_file):
+        with open(output_file, 'w', encoding='utf-8') as f:
+            for stack, nanoseconds in sorted(self.totals.items()):
+                microseconds = nanoseconds // 1000
+                if microseconds:
+                    f.write(f"{stack} {microseconds}\n")
+
+def default_profile_output(file_name):
+    return PROFILE_DIR / f"{Path(file_name).stem}.prof"
+
+def profile_call(output_file, function, *args, **kwargs):
+    """Run one call under a profiler and write the result.
+
+    Output ending in .folded gets folded stacks for flamegraph tools; anything
+    else gets cProfile stats for pstats, snakeviz or flameprof.
+    """
+    output_file = Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    if output_file.suffix == '.folded':
+        profiler = FoldedStackProfiler()
+        result = profiler.run(function, *args, **kwargs)
+        profiler.write(output_file)
+        return result
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args, **kwargs)
+    finally:
+        profiler.dump_stats(output_file)
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Synthetic Corpus Generator for Pipeline Benchmarks
+Writes chapters and part dividers with the exact markup of input/*.xhtml, filled with
+seeded random text, at any chapter size and chapter count.
+"""
+import random
+import re
+import sys
+from pathlib import Path
+
+WORDS = (
+    "hair stylist client salon color texture cut curl style care creative vision business "
+    "confidence identity culture mentor practice craft technique growth community service "
+    "consultation product brand portfolio education wellness balance legacy trust empathy "
+    "the and of to a in for with your that is as on by their every from this more through "
+    "build create discover explore inspire transform nurture embrace refine master deliver "
+    "natural classic modern bold gentle lasting conscious inclusive sustainable professional"
+).split()
+
+TITLE_WORDS = (
+    "Unveiling Refining Reigniting Cultivating Mastering Embracing Advancing Stepping Crafting "
+    "Creative Professional Enduring Digital Financial Resilient Diverse Odyssey Toolkit Fire "
+    "Excellence Mentorship Business Wellness Skills Leadership Legacies Strategies Ventures"
+).split()
+
+SIZE_UNITS = {'': 1, 'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+# Stands in for the body while the rest of a chapter is measured
+BODY_MARKER = '\0BODY\0'
+
+# Chapters cite this many endnotes, as the input chapters do
+ENDNOTE_COUNT = 10
+
+def parse_size(text):
+    """Parse a size such as '36KB', '10MB' or '2048' into bytes."""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMG]?B?)\s*', text.upper())
+    if not match:
+        raise ValueError(f"Invalid size: {text}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+def to_roman(number):
+    """Roman numeral for any positive number (chapter counts go well past XVI here)."""
+    numerals = [(1000, 'M'), (900, 'CM'), (500, 'D'), (400, 'CD'), (100, 'C'), (90, 'XC'),
+                (50, 'L'), (40, 'XL'), (10, 'X'), (9, 'IX'), (5, 'V'), (4, 'IV'), (1, 'I')]
+    result = []
+    for value, numeral in numerals:
+        count, number = divmod(number, value)
+        result.append(numeral * count)
+    return ''.join(result)
+
+class TextSource:
+    """Seeded random words, sentences and paragraphs."""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+
+    def words(self, low, high):
+        return ' '.join(self.rng.choices(WORDS, k=self.rng.randint(low, high)))
+
+    def sentence(self):
+        text = self.words(8, 24)
+        return text[0].upper() + text[1:] + '.'
+
+    def paragraph(self, low=3, high=7):
+        return ' '.join(self.sentence() for _ in range(self.rng.randint(low, high)))
+
+    def title(self, low, high):
+        return ' '.join(self.rng.choice(TITLE_WORDS) for _ in range(self.rng.randint(low, high)))
+
+def chapter_body(text, target_bytes, notes):
+    """Body sections in the input's pattern, at least one subsection and until target_bytes is reached."""
+    parts = []
+    size = 0
+    subsection = 0
+    footnote = 0
+    while subsection == 0 or size < target_bytes:
+        section, position = divmod(subsection, 3)
+        subsection += 1
+        chunk = [f'<h2>{to_roman(section + 1)}. {text.title(3, 6)}</h2>'] if position == 0 else []
+        chunk.append(f'<h3>{text.title(3, 7)}</h3>')
+        if footnote < notes:
+            footnote += 1
+            chunk.append(f'<p>{text.paragraph()}<sup id="fnref-{footnote}"><a href="#fn-{footnote}">'
+                         f'{footnote}</a></sup> {text.paragraph(1, 3)}</p>')
+        else:
+            chunk.append(f'<p>{text.paragraph()}</p>')
+        steps = ''.join(f'<li><em>{text.title(2, 4)}:</em> {text.sentence()}</li>' for _ in range(3))
+        if section % 2 == 0:
+            chunk.append(f'<div class="action-steps">\n<h2>Actionable Steps</h2>\n<ol>\n{steps}\n</ol>\n</div>')
+        else:
+            chunk.append(f'<p><em>Actionable Steps:</em></p>\n<ul>{steps}</ul>')
+        html = '\n'.join(chunk) + '\n'
+        parts.append(html)
+        size += len(html.encode('utf-8'))
+    return ''.join(parts)
+
+def generate_chapter(number, target_bytes, seed=0):
+    """One chapter in the markup of input/*-chapter-*.xhtml, close to target_bytes long."""
+    text = TextSource(f"{seed}-chapter-{number}")
+    roman = to_roman(number)
+    title_words = text.title(2, 7).split()
+    title = ' '.join(title_words)
+    title_html = '\n'.join(f'<h1 class="chapter-title chapter-title-word">{word}</h1>' for word in title_words)
+    intro = '\n'.join(f'<p>{text.paragraph(1, 3)}</p>' for _ in range(4))
+    endnotes = '\n'.join(f'    <li id="fn-{n}"><p>{text.sentence()} <em>{text.title(2, 5)}</em> '
+                         f'(New York: Publisher, 2020).</p></li>' for n in range(1, ENDNOTE_COUNT + 1))
+    quiz = []
+    for question in range(1, 5):
+        options = '\n'.join(f'<li class="quiz-option"><span class="opt-label">{label})</span> {text.words(4, 10)}</li>'
+                            for label in 'ABC')
+        quiz.append(f'<h3>Question {question}</h3>\n<p>{text.sentence()}</p>\n<ul class="quiz-options">\n{options}\n</ul>')
+    blank = '<p>' + '_' * 70 + '</p>'
+    worksheet = '\n'.join(f'<ol><li><strong>{text.sentence()}</strong></li></ol>\n' + '\n'.join([blank] * 3)
+                          for _ in range(4))
+    closing = text.paragraph(1, 2)
+
+    document = f'''<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" xml:lang="en" lang="en">
+  <head>
+    <meta charset="UTF-8" />
+    <meta name="viewport" content="width=device-width, initial-scale=1.0" />
+    <title>Chapter {roman} – {title}</title><link rel="stylesheet" type="text/css" href="../styles/fonts.css" />
+    <link rel="stylesheet" type="text/css" href="../styles/style.css" />
+  </head>
+  <body class="chap-title">
+    <main role="main" epub:type="bodymatter chapter">
+    <section class="chap-title" role="region">
+      <div class="chapter-number-container" aria-label="Chapter number">
+        <div class="chapter-number-brush">
+          <img class="brushstroke-img" src="../images/brushstroke.JPEG" alt="" />
+          <div class="chapter-number-text">{roman}</div>
+        </div>
+      </div>
+      <div class="chapter-title-container">
+        <div class="chapter-title-stack">
+          <div class="chapter-title-vertical" aria-hidden="true"></div>
+          <div>
+            {title_html}
+          </div>
+        </div>
+      </div>
+      <figure class="bible-quote-container image-quote" role="group" aria-labelledby="bq-text bq-ref">
+        <blockquote class="bible-quote-text" id="bq-text">
+          &quot;{text.sentence()}&quot;</blockquote>
+        <figcaption class="bible-quote-reference" id="bq-ref">— Proverbs {number}:{text.rng.randint(1, 30)}</figcaption>
+      </figure>
+      <div class="introduction-heading" role="heading" aria-level="2">Introduction</div>
+      <div class="introduction-paragraph dropcap-first-letter">
+        {intro}
+      </div>
+    </section>
+    <section class="chap-body" role="region">
+      <div class="content-area">
+{BODY_MARKER}<h2>Chapter Conclusion</h2>
+<p>{text.paragraph()}</p>
+<aside class="endnotes" role="complementary">
+  <h2 class="endnotes-title">Endnotes</h2>
+  <ol>
+{endnotes}
+  </ol>
+</aside>
+<section class="quiz-container chap-quiz avoid-break" role="region" aria-labelledby="quiz-title">
+<h2 id="quiz-title" class="quiz-title">Quiz</h2>
+{chr(10).join(quiz)}
+</section>
+<section class="worksheet avoid-break" role="region" aria-labelledby="ws-title">
+<h2 id="ws-title" class="worksheet-title">Worksheet</h2>
+<h3>Reflection and Implementation Exercises</h3>
+{worksheet}
+</section>
+<section class="image-quote" role="group" aria-labelledby="closing-caption">
+  <figure>
+    <img src="../images/chapter-{roman.lower()}-quote.JPEG" alt="{closing}" />
+    <figcaption id="closing-caption" class="font-small color-light">{closing}</figcaption>
+  </figure>
+</section>
+      </div>
+    </section>
+    </main>
+  </body>
+</html>
+'''
+    body = chapter_body(text, target_bytes - len(document.encode('utf-8')), ENDNOTE_COUNT)
+    return document.replace(BODY_MARKER, body)
+
+def generate_part(number, first_chapter, last_chapter, seed=0):
+    """One part divider in the markup of input/*-Part-*.xhtml."""
+    text = TextSource(f"{seed}-part-{number}")
+    roman = to_roman(number)
+    title = text.title(3, 5)
+    return f'''<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml">
+<head>
+  <meta charset="utf-8" />
+  <title>Part {roman} – {title}</title>
+  <meta name="viewport" content="width=device-width, initial-scale=1.0" />
+  <!-- Link to shared EPUB stylesheets. Use relative paths to the /OEBPS/styles folder. -->
+    <link rel="stylesheet" type="text/css" href="../styles/fonts.css" />
+    <link rel="stylesheet" type="text/css" href="../styles/style.css" />
+  </head>
+<body class="part">
+  <section class="part-divider">
+    <!-- Part title and subtitle -->
+    <h1 class="part-title">Part {roman}: {title}</h1>
+    <h2 class="part-subtitle">Chapters {to_roman(first_chapter)}—{to_roman(last_chapter)}</h2>
+    <!-- Decorative horizontal line -->
+    <div class="decorative-line"></div>
+    <!-- Introduction paragraphs -->
+    <p>{text.paragraph()}</p>
+    <p>{text.paragraph()}</p>
+  </section>
+</body>
+</html>
+'''
+
+def slug(title):
+    return re.sub(r'[^a-z0-9]+', '-', title.lower()).strip('-')
+
+def write_corpus(directory, chapter_count, chapter_bytes, chapters_per_part=4, seed=0):
+    """Write a book of chapters grouped into parts, numbered like input/; return the written paths."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    file_number = 8  # input/ starts at 8-Part-I, after the front matter
+    for chapter in range(1, chapter_count + 1):
+        if (chapter - 1) % chapters_per_part == 0:
+            part = (chapter - 1) // chapters_per_part + 1
+            last = min(chapter + chapters_per_part - 1, chapter_count)
+            content = generate_part(part, chapter, last, seed)
+            title = re.search(r'<h1 class="part-title">Part [IVXLCDM]+: ([^<]+)</h1>', content).group(1)
+            path = directory / f"{file_number}-Part-{to_roman(part)}-{slug(title).title()}.xhtml"
+            path.write_text(content, encoding='utf-8')
+            paths.append(path)
+            file_number += 1
+        content = generate_chapter(chapter, chapter_bytes, seed)
+        title = re.search(r'<title>Chapter [IVXLCDM]+ – ([^<]+)</title>', content).group(1)
+        path = directory / f"{file_number}-chapter-{to_roman(chapter).lower()}-{slug(title)}.xhtml"
+        path.write_text(content, encoding='utf-8')
+        paths.append(path)
+        file_number += 1
+    return paths
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python3 synthetic_corpus.py <output_dir> <chapter_count> [chapter_size, e.g. 36KB]")
+        sys.exit(1)
+
+    written = write_corpus(sys.argv[1], int(sys.argv[2]), parse_size(sys.argv[3] if len(sys.argv) == 4 else "36KB"))
+    total = sum(path.stat().st_size for path in written)
+    print(f"Wrote {len(written)} files ({total / 1024 / 1024:.1f} MB) to {sys.argv[1]}")
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Positional Full-Text Index for EPUB Libraries
+Indexes the normalized text of every document of one or more books into one compact varint-encoded
+file that queries read through mmap, for phrase and prefix search without loading the index.
+"""
+import bisect
+import json
+import mmap
+import os
+import re
+import struct
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+
+from build_cache import script_version
+from output_writer import write_if_changed
+from preservation_manifest import normalize_text_content
+
+OEBPS_DIR = Path("/root/repo/Complete/OEBPS")
+INDEX_FILE = Path("/root/repo/Complete/.search-index.bin")
+
+# Tokens and positions depend on the code below and on normalize_text_content, so editing either
+# file invalidates an index
+INDEX_VERSION = script_version(__file__, Path(__file__).with_name('preservation_manifest.py'))
+
+MAGIC = b'LMTI'
+
+# magic, term count, strings offset, postings offset, metadata offset, metadata length; the term table follows
+HEADER = struct.Struct('<4sIQQQQ')
+
+# Per term, sorted by its UTF-8 bytes: string offset, string length, postings offset, postings length
+TERM_ENTRY = struct.Struct('<IIQI')
+
+DOCUMENT_SUFFIXES = {'.xhtml', '.html'}
+
+# Blocks are the paragraphs of the index; a heading block starts a new section
+BLOCK_PATTERN = re.compile(r'<(h[1-6]|p|li|blockquote|figcaption|td|th|dt|dd)\b[^>]*>(.*?)</\1\s*>',
+                           re.DOTALL | re.IGNORECASE)
+TITLE_PATTERN = re.compile(r'<title[^>]*>(.*?)</title\s*>', re.DOTALL | re.IGNORECASE)
+BOOK_TITLE_PATTERN = re.compile(r'<dc:title[^>]*>(.*?)</dc:title\s*>', re.DOTALL)
+TOKEN_PATTERN = re.compile(r'\w+')
+QUERY_PATTERN = re.compile(r'"([^"]*)"?|(\S+)')
+
+# Characters of context shown on each side of a match
+SNIPPET_CONTEXT = 60
+
+@lru_cache(maxsize=65536)
+def fold(token):
+    """Lower-case a token and drop its accents, so "François" and "francois" index alike."""
+    if token.isascii():
+        return token.lower()
+    decomposed = unicodedata.normalize('NFKD', token)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold() or token
+
+def tokenize(text):
+    """The folded words of a block's text."""
+    if text.isascii():
+        return TOKEN_PATTERN.findall(text.lower())
+    return [fold(token) for token in TOKEN_PATTERN.findall(text)]
+
+def tokens_with_spans(text):
+    """(folded token, start, end) of every word of a block's text."""
+    return [(fold(m.group()), m.start(), m.end()) for m in TOKEN_PATTERN.finditer(text)]
+
+def document_blocks(content):
+    """(is heading, normalized text) of every non-empty block of a document, in order."""
+    blocks = []
+    for match in BLOCK_PATTERN.finditer(content):
+        text = normalize_text_content(match.group(2))
+        if text:
+            blocks.append((match.group(1)[0].lower() == 'h', text))
+    return blocks
+
+def book_documents(oebps_dir):
+    """{relative path: path} of a book's documents, in reading order by their numeric file name prefix."""
+    found = []
+    for root, dirs, files in os.walk(oebps_dir):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        for name in files:
+            if os.path.splitext(name)[1].lower() in DOCUMENT_SUFFIXES:
+                path = os.path.join(root, name)
+                found.append((Path(path).relative_to(oebps_dir).as_posix(), path))
+
+    def reading_order(item):
+        prefix = re.match(r'\d+', os.path.basename(item[0]))
+        return (int(prefix.group()) if prefix else float('inf'), item[0])
+    return dict(sorted(found, key=reading_order))
+
+def book_title(oebps_dir):
+    for opf in sorted(Path(oebps_dir).glob("**/*.opf")):
+        match = BOOK_TITLE_PATTERN.search(opf.read_text(encoding='utf-8'))
+        if match:
+            return normalize_text_content(match.group(1))
+    return Path(oebps_dir).resolve().parent.name
+
+def encode_varint(value, out):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+def decode_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+def build_index(oebps_dirs=(OEBPS_DIR,), index_file=INDEX_FILE):
+    """Index every document of the given books; return (document count, term count, index bytes).
+
+    Positions count words through a document, with a gap after every block
+    so that no phrase matches across two blocks. Each term's postings are
+    varint-encoded as: document count, then per document the document id
+    delta, the occurrence count, the byte length of its positions, and the
+    position deltas, so a query can skip the documents it does not need.
+
+    The index is one file for all books and is always rebuilt whole: a
+    change to any document reindexes every book. That takes under a second
+    for this book, but does not scale to a catalog of hundreds of books,
+    which would need one index per book merged at query time.
+    """
+    books = []
+    documents = []
+    postings = {}
+    for oebps_dir in oebps_dirs:
+        book = len(books)
+        books.append({'path': str(Path(oebps_dir).resolve()), 'title': book_title(oebps_dir)})
+        for relative, path in book_documents(oebps_dir).items():
+            stat = os.stat(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            title = TITLE_PATTERN.search(content)
+            doc = len(documents)
+            record = {'book': book, 'path': relative, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+                      'title': normalize_text_content(title.group(1)) if title else relative,
+                      'blocks': [], 'section_starts': [0], 'headings': ['']}
+            position = 0
+            for is_heading, text in document_blocks(content):
+                if is_heading and record['blocks']:
+                    record['section_starts'].append(len(record['blocks']))
+                    record['headings'].append(text)
+                elif is_heading:
+                    record['headings'][0] = text
+                record['blocks'].append(position)
+                for token in tokenize(text):
+                    postings.setdefault(token, {}).setdefault(doc, []).append(position)
+                    position += 1
+                position += 1
+            documents.append(record)
+
+    table = bytearray()
+    strings = bytearray()
+    data = bytearray()
+    for term in sorted(postings, key=lambda t: t.encode('utf-8')):
+        encoded = term.encode('utf-8')
+        start = len(data)
+        by_doc = postings[term]
+        encode_varint(len(by_doc), data)
+        previous_doc = 0
+        for doc in sorted(by_doc):
+            deltas = bytearray()
+            previous = 0
+            for position in by_doc[doc]:
+                encode_varint(position - previous, deltas)
+                previous = position
+            encode_varint(doc - previous_doc, data)
+            encode_varint(len(by_doc[doc]), data)
+            encode_varint(len(deltas), data)
+            data += deltas
+            previous_doc = doc
+        table += TERM_ENTRY.pack(len(strings), len(encoded), start, len(data) - start)
+        strings += encoded
+
+    meta = json.dumps({'version': INDEX_VERSION, 'books': books, 'documents': documents},
+                      ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    strings_offset = HEADER.size + len(table)
+    postings_offset = strings_offset + len(strings)
+    meta_offset = postings_offset + len(data)
+    header = HEADER.pack(MAGIC, len(postings), strings_offset, postings_offset, meta_offset, len(meta))
+    write_if_changed(index_file, (header, bytes(table), bytes(strings), bytes(data), meta))
+    return len(documents), len(postings), meta_offset + len(meta)
+
+def parse_query(query):
+    """(folded tokens, last token is a prefix) of every clause: quoted phrases, and words, word* for a prefix."""
+    clauses = []
+    for phrase, word in QUERY_PATTERN.findall(query):
+        text = phrase if phrase else word
+        tokens = tokenize(text)
+        if tokens:
+            clauses.append((tokens, text.rstrip().endswith('*')))
+    return clauses
+
+class TextIndex:
+    """Read-only view of an index file through mmap.
+
+    Only the header and the document metadata are loaded; terms are found
+    by binary search in the fixed-width term table and only the postings a
+    query touches are decoded.
+    """
+
+    def __init__(self, index_file=INDEX_FILE):
+        self.index_file = Path(index_file)
+        with open(self.index_file, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.term_count, self.strings_offset, self.postings_offset, meta_offset, meta_length = \
+            HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.index_file} is not a search index")
+        meta = json.loads(self.map[meta_offset:meta_offset + meta_length].decode('utf-8'))
+        self.version = meta['version']
+        self.books = meta['books']
+        self.documents = meta['documents']
+
+    def close(self):
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def stale(self, oebps_dirs):
+        """True if the index was built by other code or from other books or document versions.
+
+        Stats every document of every book, so each check costs one stat per
+        document in the catalog.
+        """
+        if self.version != INDEX_VERSION or [b['path'] for b in self.books] != [str(Path(d).resolve()) for d in oebps_dirs]:
+            return True
+        known = {(d['book'], d['path']): (d['mtime_ns'], d['size']) for d in self.documents}
+        current = {}
+        for book, oebps_dir in enumerate(oebps_dirs):
+            for relative, path in book_documents(oebps_dir).items():
+                stat = os.stat(path)
+                current[(book, relative)] = (stat.st_mtime_ns, stat.st_size)
+        return known != current
+
+    def _entry(self, i):
+        return TERM_ENTRY.unpack_from(self.map, HEADER.size + i * TERM_ENTRY.size)
+
+    def _term(self, i):
+        offset, length, _, _ = self._entry(i)
+        start = self.strings_offset + offset
+        return self.map[start:start + length]
+
+    def _lower_bound(self, key):
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def term_ids(self, token, prefix=False):
+        """Ids of the term equal to a folded token, or of every term starting with it."""
+        key = token.encode('utf-8')
+        i = self._lower_bound(key)
+        ids = []
+        while i < self.term_count:
+            term = self._term(i)
+            if term != key and not (prefix and term.startswith(key)):
+                break
+            ids.append(i)
+            i += 1
+        return ids
+
+    def postings_size(self, term_id):
+        return self._entry(term_id)[3]
+
+    def postings(self, term_id, docs=None):
+        """{document: [positions]} of one term, decoding positions only for docs (all if None)."""
+        _, _, offset, length = self._entry(term_id)
+        start = self.postings_offset + offset
+        data = self.map[start:start + length]
+        count, i = decode_varint(data, 0)
+        found = {}
+        doc = 0
+        for _ in range(count):
+            delta, i = decode_varint(data, i)
+            occurrences, i = decode_varint(data, i)
+            size, i = decode_varint(data, i)
+            doc += delta
+            if docs is not None and doc not in docs:
+                i += size
+                continue
+            positions = []
+            position = 0
+            for _ in range(occurrences):
+                delta, i = decode_varint(data, i)
+                position += delta
+                positions.append(position)
+            found[doc] = positions
+        return found
+
+    def phrase(self, tokens, prefix=False, docs=None):
+        """{document: [start positions]} of a phrase; with prefix, its last token matches any term it starts."""
+        term_sets = []
+        for i, token in enumerate(tokens):
+            ids = self.term_ids(token, prefix and i == len(tokens) - 1)
+            if not ids:
+                return {}
+            term_sets.append(ids)
+
+        # The rarest token narrows the documents the others are decoded for
+        starts = None
+        for i in sorted(range(len(tokens)), key=lambda i: sum(self.postings_size(t) for t in term_sets[i])):
+            found = {}
+            for term_id in term_sets[i]:
+                for doc, positions in self.postings(term_id, docs if starts is None else starts.keys()).items():
+                    found.setdefault(doc, set()).update(position - i for position in positions)
+            if starts is not None:
+                found = {doc: starts[doc] & positions for doc, positions in found.items() if doc in starts}
+                found = {doc: positions for doc, positions in found.items() if positions}
+            starts = found
+            if not starts:
+                return {}
+        return {doc: sorted(positions) for doc, positions in starts.items()}
+
+    def block_of(self, doc, position):
+        return bisect.bisect_right(self.documents[doc]['blocks'], position) - 1
+
+    def section_of(self, doc, block):
+        return bisect.bisect_right(self.documents[doc]['section_starts'], block) - 1
+
+    def search(self, query):
+        """[(document, block, first matching position, matches)] of the blocks matching every clause, in book order."""
+        matches = None
+        for tokens, prefix in parse_query(query):
+            docs = None if matches is None else {doc for doc, _ in matches}
+            blocks = {}
+            for doc, positions in self.phrase(tokens, prefix, docs).items():
+                for position in positions:
+                    key = (doc, self.block_of(doc, position))
+                    first, count = blocks.get(key, (position, 0))
+                    blocks[key] = (first, count + 1)
+            if matches is not None:
+                blocks = {key: (matches[key][0], matches[key][1] + count)
+                          for key, (_, count) in blocks.items() if key in matches}
+            matches = blocks
+            if not matches:
+                break
+        return [(doc, block, first, count) for (doc, block), (first, count) in sorted((matches or {}).items())]
+
+    def snippet(self, doc, block, position):
+        """The text around a match, read back from its document."""
+        document = self.documents[doc]
+        path = Path(self.books[document['book']]['path']) / document['path']
+        blocks = document_blocks(path.read_text(encoding='utf-8'))
+        if block >= len(blocks):
+            return ''
+        text = blocks[block][1]
+        spans = tokens_with_spans(text)
+        offset = position - document['blocks'][block]
+        if not 0 <= offset < len(spans):
+            return text[:2 * SNIPPET_CONTEXT]
+        _, start, end = spans[offset]
+        before = max(0, start - SNIPPET_CONTEXT)
+        after = min(len(text), end + SNIPPET_CONTEXT)
+        return f"{'…' if before else ''}{text[before:after]}{'…' if after < len(text) else ''}"
+
+    def export_json(self, book=0):
+        """A small in-book search index: the book's sections, and per term the sections it occurs in.
+
+        Sections are numbered across the book's documents in reading order;
+        each term maps to its sorted section numbers, delta-encoded and
+        without positions, so a reading system can look words up and jump to
+        the section.
+        """
+        local = [doc for doc, record in enumerate(self.documents) if record['book'] == book]
+        first_section, count = {}, 0
+        for doc in local:
+            first_section[doc] = count
+            count += len(self.documents[doc]['headings'])
+        terms = {}
+        for term_id in range(self.term_count):
+            sections = set()
+            for doc, positions in self.postings(term_id, local).items():
+                for position in positions:
+                    sections.add(first_section[doc] + self.section_of(doc, self.block_of(doc, position)))
+            if sections:
+                previous = 0
+                deltas = []
+                for section in sorted(sections):
+                    deltas.append(section - previous)
+                    previous = section
+                terms[self._term(term_id).decode('utf-8')] = deltas
+        return {
+            'title': self.books[book]['title'],
+            'documents': [{'href': self.documents[doc]['path'], 'title': self.documents[doc]['title'],
+                           'sections': self.documents[doc]['headings']} for doc in local],
+            'terms': terms,
+        }
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Pipelined Read / Transform / Write Stages for the Batch Driver
+Overlaps disk I/O with transform work using asyncio, an I/O thread pool and a CPU executor,
+connected by bounded queues so memory stays flat however many files there are.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Sent down a queue once per consumer when its producers are finished
+_DONE = object()
+
+async def run_pipeline(jobs, read, transform, write, on_done, cpu_executor, cpu_workers, io_workers=4,
+                       queue_size=None):
+    """Push every job through read -> transform -> write.
+
+    read(job) and write(job, result) run on a thread pool of io_workers;
+    transform(job, content) runs on cpu_executor (a process pool, so it must
+    be a picklable top-level function) with cpu_workers calls in flight.
+    Each queue holds at most queue_size items, so a slow stage stalls the
+    ones feeding it instead of letting file contents pile up in memory.
+
+    on_done(job, result, error, timings) is called in the event loop for
+    every job, with what write returned (or the transform result if a stage
+    failed), the exception of the stage that failed (if any) and the
+    seconds spent reading and writing.
+    """
+    loop = asyncio.get_running_loop()
+    queue_size = queue_size or 2 * cpu_workers
+    read_queue = asyncio.Queue(queue_size)
+    write_queue = asyncio.Queue(queue_size)
+    remaining = iter(jobs)
+
+    with ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="pipeline-io") as io_executor:
+
+        async def reader():
+            # Readers share one iterator, so each job is read exactly once
+            for job in remaining:
+                start = time.perf_counter()
+                try:
+                    content = await loop.run_in_executor(io_executor, read, job)
+                except Exception as e:
+                    on_done(job, None, e, {})
+                    continue
+                await read_queue.put((job, content, {'read': time.perf_counter() - start}))
+
+        async def transformer():
+            while (item := await read_queue.get()) is not _DONE:
+                job, content, timings = item
+                try:
+                    result = await loop.run_in_executor(cpu_executor, transform, job, content)
+                except Exception as e:
+                    on_done(job, None, e, timings)
+                    continue
+                await write_queue.put((job, result, timings))
+
+        async def writer():
+            while (item := await write_queue.get()) is not _DONE:
+                job, result, timings = item
+                start = time.perf_counter()
+                try:
+                    result = await loop.run_in_executor(io_executor, write, job, result)
+                except Exception as e:
+                    on_done(job, result, e, timings)
+                    continue
+                timings['write'] = time.perf_counter() - start
+                on_done(job, result, None, timings)
+
+        readers = [asyncio.create_task(reader()) for _ in range(io_workers)]
+        transformers = [asyncio.create_task(transformer()) for _ in range(cpu_workers)]
+        writers = [asyncio.create_task(writer()) for _ in range(io_workers)]
+
+        await asyncio.gather(*readers)
+        for _ in transformers:
+            await read_queue.put(_DONE)
+        await asyncio.gather(*transformers)
+        for _ in writers:
+            await write_queue.put(_DONE)
+        await asyncio.gather(*writers)
@@ -4,73 +4,48 @@ Content Validation Script for EPUB XHTML Processing
 Ensures 100% content preservation by comparing text content between original and processed files.
 """
 import sys
-import re
 from pathlib import Path
 
-def extract_text_content(xhtml_file):
-    """Extract only text content from XHTML file, ignoring markup and formatting."""
+from preservation_diff import diff_documents, format_diff
+from preservation_manifest import PreservationManifest, normalize_text_content
+
+def read_content(xhtml_file):
+    """Read an XHTML file, reporting a read error and returning an empty string."""
     try:
         with open(xhtml_file, 'r', encoding='utf-8') as f:
-            content = f.read()
+            return f.read()
     except Exception as e:
         print(f"Error reading {xhtml_file}: {e}")
         return ""
-    
-    # Remove XML/HTML tags
-    text = re.sub(r'<[^>]+>', '', content)
-    
-    # Remove XML declarations and DOCTYPE
-    text = re.sub(r'<\?xml[^>]*\?>', '', text)
-    text = re.sub(r'<!DOCTYPE[^>]*>', '', text)
-    
-    # Remove HTML entities
-    html_entities = {
-        '&quot;': '"',
-        '&apos;': "'",
-        '&lt;': '<',
-        '&gt;': '>',
-        '&amp;': '&',
-        '&#x27;': "'",
-        '&nbsp;': ' '
-    }
-    for entity, char in html_entities.items():
-        text = text.replace(entity, char)
-    
-    # Normalize whitespace
-    text = re.sub(r'\s+', ' ', text)
-    text = text.strip()
-    
-    # Remove common formatting artifacts
-    text = re.sub(r'^\s*→\s*', '', text, flags=re.MULTILINE)  # Line number prefixes
-    text = re.sub(r'\s*___+\s*', '', text)  # Worksheet lines
-    
-    return text
 
-def validate_preservation(original_file, processed_file):
-    """Validate that all content from original file is preserved in processed file."""
-    original_text = extract_text_content(original_file)
-    processed_text = extract_text_content(processed_file)
+def extract_text_content(xhtml_file):
+    """Extract only text content from XHTML file, ignoring markup and formatting."""
+    return normalize_text_content(read_content(xhtml_file))
+
+def compare_text_content(original_text, processed_text, original_file, processed_file):
+    """Compare normalized texts and return (preserved, report lines)."""
+    messages = []
     
     if not original_text:
-        print(f"⚠️  WARNING: Could not extract content from {original_file}")
-        return False
+        messages.append(f"⚠️  WARNING: Could not extract content from {original_file}")
+        return False, messages
     
     if not processed_text:
-        print(f"❌ ERROR: Could not extract content from {processed_file}")
-        return False
+        messages.append(f"❌ ERROR: Could not extract content from {processed_file}")
+        return False, messages
     
     # Compare content
     if original_text == processed_text:
-        print(f"✅ Content preservation VERIFIED: {Path(processed_file).name}")
-        return True
+        messages.append(f"✅ Content preservation VERIFIED: {Path(processed_file).name}")
+        return True, messages
     else:
-        print(f"❌ Content preservation FAILED: {Path(processed_file).name}")
+        messages.append(f"❌ Content preservation FAILED: {Path(processed_file).name}")
         
         # Show differences for debugging
         orig_len = len(original_text)
         proc_len = len(processed_text)
-        print(f"   Original length: {orig_len} characters")
-        print(f"   Processed length: {proc_len} characters")
+        messages.append(f"   Original length: {orig_len} characters")
+        messages.append(f"   Processed length: {proc_len} characters")
         
         if abs(orig_len - proc_len) < 100:
             # Show character-by-character differences for small discrepancies
@@ -78,12 +53,54 @@ def validate_preservation(original_file, processed_file):
                 if o != p:
                     context_start = max(0, i-20)
                     context_end = min(len(original_text), i+20)
-                    print(f"   First difference at position {i}:")
-                    print(f"   Original: ...{original_text[context_start:context_end]}...")
-                    print(f"   Processed: ...{processed_text[context_start:context_end]}...")
+                    messages.append(f"   First difference at position {i}:")
+                    messages.append(f"   Original: ...{original_text[context_start:context_end]}...")
+                    messages.append(f"   Processed: ...{processed_text[context_start:context_end]}...")
                     break
         
-        return False
+        return False, messages
+
+def check_preservation(manifest, original_file, processed_file, processed_content, original_content=None):
+    """Compare processed content with the original's stored fingerprint; return (preserved, report lines).
+
+    Only the processed text is hashed when the digests match. The original
+    is normalized in full only to report a mismatch (and read only if its
+    content was not passed in), with every dropped, added or changed span.
+    """
+    try:
+        preserved, source, _ = manifest.compare(original_file, processed_content, original_content)
+    except OSError:
+        source = None
+    
+    # Empty or unreadable originals take the full comparison for its warnings
+    if source is not None and source['length'] > 0:
+        if preserved:
+            return True, [f"✅ Content preservation VERIFIED: {Path(processed_file).name}"]
+    
+    if original_content is None:
+        original_content = read_content(original_file)
+    original_text = normalize_text_content(original_content)
+    processed_text = normalize_text_content(processed_content)
+    preserved, messages = compare_text_content(original_text, processed_text, original_file, processed_file)
+    if not preserved and original_text and processed_text:
+        messages.extend(format_diff(diff_documents(original_content, processed_content)))
+    return preserved, messages
+
+def validate_preservation(original_file, processed_file):
+    """Validate that all content from original file is preserved in processed file."""
+    try:
+        with open(processed_file, 'r', encoding='utf-8') as f:
+            processed_content = f.read()
+    except Exception as e:
+        print(f"Error reading {processed_file}: {e}")
+        processed_content = ""
+    
+    manifest = PreservationManifest()
+    preserved, messages = check_preservation(manifest, original_file, processed_file, processed_content)
+    manifest.save()
+    for message in messages:
+        print(message)
+    return preserved
 
 if __name__ == "__main__":
     if len(sys.argv) != 3:
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Quiz Key Generator for the EPUB Package
+Builds 29QuizKey.xhtml from the quiz questions of each chapter's stored model, so the chapters are
+only parsed when their content has changed. Nothing is written until every question has an option
+marked correct in its chapter, so the book never ships a key without answers.
+"""
+import argparse
+import re
+import sys
+from pathlib import Path
+
+sys.path.insert(0, "/root/repo/epub-processing")
+from chapter_model import ModelStore
+from output_writer import write_if_changed
+
+TEXT_DIR = Path("/root/repo/Complete/OEBPS/text")
+KEY_FILE = TEXT_DIR / "29QuizKey.xhtml"
+
+def chapter_files(text_dir):
+    """Chapter documents in reading order (by their numeric file name prefix)."""
+    files = Path(text_dir).glob("*-chapter-*.xhtml")
+    return sorted(files, key=lambda path: int(re.match(r'\d+', path.name).group()))
+
+def render_option(label, text, correct):
+    css_class = "quiz-option correct" if correct else "quiz-option"
+    return f'<li class="{css_class}"><span class="opt-label">{label}</span> {text}</li>'
+
+def render_answer(options):
+    answers = [f"{label} {text}" for label, text, correct in options if correct]
+    return f'<p class="quiz-answer"><strong>Answer:</strong> {"; ".join(answers)}</p>'
+
+def render_chapter_key(model):
+    chapter_id = f"quiz-key-{model.roman.lower()}"
+    title = ' '.join(model.title_words)
+    questions = []
+    for question in model.quiz:
+        options = '\n'.join(render_option(*option) for option in question['options'])
+        questions.append(f'''<li class="quiz-question">
+<p>{question['question']}</p>
+<ul class="quiz-options">
+{options}
+</ul>
+{render_answer(question['options'])}
+</li>''')
+    questions_html = '\n'.join(questions)
+    return f'''<section class="quiz-key-chapter" aria-labelledby="{chapter_id}">
+<h2 id="{chapter_id}" class="quiz-subtitle">Chapter {model.roman} — {title}</h2>
+<ol class="quiz-questions">
+{questions_html}
+</ol>
+</section>'''
+
+def render_quiz_key(models):
+    chapters_html = '\n'.join(render_chapter_key(model) for model in models if model.quiz)
+    return f'''<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" xml:lang="en" lang="en">
+<head>
+<meta http-equiv="Content-Type" content="text/html; charset=UTF-8"/>
+<meta content="width=device-width, initial-scale=1.0" name="viewport"/>
+<title>Curls &amp; Contemplation - Quiz Key</title>
+<link rel="stylesheet" type="text/css" href="../styles/fonts.css" />
+<link rel="stylesheet" type="text/css" href="../styles/style.css" />
+</head>
+<body>
+<section class="quiz-container chap-quiz" epub:type="backmatter appendix" aria-labelledby="quiz-key-title">
+<h1 id="quiz-key-title" class="quiz-title">Quiz Key</h1>
+{chapters_html}
+</section>
+</body>
+</html>
+'''
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the quiz answer key from the chapter quizzes.")
+    parser.add_argument("--text-dir", default=str(TEXT_DIR), help="directory holding the chapter documents")
+    parser.add_argument("--output", default=str(KEY_FILE), help="quiz key document to write")
+    args = parser.parse_args()
+
+    print("🗝️  QUIZ KEY GENERATION")
+    print("=" * 50)
+
+    store = ModelStore()
+    models = [store.get(path) for path in chapter_files(args.text_dir)]
+    questions = [question for model in models for question in model.quiz]
+    unmarked = [question for question in questions if not any(option[2] for option in question['options'])]
+
+    print(f"📚 {len(models)} chapters ({store.built} parsed, {store.loaded} from stored models)")
+    print(f"❓ {len(questions)} questions")
+    if unmarked:
+        print(f"❌ {len(unmarked)} questions have no option marked correct (class=\"quiz-option correct\")")
+        for model in models:
+            count = sum(1 for question in model.quiz if not any(option[2] for option in question['options']))
+            if count:
+                print(f"   Chapter {model.roman}: {count} of {len(model.quiz)}")
+        print(f"⚠️  {args.output} not written: mark the correct options in the chapters first")
+        return False
+
+    changed = write_if_changed(args.output, render_quiz_key(models))
+    print(f"{'📝 Wrote' if changed else '✅ Unchanged:'} {args.output}")
+    return True
+
+if __name__ == "__main__":
+    try:
+        success = main()
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"💥 Quiz key error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Image Optimization for EPUB Assets
+Downscales and recompresses Complete/OEBPS/images in parallel, caching results by content hash.
+The source images are never modified: the optimized copies go to a build directory, and
+package-epub.py --optimize-images packages them through the same cache.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+sys.path.insert(0, "/root/repo/epub-processing")
+from output_writer import write_if_changed
+
+IMAGES_DIR = Path("/root/repo/Complete/OEBPS/images")
+CACHE_DIR = Path("/root/repo/Complete/.image-cache")
+OUTPUT_DIR = Path("/root/repo/Complete/build/images")
+
+DEFAULT_SETTINGS = {
+    'max_width': 1200,
+    'max_height': 1600,
+    'jpeg_quality': 85,
+    'min_jpeg_quality': 60,
+}
+
+IMAGE_SUFFIXES = {'.jpeg', '.jpg', '.png'}
+
+def settings_digest(settings):
+    """Digest the optimization settings so a settings change invalidates the cache."""
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+def cache_key(data, settings):
+    """Content address for one image optimized with the given settings."""
+    return hashlib.sha256(data + settings_digest(settings).encode('ascii')).hexdigest()
+
+def encode_jpeg(img, quality, icc_profile):
+    """Encode an image as an optimized progressive JPEG."""
+    out = io.BytesIO()
+    img.save(out, 'JPEG', quality=quality, optimize=True, progressive=True, icc_profile=icc_profile)
+    return out.getvalue()
+
+def optimize_image(data, settings):
+    """Return the optimized encoding of an image, or the original bytes if it cannot be improved."""
+    with Image.open(io.BytesIO(data)) as img:
+        image_format = img.format
+        icc_profile = img.info.get('icc_profile')
+        img = ImageOps.exif_transpose(img)
+
+        resized = False
+        if img.width > settings['max_width'] or img.height > settings['max_height']:
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            img.thumbnail((settings['max_width'], settings['max_height']), Image.LANCZOS)
+            resized = True
+
+        if image_format == 'JPEG':
+            if img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            optimized = encode_jpeg(img, settings['jpeg_quality'], icc_profile)
+
+            # A downscaled image should never cost more bytes than the
+            # original: lower the quality until it fits, if it can
+            if resized and len(optimized) > len(data):
+                low, high = settings['min_jpeg_quality'], settings['jpeg_quality'] - 1
+                while low <= high:
+                    quality = (low + high) // 2
+                    candidate = encode_jpeg(img, quality, icc_profile)
+                    if len(candidate) <= len(data):
+                        optimized = candidate
+                        low = quality + 1
+                    else:
+                        high = quality - 1
+        elif image_format == 'PNG':
+            out = io.BytesIO()
+            img.save(out, 'PNG', optimize=True, icc_profile=icc_profile)
+            optimized = out.getvalue()
+        else:
+            return data
+
+    # A recompression that does not shrink the file is only worth keeping if
+    # the image had to be downscaled
+    if not resized and len(optimized) >= len(data):
+        return data
+    return optimized
+
+def cached_optimize(path, settings, cache_dir=CACHE_DIR):
+    """Return (source bytes, optimized bytes, cached) for one image, optimizing it only on a cache miss."""
+    data = Path(path).read_bytes()
+    cached_file = Path(cache_dir) / f"{cache_key(data, settings)}{Path(path).suffix.lower()}"
+    if cached_file.exists():
+        return data, cached_file.read_bytes(), True
+    optimized = optimize_image(data, settings)
+    tmp_file = cached_file.with_name(f".{cached_file.name}.{os.getpid()}.tmp")
+    tmp_file.write_bytes(optimized)
+    os.replace(tmp_file, cached_file)
+    return data, optimized, False
+
+def process_image(path, settings, cache_dir, output_dir):
+    """Optimize one image into output_dir and return (name, bytes before, bytes after, cached)."""
+    data, optimized, cached = cached_optimize(path, settings, cache_dir)
+    write_if_changed(output_dir / path.name, optimized)
+    return path.name, len(data), len(optimized), cached
+
+def main():
+    parser = argparse.ArgumentParser(description="Optimize the EPUB images into a build directory.")
+    parser.add_argument("--max-width", type=int, default=DEFAULT_SETTINGS['max_width'],
+                        help="maximum display width in pixels")
+    parser.add_argument("--max-height", type=int, default=DEFAULT_SETTINGS['max_height'],
+                        help="maximum display height in pixels")
+    parser.add_argument("--jpeg-quality", type=int, default=DEFAULT_SETTINGS['jpeg_quality'],
+                        help="JPEG quality (1-95)")
+    parser.add_argument("--min-jpeg-quality", type=int, default=DEFAULT_SETTINGS['min_jpeg_quality'],
+                        help="lowest JPEG quality used to keep a downscaled image under its original size")
+    parser.add_argument("--output-dir", type=Path, default=OUTPUT_DIR,
+                        help="directory for the optimized images (the sources are never overwritten)")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="number of worker processes")
+    args = parser.parse_args()
+
+    settings = {
+        'max_width': args.max_width,
+        'max_height': args.max_height,
+        'jpeg_quality': args.jpeg_quality,
+        'min_jpeg_quality': args.min_jpeg_quality,
+    }
+    if args.output_dir.resolve() == IMAGES_DIR.resolve():
+        raise ValueError(f"refusing to overwrite the source images in {IMAGES_DIR}")
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+
+    images = sorted(p for p in IMAGES_DIR.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+
+    print("🖼️  IMAGE OPTIMIZATION")
+    print("=" * 70)
+
+    total_before = 0
+    total_after = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [executor.submit(process_image, path, settings, CACHE_DIR, args.output_dir) for path in images]
+        for future in futures:
+            name, before, after, cached = future.result()
+            total_before += before
+            total_after += after
+            status = "⏭️ " if cached else "✅"
+            print(f"{status} {name}: {before:,} → {after:,} bytes (saved {before - after:,})")
+
+    print("=" * 70)
+    print(f"📊 {len(images)} images: {total_before:,} → {total_after:,} bytes "
+          f"(saved {total_before - total_after:,})")
+    print(f"📁 Optimized images in {args.output_dir} (sources unchanged)")
+    return True
+
+if __name__ == "__main__":
+    try:
+        success = main()
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"💥 Image optimization error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+EPUB Packager
+Streams Complete/OEBPS into a reproducible .epub container, compressing entries in parallel.
+"""
+import argparse
+import os
+import struct
+import sys
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, "/root/repo/epub-processing")
+from asset_graph import AssetGraph
+from script_loader import load_script
+
+OEBPS_DIR = Path("/root/repo/Complete/OEBPS")
+OUTPUT_FILE = Path("/root/repo/Complete/Curls-and-Contemplation.epub")
+
+# The OPF lives in text/ in the source tree, but its hrefs are relative to
+# OEBPS/, so it is packaged next to them
+OPF_SOURCE = "text/content.opf"
+OPF_ARCHIVE_PATH = "OEBPS/content.opf"
+
+CONTAINER_XML = f'''<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="{OPF_ARCHIVE_PATH}" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+'''
+
+# Formats that are already compressed gain nothing from deflate
+STORED_SUFFIXES = {'.jpeg', '.jpg', '.png', '.gif', '.woff', '.woff2', '.mp3', '.mp4'}
+
+COMPRESSION_LEVELS = {'fast': 1, 'max': 9}
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+# Every entry gets the same timestamp (1980-01-01 00:00, the DOS epoch) so
+# that identical inputs always produce identical bytes
+DOS_TIME = 0
+DOS_DATE = (0 << 9) | (1 << 5) | 1
+
+def compress_entry(name, data, level):
+    """Return (name, method, crc, compressed data, size) for one archive entry."""
+    crc = zlib.crc32(data)
+    if level is not None and Path(name).suffix.lower() not in STORED_SUFFIXES:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        compressed = compressor.compress(data) + compressor.flush()
+        if len(compressed) < len(data):
+            return name, ZIP_DEFLATED, crc, compressed, len(data)
+    return name, ZIP_STORED, crc, data, len(data)
+
+class ZipStreamWriter:
+    """Minimal ZIP writer that appends pre-compressed entries to a stream."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.offset = 0
+        self.central_directory = []
+
+    def write_entry(self, name, method, crc, payload, size):
+        encoded_name = name.encode('utf-8')
+        if self.offset > 0xFFFFFFFF or size > 0xFFFFFFFF:
+            raise ValueError(f"{name}: archive too large (ZIP64 is not supported)")
+
+        header = struct.pack(
+            '<IHHHHHIIIHH', 0x04034B50, 20, 0x0800, method, DOS_TIME, DOS_DATE,
+            crc, len(payload), size, len(encoded_name), 0,
+        )
+        self.central_directory.append(struct.pack(
+            '<IHHHHHHIIIHHHHHII', 0x02014B50, 20, 20, 0x0800, method, DOS_TIME, DOS_DATE,
+            crc, len(payload), size, len(encoded_name), 0, 0, 0, 0, 0, self.offset,
+        ) + encoded_name)
+
+        self.stream.write(header)
+        self.stream.write(encoded_name)
+        self.stream.write(payload)
+        self.offset += len(header) + len(encoded_name) + len(payload)
+
+    def close(self):
+        directory = b''.join(self.central_directory)
+        self.stream.write(directory)
+        self.stream.write(struct.pack(
+            '<IHHHHIIH', 0x06054B50, 0, 0, len(self.central_directory),
+            len(self.central_directory), len(directory), self.offset, 0,
+        ))
+
+def collect_entries(oebps_dir):
+    """List (archive name, source path) pairs for the OPF and its manifest items, in a stable order.
+
+    Only files the manifest lists are packaged (so e.g. the full fonts kept
+    as the subsetting source stay out); manifest items missing on disk are
+    returned separately.
+    """
+    graph = AssetGraph(oebps_dir)
+    graph.update()
+
+    entries = [(OPF_ARCHIVE_PATH, oebps_dir / OPF_SOURCE)]
+    missing = []
+    for item in dict.fromkeys(graph.manifest_items()):
+        if graph.exists(item):
+            entries.append((f"OEBPS/{item}", oebps_dir / item))
+        else:
+            missing.append(item)
+    return sorted(entries), missing
+
+def shaken_stylesheets(oebps_dir, entries):
+    """{archive name: bytes} of every packaged stylesheet, tree-shaken against the documents being packaged.
+
+    The shaking happens in memory at packaging time, so the source
+    stylesheets stay intact and a class a chapter starts using is never
+    missing from a stale shaken copy.
+    """
+    shake_css = load_script("shake-css.py", Path(__file__).resolve().parent)
+    signatures = shake_css.build_usage_index(oebps_dir / "text")
+    return {archive_name: shake_css.shake_stylesheet(path.read_text(encoding='utf-8'), signatures)[0].encode('utf-8')
+            for archive_name, path in entries if path.suffix.lower() == '.css'}
+
+def optimized_images(entries, jobs=None):
+    """{archive name: bytes} of every packaged JPEG and PNG, optimized through the image cache.
+
+    Images already optimized with the default settings are cache hits, and
+    the source images are never rewritten.
+    """
+    optimize_images = load_script("optimize-images.py", Path(__file__).resolve().parent)
+    images = [(archive_name, path) for archive_name, path in entries
+              if path.suffix.lower() in optimize_images.IMAGE_SUFFIXES]
+    optimize_images.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(optimize_images.cached_optimize, [path for _, path in images],
+                               [optimize_images.DEFAULT_SETTINGS] * len(images))
+        return {archive_name: optimized for (archive_name, _), (_, optimized, _) in zip(images, results)}
+
+def package_epub(oebps_dir=OEBPS_DIR, output_file=OUTPUT_FILE, mode='max', jobs=None, shake_css=False,
+                 optimize_images=False):
+    """Write the EPUB container; return the number of entries written and the missing manifest items."""
+    level = COMPRESSION_LEVELS[mode]
+    entries, missing = collect_entries(oebps_dir)
+    replacements = shaken_stylesheets(oebps_dir, entries) if shake_css else {}
+    if optimize_images:
+        replacements.update(optimized_images(entries, jobs))
+    window = (jobs or os.cpu_count() or 1) * 2
+
+    tmp_file = output_file.with_name(output_file.name + '.tmp')
+    with open(tmp_file, 'wb') as f, ThreadPoolExecutor(max_workers=jobs) as executor:
+        writer = ZipStreamWriter(f)
+
+        # mimetype must be the first entry and stored uncompressed
+        writer.write_entry(*compress_entry('mimetype', b'application/epub+zip', None))
+        writer.write_entry(*compress_entry('META-INF/container.xml', CONTAINER_XML.encode('utf-8'), level))
+
+        # Compress a bounded window of entries ahead while writing them in order
+        pending = deque()
+        for archive_name, path in entries:
+            data = replacements[archive_name] if archive_name in replacements else path.read_bytes()
+            pending.append(executor.submit(compress_entry, archive_name, data, level))
+            if len(pending) >= window:
+                writer.write_entry(*pending.popleft().result())
+        while pending:
+            writer.write_entry(*pending.popleft().result())
+
+        writer.close()
+    os.replace(tmp_file, output_file)
+
+    return len(entries) + 2, missing
+
+def main():
+    parser = argparse.ArgumentParser(description="Package Complete/OEBPS as an EPUB file.")
+    parser.add_argument("--output", "-o", type=Path, default=OUTPUT_FILE, help="EPUB file to write")
+    parser.add_argument("--mode", choices=sorted(COMPRESSION_LEVELS), default='max',
+                        help="fast (deflate level 1) or max (deflate level 9) compression")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="number of compression threads")
+    parser.add_argument("--shake-css", action="store_true",
+                        help="package tree-shaken, minified stylesheets (the sources are left as they are)")
+    parser.add_argument("--optimize-images", action="store_true",
+                        help="package downscaled, recompressed images (the sources are left as they are)")
+    args = parser.parse_args()
+
+    print("📦 EPUB PACKAGING")
+    print("=" * 50)
+
+    if not (OEBPS_DIR / OPF_SOURCE).exists():
+        print(f"❌ Package document not found: {OEBPS_DIR / OPF_SOURCE}")
+        return False
+
+    count, missing = package_epub(OEBPS_DIR, args.output, mode=args.mode, jobs=args.jobs, shake_css=args.shake_css,
+                                  optimize_images=args.optimize_images)
+    for item in missing:
+        print(f"⚠️  Manifest item not found, not packaged: {item}")
+
+    print(f"✅ Wrote {count} entries ({args.mode} compression{', shaken stylesheets' if args.shake_css else ''}"
+          f"{', optimized images' if args.optimize_images else ''})")
+    print(f"📁 {args.output} ({args.output.stat().st_size:,} bytes)")
+    return True
+
+if __name__ == "__main__":
+    try:
+        success = main()
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"💥 Packaging error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Full-Text Search over EPUB Books
+Builds the positional text index of one or more books when their documents change, answers phrase
+and prefix queries from it, and exports a small JSON index for in-book search.
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, "/root/repo/epub-processing")
+from output_writer import write_if_changed
+from text_index import INDEX_FILE, OEBPS_DIR, TextIndex, build_index
+
+def open_index(books, index_file, rebuild=False):
+    """Open the index, building it first if it is missing, forced, or out of date with the books."""
+    if not rebuild and index_file.exists():
+        index = TextIndex(index_file)
+        if not index.stale(books):
+            return index
+        index.close()
+
+    start = time.perf_counter()
+    documents, terms, size = build_index(books, index_file)
+    print(f"🔨 Indexed {documents} documents of {len(books)} book(s): {terms} terms, "
+          f"{size / 1024:.1f} KB in {time.perf_counter() - start:.2f}s")
+    return TextIndex(index_file)
+
+def main():
+    parser = argparse.ArgumentParser(description="Search the text of one or more EPUB books.")
+    parser.add_argument("query", nargs="*",
+                        help='words to find in one paragraph; "quoted phrase", prefix* (e.g. "vernon fran*")')
+    parser.add_argument("--book", action="append", type=Path, metavar="OEBPS_DIR",
+                        help=f"book to index, repeatable (default: {OEBPS_DIR})")
+    parser.add_argument("--index", type=Path, default=INDEX_FILE, help="index file to build and query")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild the index even if it is up to date")
+    parser.add_argument("--limit", type=int, default=20, help="most matching paragraphs to show")
+    parser.add_argument("--export-json", type=Path, metavar="PATH",
+                        help="write the in-book JSON search index of the first book to PATH")
+    args = parser.parse_args()
+
+    books = args.book or [OEBPS_DIR]
+    with open_index(books, args.index, args.rebuild) as index:
+        if args.export_json:
+            changed = write_if_changed(args.export_json, json.dumps(index.export_json(), ensure_ascii=False,
+                                                                    separators=(',', ':')))
+            print(f"{'📝 Wrote' if changed else '✅ Unchanged:'} {args.export_json}")
+
+        if not args.query:
+            return True
+
+        query = ' '.join(args.query)
+        start = time.perf_counter()
+        hits = index.search(query)
+        elapsed = time.perf_counter() - start
+
+        print(f"🔎 {len(hits)} paragraph(s) match {query} ({elapsed * 1000:.1f} ms)")
+        for doc, block, position, count in hits[:args.limit]:
+            document = index.documents[doc]
+            section = document['headings'][index.section_of(doc, block)] or document['title']
+            book = f"{index.books[document['book']]['title']} › " if len(index.books) > 1 else ""
+            print(f"\n📄 {book}{document['path']} › {section} ¶{block + 1} ({count}×)")
+            print(f"   {index.snippet(doc, block, position)}")
+        if len(hits) > args.limit:
+            print(f"\n… {len(hits) - args.limit} more (use --limit)")
+        return bool(hits)
+
+if __name__ == "__main__":
+    try:
+        success = main()
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"💥 Search error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
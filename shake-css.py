@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+CSS Tree-Shaking and Minification
+Drops style rules that no XHTML document can match, minifies the rest and reports what was removed.
+The source stylesheets are never modified: the shaken copies go to a build directory, and
+package-epub.py --shake-css applies the same shaking to the stylesheets it packages.
+"""
+import argparse
+import sys
+from html.parser import HTMLParser
+from pathlib import Path
+
+sys.path.insert(0, "/root/repo/epub-processing")
+from css_rules import AtRule, StyleRule, parse_selector, parse_stylesheet
+from output_writer import write_if_changed
+
+OEBPS_DIR = Path("/root/repo/Complete/OEBPS")
+TEXT_DIR = OEBPS_DIR / "text"
+STYLES_DIR = OEBPS_DIR / "styles"
+OUTPUT_DIR = Path("/root/repo/Complete/build/styles")
+
+# Characters around which whitespace carries no meaning
+BLOCK_TIGHT_CHARS = set('{};:,>')
+SELECTOR_TIGHT_CHARS = set(',>+~')
+
+class UsageCollector(HTMLParser):
+    """Collects the distinct (tag, id, classes) signatures of a document's elements."""
+
+    def __init__(self, signatures):
+        super().__init__(convert_charrefs=True)
+        self.signatures = signatures
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = frozenset((attrs.get('class') or '').split())
+        self.signatures.add((tag, attrs.get('id'), classes))
+
+    handle_startendtag = handle_starttag
+
+def build_usage_index(text_dir):
+    """Return the element signatures used across all XHTML documents."""
+    signatures = set()
+    for xhtml_file in sorted(text_dir.glob("*.xhtml")):
+        collector = UsageCollector(signatures)
+        collector.feed(xhtml_file.read_text(encoding='utf-8'))
+        collector.close()
+    return signatures
+
+def compound_is_used(compound, signatures):
+    """True if some element has the compound's tag, id and classes together."""
+    for tag, element_id, classes in signatures:
+        if compound.tag and compound.tag != tag:
+            continue
+        if compound.ids and any(i != element_id for i in compound.ids):
+            continue
+        if all(c in classes for c in compound.classes):
+            return True
+    return False
+
+def selector_is_used(selector, signatures):
+    """True unless some part of the selector can match no element in the book.
+
+    Pseudo-classes, attribute selectors and combinators are not evaluated, so
+    a selector is only dropped when one of its compounds matches nothing at
+    all. Selectors the parser does not understand are kept.
+    """
+    parts = parse_selector(selector)
+    if parts is None:
+        return True
+    return all(compound_is_used(compound, signatures) for _, compound in parts)
+
+def minify(text, tight_chars):
+    """Collapse whitespace outside strings, dropping it next to tight characters."""
+    out = []
+    quote = None
+    pending_space = False
+    for i, char in enumerate(text):
+        if quote:
+            out.append(char)
+            if char == quote and text[i - 1] != '\\':
+                quote = None
+            continue
+        if char.isspace():
+            pending_space = True
+            continue
+        if pending_space and out and out[-1] not in tight_chars and char not in tight_chars:
+            out.append(' ')
+        pending_space = False
+        if char == '}' and out and out[-1] == ';':
+            out.pop()
+        if char in '"\'':
+            quote = char
+        out.append(char)
+    return ''.join(out)
+
+def minify_block(block):
+    return minify(block, BLOCK_TIGHT_CHARS).strip(';')
+
+def shake(nodes, signatures, removed):
+    """Serialize parsed rules minified, leaving out unused selectors; collect the removed ones."""
+    out = []
+    for node in nodes:
+        if isinstance(node, StyleRule):
+            kept = []
+            for selector in node.selectors:
+                if selector_is_used(selector, signatures):
+                    kept.append(minify(selector, SELECTOR_TIGHT_CHARS))
+                else:
+                    removed.append(' '.join(selector.split()))
+            if kept:
+                out.append(f"{','.join(kept)}{{{minify_block(node.declarations)}}}")
+        elif node.children is not None:
+            inner = shake(node.children, signatures, removed)
+            if inner:
+                out.append(f"{' '.join(node.prelude.split())}{{{inner}}}")
+        elif node.block is None:
+            out.append(f"{' '.join(node.prelude.split())};")
+        else:
+            # @font-face, @page, @keyframes and friends are always kept
+            out.append(f"{' '.join(node.prelude.split())}{{{minify_block(node.block)}}}")
+    return ''.join(out)
+
+def shake_stylesheet(original, signatures):
+    """Return (shaken stylesheet, removed selectors) for one stylesheet's text."""
+    removed = []
+    return shake(parse_stylesheet(original), signatures, removed) + '\n', removed
+
+def count_rules(nodes):
+    return sum(count_rules(node.children) if isinstance(node, AtRule) and node.children is not None else 1
+               for node in nodes)
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove unused CSS rules and minify the stylesheets.")
+    parser.add_argument("--output-dir", type=Path, default=OUTPUT_DIR,
+                        help="directory for the shaken stylesheets (the sources are never overwritten)")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be removed without writing")
+    parser.add_argument("--verbose", "-v", action="store_true", help="list every removed selector")
+    args = parser.parse_args()
+
+    print("🌳 CSS TREE-SHAKING")
+    print("=" * 70)
+
+    signatures = build_usage_index(TEXT_DIR)
+    print(f"📖 Indexed {len(signatures)} distinct element signatures in {TEXT_DIR}")
+
+    total_before = 0
+    total_after = 0
+    for css_file in sorted(STYLES_DIR.glob("*.css")):
+        original = css_file.read_text(encoding='utf-8')
+        nodes = parse_stylesheet(original)
+        shaken, removed = shake_stylesheet(original, signatures)
+        after_nodes = parse_stylesheet(shaken)
+
+        before_size = len(original.encode('utf-8'))
+        after_size = len(shaken.encode('utf-8'))
+        total_before += before_size
+        total_after += after_size
+
+        print(f"\n✅ {css_file.name}: {count_rules(nodes)} → {count_rules(after_nodes)} rules, "
+              f"{before_size:,} → {after_size:,} bytes, {len(removed)} selectors removed")
+        if args.verbose:
+            for selector in removed:
+                print(f"   - {selector}")
+
+        if not args.dry_run:
+            if args.output_dir.resolve() == css_file.parent.resolve():
+                raise ValueError(f"refusing to overwrite the source stylesheets in {css_file.parent}")
+            args.output_dir.mkdir(parents=True, exist_ok=True)
+            write_if_changed(args.output_dir / css_file.name, shaken)
+
+    print("\n" + "=" * 70)
+    print(f"📊 Stylesheets: {total_before:,} → {total_after:,} bytes (saved {total_before - total_after:,})")
+    if args.dry_run:
+        print("ℹ️  Dry run: no files were written")
+    else:
+        print(f"📁 Shaken stylesheets in {args.output_dir} (sources unchanged)")
+    return True
+
+if __name__ == "__main__":
+    try:
+        success = main()
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"💥 CSS tree-shaking error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
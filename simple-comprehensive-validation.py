@@ -9,8 +9,12 @@ Simple comprehensive validation script to ensure all chapters retain:
 
 import os
 import re
+import sys
 from pathlib import Path
 
+sys.path.insert(0, "/root/repo/epub-processing")
+from document_cache import DocumentCache
+
 def validate_file_structure():
     """Check that all expected files exist"""
     text_dir = Path("/root/repo/Complete/OEBPS/text")
@@ -39,11 +43,12 @@ def validate_file_structure():
         print(f"❌ Expected {expected_total} files, found {len(actual_files)}")
         return False
 
-def validate_xhtml_basic(file_path):
+def validate_xhtml_basic(file_path, documents=None):
     """Basic XHTML validation without XML parser"""
+    documents = documents or DocumentCache()
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        with documents.open(file_path) as document:
+            content = document.text
         
         checks = {
             'xml_declaration': content.startswith('<?xml'),
@@ -60,11 +65,12 @@ def validate_xhtml_basic(file_path):
     except Exception as e:
         return {'error': str(e)}
 
-def validate_content_sections(file_path):
+def validate_content_sections(file_path, documents=None):
     """Check that all expected content sections are present"""
+    documents = documents or DocumentCache()
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        with documents.open(file_path) as document:
+            content = document.text
         
         sections = {
             'aciss_chapter_number': 'chapter-number-brush' in content,
@@ -192,14 +198,18 @@ def main():
     print("-" * 40)
     
     sample_files = check_sample_files()
+    # Each sample file is read once for both checks and released after the second
+    documents = DocumentCache()
     
     for file_path in sample_files:
         print(f"\n📄 {file_path.name}")
+        documents.expect(file_path, 2)
         
         # Basic XHTML checks
-        xhtml_checks = validate_xhtml_basic(file_path)
+        xhtml_checks = validate_xhtml_basic(file_path, documents)
         if 'error' in xhtml_checks:
             print(f"    ❌ Error reading file: {xhtml_checks['error']}")
+            documents.release(file_path)
             all_passed = False
             continue
         
@@ -212,7 +222,7 @@ def main():
             print(f"        {status} {check.replace('_', ' ').title()}")
         
         # Content sections
-        content_checks = validate_content_sections(file_path)
+        content_checks = validate_content_sections(file_path, documents)
         if 'error' in content_checks:
             print(f"    ❌ Error checking content: {content_checks['error']}")
             all_passed = False
@@ -262,8 +272,8 @@ def main():
             continue  # Already checked in detail
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            with documents.open(file_path) as document:
+                content = document.text
             
             # Basic checks
             has_title = '<title>' in content
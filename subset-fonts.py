@@ -0,0 +1,498 @@
+#!/usr/bin/env python3
+"""
+Font Subsetting for EPUB Assets
+Subsets each embedded WOFF2 face to the characters the spine documents render in it,
+then points fonts.css and the OPF manifest at the subsets.
+"""
+import argparse
+import logging
+import re
+import sys
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from pathlib import Path
+
+from fontTools import subset
+
+sys.path.insert(0, "/root/repo/epub-processing")
+from css_rules import (AtRule, parse_declarations, parse_selector, parse_stylesheet,
+                       iter_style_rules, specificity, split_top_level)
+
+OEBPS_DIR = Path("/root/repo/Complete/OEBPS")
+OPF_FILE = OEBPS_DIR / "text" / "content.opf"
+FONTS_CSS = OEBPS_DIR / "styles" / "fonts.css"
+
+SUBSET_SUFFIX = "-subset"
+
+OPF_NS = {'opf': 'http://www.idpf.org/2007/opf'}
+
+FONT_PROPERTIES = ('font-family', 'font-weight', 'font-style')
+
+# Reading system defaults that change the face of common elements
+UA_STYLESHEET = """
+h1, h2, h3, h4, h5, h6, th { font-weight: bold; }
+b, strong { font-weight: bolder; }
+em, i, cite, var, dfn, address { font-style: italic; }
+"""
+
+# Elements whose text is never rendered with the book fonts
+HIDDEN_ELEMENTS = {'head', 'title', 'style', 'script'}
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+# Pseudo-elements that style generated content rather than the element's own text
+GENERATED_PSEUDO_ELEMENTS = {'::before', ':before', '::after', ':after', '::marker', '::selection', '::placeholder'}
+
+# Every subset keeps printable ASCII so edits to the text never fall back to a system font for plain characters
+PRINTABLE_ASCII = {chr(c) for c in range(0x20, 0x7F)}
+
+URL_PATTERN = re.compile(r'''url\(\s*(['"]?)(.*?)\1\s*\)''')
+STRING_PATTERN = re.compile(r'"((?:[^"\\]|\\.)*)"|\'((?:[^\'\\]|\\.)*)\'')
+CSS_ESCAPE_PATTERN = re.compile(r'\\([0-9a-fA-F]{1,6})\s?|\\(.)')
+
+class Element:
+    """Minimal element node for selector matching."""
+    __slots__ = ('tag', 'id', 'classes', 'style', 'parent', 'text')
+
+    def __init__(self, tag, attrs, parent):
+        self.tag = tag
+        self.id = attrs.get('id')
+        self.classes = set((attrs.get('class') or '').split())
+        self.style = attrs.get('style')
+        self.parent = parent
+        self.text = []
+
+class DocumentCollector(HTMLParser):
+    """Collects the element tree, rendered text and stylesheets of one XHTML document."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.elements = []
+        self.stack = []
+        self.sheets = []
+        self.hidden_depth = 0
+        self.in_style = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        element = Element(tag, attrs, self.stack[-1] if self.stack else None)
+        self.elements.append(element)
+
+        if tag == 'link' and 'stylesheet' in (attrs.get('rel') or '').split():
+            self.sheets.append(('link', attrs.get('href')))
+        if tag in VOID_ELEMENTS:
+            return
+
+        self.stack.append(element)
+        if tag in HIDDEN_ELEMENTS:
+            self.hidden_depth += 1
+        if tag == 'style':
+            self.in_style = True
+            self.sheets.append(('inline', []))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if not any(element.tag == tag for element in self.stack):
+            return
+        while self.stack:
+            element = self.stack.pop()
+            if element.tag in HIDDEN_ELEMENTS:
+                self.hidden_depth -= 1
+            if element.tag == 'style':
+                self.in_style = False
+            if element.tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self.in_style:
+            self.sheets[-1][1].append(data)
+        elif self.hidden_depth == 0 and self.stack:
+            self.stack[-1].text.append(data)
+
+class CompiledRule:
+    """One selector of a style rule, reduced to the font declarations it sets."""
+    __slots__ = ('parts', 'declarations', 'approximate', 'priority')
+
+    def __init__(self, parts, declarations, approximate, priority):
+        self.parts = parts
+        self.declarations = declarations
+        self.approximate = approximate
+        self.priority = priority
+
+def read_spine(opf_file):
+    """Return the spine documents that exist on disk, in reading order."""
+    root = ET.parse(opf_file).getroot()
+    hrefs = {item.get('id'): item.get('href') for item in root.iterfind('.//opf:manifest/opf:item', OPF_NS)}
+    documents = []
+    for itemref in root.iterfind('.//opf:spine/opf:itemref', OPF_NS):
+        path = OEBPS_DIR / hrefs.get(itemref.get('idref'), '')
+        if path.is_file():
+            documents.append(path)
+    return documents
+
+def unquote(value):
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+        return value[1:-1]
+    return value
+
+def decode_css_string(value):
+    """Resolve CSS escapes such as '\\25B6' in a string token."""
+    return CSS_ESCAPE_PATTERN.sub(lambda m: chr(int(m.group(1), 16)) if m.group(1) else m.group(2), value)
+
+def parse_faces(css_file):
+    """Return the @font-face rules of a stylesheet as dicts with the font file they load."""
+    faces = []
+    for node in parse_stylesheet(css_file.read_text(encoding='utf-8')):
+        if not isinstance(node, AtRule) or node.name != '@font-face' or node.block is None:
+            continue
+        face = {'family': None, 'weight': (400, 400), 'style': 'normal', 'url': None}
+        for prop, value, _ in parse_declarations(node.block):
+            if prop == 'font-family':
+                face['family'] = unquote(value).lower()
+            elif prop == 'font-weight':
+                weights = [parse_weight(w, 400) for w in value.split()]
+                face['weight'] = (min(weights), max(weights))
+            elif prop == 'font-style':
+                face['style'] = value.split()[0].lower()
+            elif prop == 'src':
+                match = URL_PATTERN.search(value)
+                if match:
+                    face['url'] = match.group(2)
+        if face['family'] and face['url']:
+            face['path'] = (css_file.parent / face['url']).resolve()
+            faces.append(face)
+    return faces
+
+def parse_weight(value, inherited):
+    value = value.strip().lower()
+    if value == 'normal':
+        return 400
+    if value == 'bold':
+        return 700
+    if value == 'bolder':
+        return 400 if inherited < 350 else 700 if inherited < 550 else 900 if inherited < 900 else inherited
+    if value == 'lighter':
+        return inherited if inherited < 100 else 100 if inherited < 550 else 400 if inherited < 750 else 700
+    if value.isdigit():
+        return int(value)
+    return inherited
+
+def load_sheet(path, loaded):
+    """Parse a stylesheet with its @imports expanded in place, caching by path."""
+    path = path.resolve()
+    if path not in loaded:
+        loaded[path] = []
+        if path.is_file():
+            nodes = []
+            for node in parse_stylesheet(path.read_text(encoding='utf-8')):
+                if isinstance(node, AtRule) and node.name == '@import':
+                    match = URL_PATTERN.search(node.prelude) or STRING_PATTERN.search(node.prelude)
+                    if match:
+                        href = match.group(2) if match.re is URL_PATTERN else (match.group(1) or match.group(2))
+                        nodes.extend(load_sheet(path.parent / href, loaded))
+                else:
+                    nodes.append(node)
+            loaded[path] = nodes
+    return loaded[path]
+
+def compile_rules(nodes, origin, order_start):
+    """Compile the font-setting selectors of some parsed rules, in cascade order."""
+    compiled = []
+    content_strings = []
+    order = order_start
+    for rule in iter_style_rules(nodes):
+        declarations = parse_declarations(rule.declarations)
+        for prop, value, _ in declarations:
+            if prop == 'content':
+                content_strings.extend(decode_css_string(a or b) for a, b in STRING_PATTERN.findall(value))
+
+        font_declarations = [d for d in declarations if d[0] in FONT_PROPERTIES]
+        if not font_declarations:
+            continue
+        for selector in rule.selectors:
+            order += 1
+            parts = parse_selector(selector)
+            if parts is None:
+                continue
+            subject = parts[-1][1]
+            if any(p in GENERATED_PSEUDO_ELEMENTS for p in subject.pseudo_elements):
+                continue
+            # Rules that may or may not apply are unioned in rather than allowed to override
+            approximate = bool(rule.media) or any(
+                combinator in ('+', '~') or compound.pseudo_classes or compound.attributes
+                or compound.pseudo_elements
+                for combinator, compound in parts
+            )
+            compiled.append(CompiledRule(parts, font_declarations, approximate,
+                                         (origin, False, specificity(parts), order)))
+    return compiled, content_strings, order
+
+def compound_matches(compound, element):
+    if compound.tag and compound.tag != element.tag:
+        return False
+    if compound.ids and any(i != element.id for i in compound.ids):
+        return False
+    return all(c in element.classes for c in compound.classes)
+
+def selector_matches(parts, index, element, parent):
+    """Match parts[:index + 1] with element as the subject; element None is an unknown sibling."""
+    combinator, compound = parts[index]
+    if element is not None and not compound_matches(compound, element):
+        return False
+    if index == 0:
+        return True
+    if combinator == '>':
+        return parent is not None and selector_matches(parts, index - 1, parent, parent.parent)
+    if combinator == ' ':
+        ancestor = parent
+        while ancestor is not None:
+            if selector_matches(parts, index - 1, ancestor, ancestor.parent):
+                return True
+            ancestor = ancestor.parent
+        return False
+    # Siblings are not tracked, so assume one matches and keep checking the ancestors
+    return selector_matches(parts, index - 1, None, parent)
+
+def expand_value(prop, value, inherited):
+    """Return the set of computed values a declaration can produce."""
+    keyword = value.strip().lower()
+    if keyword in ('inherit', 'unset') or keyword.startswith('var('):
+        return set(inherited)
+    if prop == 'font-family':
+        if keyword == 'initial':
+            return {()}
+        return {tuple(unquote(f).lower() for f in split_top_level(value, ','))}
+    if prop == 'font-weight':
+        if keyword == 'initial':
+            return {400}
+        return {parse_weight(keyword, w) for w in inherited}
+    if keyword == 'initial':
+        return {'normal'}
+    return {keyword.split()[0]}
+
+def compute_styles(elements, rules):
+    """Compute the possible (families, weights, styles) of every element."""
+    styles = {}
+    root_style = ({()}, {400}, {'normal'})
+    for element in elements:
+        candidates = {prop: [] for prop in FONT_PROPERTIES}
+        for rule in rules:
+            if selector_matches(rule.parts, len(rule.parts) - 1, element, element.parent):
+                for prop, value, important in rule.declarations:
+                    origin, _, spec, order = rule.priority
+                    candidates[prop].append(((important, origin, 0, spec, order), rule.approximate, value))
+        if element.style:
+            for prop, value, important in parse_declarations(element.style):
+                if prop in candidates:
+                    candidates[prop].append(((important, 1, 1, (0, 0, 0), 0), False, value))
+
+        inherited = styles[id(element.parent)] if element.parent is not None else root_style
+        styles[id(element)] = tuple(
+            resolve_candidates(prop, candidates[prop], inherited[i])
+            for i, prop in enumerate(FONT_PROPERTIES)
+        )
+    return styles
+
+def resolve_candidates(prop, candidates, inherited):
+    """Apply the winning exact declaration, then union in approximate ones that could beat it."""
+    exact = [c for c in candidates if not c[1]]
+    if exact:
+        winner = max(exact, key=lambda c: c[0])
+        values = expand_value(prop, winner[2], inherited)
+        floor = winner[0]
+    else:
+        values = set(inherited)
+        floor = None
+    for priority, approximate, value in candidates:
+        if approximate and (floor is None or priority > floor):
+            values |= expand_value(prop, value, inherited)
+    return values
+
+def select_face(faces, weight, style):
+    """Pick the face a reading system renders for a weight and style (CSS font matching)."""
+    style_order = {
+        'italic': ('italic', 'oblique', 'normal'),
+        'oblique': ('oblique', 'italic', 'normal'),
+    }.get(style, ('normal', 'oblique', 'italic'))
+    for wanted_style in style_order:
+        candidates = [f for f in faces if f['style'] == wanted_style]
+        if candidates:
+            break
+    else:
+        return None
+
+    for face in candidates:
+        low, high = face['weight']
+        if low <= weight <= high:
+            return face
+    heavier = sorted((f for f in candidates if f['weight'][0] > weight), key=lambda f: f['weight'][0])
+    lighter = sorted((f for f in candidates if f['weight'][1] < weight), key=lambda f: -f['weight'][1])
+    if 400 <= weight <= 500:
+        order = [f for f in heavier if f['weight'][0] <= 500] + lighter + [f for f in heavier if f['weight'][0] > 500]
+    elif weight < 400:
+        order = lighter + heavier
+    else:
+        order = heavier + lighter
+    return order[0]
+
+def collect_face_characters(documents, faces):
+    """Return {font path: characters rendered in it} and the characters of CSS generated content."""
+    by_family = {}
+    for face in faces:
+        by_family.setdefault(face['family'], []).append(face)
+
+    loaded = {}
+    ua_rules, _, order = compile_rules(parse_stylesheet(UA_STYLESHEET), 0, 0)
+    used = {face['path']: set() for face in faces}
+    generated = set()
+
+    for document in documents:
+        collector = DocumentCollector()
+        collector.feed(document.read_text(encoding='utf-8'))
+        collector.close()
+
+        rules = list(ua_rules)
+        doc_order = order
+        for kind, source in collector.sheets:
+            if kind == 'link':
+                if not source:
+                    continue
+                nodes = load_sheet(document.parent / source, loaded)
+            else:
+                nodes = parse_stylesheet(''.join(source))
+            compiled, content_strings, doc_order = compile_rules(nodes, 1, doc_order)
+            rules.extend(compiled)
+            for text in content_strings:
+                generated.update(text)
+
+        styles = compute_styles(collector.elements, rules)
+        for element in collector.elements:
+            if not element.text:
+                continue
+            characters = set(''.join(element.text))
+            families, weights, font_styles = styles[id(element)]
+            for family_list in families:
+                for family in family_list:
+                    if family not in by_family:
+                        continue
+                    for weight in weights:
+                        for font_style in font_styles:
+                            face = select_face(by_family[family], weight, font_style)
+                            if face is not None:
+                                used[face['path']] |= characters
+
+    return used, generated
+
+def source_font(path):
+    """The full font a subset is made from, so reruns start from the original again."""
+    if path.stem.endswith(SUBSET_SUFFIX):
+        return path.with_name(path.stem[:-len(SUBSET_SUFFIX)] + path.suffix)
+    return path
+
+def subset_font(source_path, output_path, characters):
+    """Write a WOFF2 subset of a font and return its size in bytes."""
+    options = subset.Options()
+    options.flavor = 'woff2'
+    options.layout_features = ['*']
+    options.notdef_outline = True
+    # Editor and vendor tables such as FFTM are dropped; that is expected, not worth a warning
+    logging.getLogger('fontTools.subset').setLevel(logging.ERROR)
+
+    font = subset.load_font(str(source_path), options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=sorted(ord(c) for c in characters))
+    subsetter.subset(font)
+    subset.save_font(font, str(output_path), options)
+    font.close()
+    return output_path.stat().st_size
+
+def with_case_variants(characters):
+    """Add the other case of every character, for text-transform and small-caps."""
+    variants = set(characters)
+    for char in characters:
+        variants.update(char.upper())
+        variants.update(char.lower())
+    return variants
+
+def rewrite_references(file_path, replacements):
+    """Replace old font references with new ones in a text file; return True if it changed."""
+    content = file_path.read_text(encoding='utf-8')
+    updated = content
+    for old, new in replacements:
+        updated = updated.replace(old, new)
+    if updated != content:
+        file_path.write_text(updated, encoding='utf-8')
+        return True
+    return False
+
+def main():
+    parser = argparse.ArgumentParser(description="Subset the embedded fonts to the characters the book uses.")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="number of worker processes")
+    args = parser.parse_args()
+
+    print("🔤 FONT SUBSETTING")
+    print("=" * 70)
+
+    documents = read_spine(OPF_FILE)
+    faces = parse_faces(FONTS_CSS)
+    if not faces:
+        print(f"❌ No @font-face rules found in {FONTS_CSS}")
+        return False
+
+    used, generated = collect_face_characters(documents, faces)
+    print(f"📖 Scanned {len(documents)} spine documents for {len(faces)} font faces")
+
+    jobs = []
+    for face in faces:
+        source_path = source_font(face['path'])
+        if not source_path.exists():
+            print(f"❌ Source font not found: {source_path}")
+            return False
+        output_path = source_path.with_name(source_path.stem + SUBSET_SUFFIX + source_path.suffix)
+        characters = with_case_variants(used[face['path']]) | PRINTABLE_ASCII | generated
+        jobs.append((face, source_path, output_path, characters))
+
+    total_before = 0
+    total_after = 0
+    css_replacements = []
+    opf_replacements = []
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [executor.submit(subset_font, source_path, output_path, characters)
+                   for _, source_path, output_path, characters in jobs]
+        for (face, source_path, output_path, characters), future in zip(jobs, futures):
+            before = source_path.stat().st_size
+            after = future.result()
+            total_before += before
+            total_after += after
+            print(f"✅ {source_path.name}: {len(used[face['path']])} used characters, "
+                  f"{before:,} → {after:,} bytes")
+
+            new_url = face['url'].rsplit('/', 1)[0] + '/' + output_path.name if '/' in face['url'] else output_path.name
+            css_replacements.append((face['url'], new_url))
+            for old_name in (source_path.name, face['path'].name):
+                opf_replacements.append((f'href="fonts/{old_name}"', f'href="fonts/{output_path.name}"'))
+
+    if rewrite_references(FONTS_CSS, css_replacements):
+        print(f"📝 Updated {FONTS_CSS.name}")
+    if rewrite_references(OPF_FILE, opf_replacements):
+        print(f"📝 Updated {OPF_FILE.name}")
+
+    print("=" * 70)
+    print(f"📊 {len(jobs)} fonts: {total_before:,} → {total_after:,} bytes "
+          f"(saved {total_before - total_after:,})")
+    return True
+
+if __name__ == "__main__":
+    try:
+        success = main()
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"💥 Font subsetting error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -3,64 +3,115 @@
 Comprehensive Validation of All Processed Files
 Validates content preservation and ACISS compliance for all 20 files.
 """
+import argparse
 import glob
+import os
 import sys
-import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-def validate_file_content(input_file, output_file):
-    """Validate content preservation using the validation script."""
+sys.path.insert(0, "/root/repo/epub-processing")
+from build_cache import BuildCache, script_version
+from preservation_manifest import PreservationManifest
+from run_log import NULL_RUN_LOG, add_log_arguments, open_run_log
+from script_loader import SCRIPT_DIR, load_script
+from stage_profiler import NULL_PROFILER, StageProfiler, default_profile_output, profile_call
+
+validate_content = load_script("validate-content.py")
+
+VALIDATOR_VERSION = script_version(__file__, SCRIPT_DIR / "validate-content.py",
+                                   SCRIPT_DIR / "preservation_manifest.py")
+
+MANIFEST = PreservationManifest()
+
+def read_file(path):
+    """Read a file once, returning (content, error message)."""
     try:
-        result = subprocess.run([
-            "python3", "/root/repo/epub-processing/validate-content.py",
-            str(input_file), str(output_file)
-        ], capture_output=True, text=True)
-        
-        return result.returncode == 0, result.stdout.strip()
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read(), None
     except Exception as e:
-        return False, f"Validation error: {e}"
+        return "", f"Error reading {path}: {e}"
 
-def check_aciss_compliance(output_file):
-    """Check if file follows ACISS structure requirements."""
+def validate_file_content(input_file, output_file, input_content, output_content):
+    """Validate content preservation using the validate-content.py comparison."""
     try:
-        with open(output_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        issues = []
-        
-        # Check for required ACISS elements
-        required_elements = [
-            ('chapter-number-brush', 'Roman numeral with brushstroke'),
-            ('brushstroke-img', 'Brushstroke background image'),
-            ('title-stack', 'Vertical title stack'),
-            ('title-bar', 'Accent bar beside title'),
-            ('title-line', 'Individual title lines'),
-            ('bible-quote-container', 'Bible quote container'),
-            ('page-break', 'Page break elements'),
-        ]
-        
-        for element_class, description in required_elements:
-            if element_class not in content:
-                issues.append(f"Missing {description} ({element_class})")
-        
-        # Check for proper 6-page structure comments
-        required_comments = [
-            'PAGE 1: TITLE PAGE',
-            'PAGES 2-4: BODY CONTENT',
-            'PAGE 5: ENDNOTES',
-            'PAGE 6: QUIZ & WORKSHEET'
-        ]
-        
-        for comment in required_comments:
-            if comment not in content:
-                issues.append(f"Missing page structure comment: {comment}")
-        
-        return len(issues) == 0, issues
-        
+        if input_content:
+            # Hash the output against the input's stored fingerprint
+            preserved, messages = validate_content.check_preservation(
+                MANIFEST, input_file, output_file, output_content, input_content
+            )
+        else:
+            # Empty or unreadable inputs get the full comparison for its warnings
+            original_text = validate_content.normalize_text_content(input_content)
+            processed_text = validate_content.normalize_text_content(output_content)
+            preserved, messages = validate_content.compare_text_content(
+                original_text, processed_text, input_file, output_file
+            )
+        return preserved, "\n".join(messages)
     except Exception as e:
-        return False, [f"File read error: {e}"]
+        return False, f"Validation error: {e}"
 
-def main():
+def check_aciss_compliance(content):
+    """Check if file content follows ACISS structure requirements."""
+    issues = []
+    
+    # Check for required ACISS elements
+    required_elements = [
+        ('chapter-number-brush', 'Roman numeral with brushstroke'),
+        ('brushstroke-img', 'Brushstroke background image'),
+        ('title-stack', 'Vertical title stack'),
+        ('title-bar', 'Accent bar beside title'),
+        ('title-line', 'Individual title lines'),
+        ('bible-quote-container', 'Bible quote container'),
+        ('page-break', 'Page break elements'),
+    ]
+    
+    for element_class, description in required_elements:
+        if element_class not in content:
+            issues.append(f"Missing {description} ({element_class})")
+    
+    # Check for proper 6-page structure comments
+    required_comments = [
+        'PAGE 1: TITLE PAGE',
+        'PAGES 2-4: BODY CONTENT',
+        'PAGE 5: ENDNOTES',
+        'PAGE 6: QUIZ & WORKSHEET'
+    ]
+    
+    for comment in required_comments:
+        if comment not in content:
+            issues.append(f"Missing page structure comment: {comment}")
+    
+    return len(issues) == 0, issues
+
+def validate_pair(input_path, output_path, profile=NULL_PROFILER, stats=None):
+    """Read an input/output pair once and run every check on it; character counts go into stats if given."""
+    if not output_path.exists():
+        return None
+    timer = profile.timer(input_path.name)
+    
+    input_content, input_error = read_file(input_path)
+    output_content, output_error = read_file(output_path)
+    timer.lap('read')
+    if stats is not None:
+        stats.update(input_chars=len(input_content), output_chars=len(output_content))
+    
+    content_ok, content_msg = validate_file_content(input_path, output_path, input_content, output_content)
+    timer.lap('preserve')
+    for error in (input_error, output_error):
+        if error:
+            content_msg = f"{error}\n{content_msg}"
+    
+    if output_error:
+        aciss_ok, aciss_issues = False, [f"File read error: {output_error}"]
+    else:
+        aciss_ok, aciss_issues = check_aciss_compliance(output_content)
+    timer.lap('validate')
+    
+    return content_ok, content_msg, aciss_ok, aciss_issues
+
+def main(jobs=None, force=False, profile=NULL_PROFILER, profile_file=None, profile_output=None, run_log=NULL_RUN_LOG):
     """Run comprehensive validation on all processed files."""
     input_dir = Path("/root/repo/epub-processing/input")
     output_dir = Path("/root/repo/epub-processing/output")
@@ -79,20 +130,60 @@ def main():
     
     validation_details = []
     
-    for input_file in all_files:
-        input_path = Path(input_file)
-        output_path = output_dir / input_path.name
-        
+    # Reuse results for pairs whose input and output are both unchanged
+    cache = BuildCache(force=force)
+    pairs = [(Path(f), output_dir / Path(f).name) for f in all_files]
+    results = [
+        cache.lookup('validate', input_path.name, VALIDATOR_VERSION, [input_path, output_path], output_path)
+        for input_path, output_path in pairs
+    ]
+    stale = [i for i, result in enumerate(results) if result is None]
+    
+    stats = [{} for _ in pairs]
+    
+    def check(i):
+        input_path, output_path = pairs[i]
+        start = time.perf_counter()
+        if input_path.name == profile_file:
+            result = profile_call(profile_output or default_profile_output(input_path.name),
+                                  validate_pair, input_path, output_path, profile, stats[i])
+        else:
+            result = validate_pair(input_path, output_path, profile, stats[i])
+        stats[i]['elapsed'] = time.perf_counter() - start
+        return result
+    
+    # Check the remaining pairs concurrently; results come back in file order for the report
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for i, result in zip(stale, executor.map(check, stale)):
+            results[i] = result
+            if result is not None:
+                input_path, output_path = pairs[i]
+                cache.record('validate', input_path.name, VALIDATOR_VERSION,
+                             [input_path, output_path], output_path, list(result))
+    cache.save()
+    MANIFEST.save()
+    
+    for (input_path, output_path), result, file_stats in zip(pairs, results, stats):
         print(f"📄 {input_path.name}")
         
         # Check if output file exists
-        if not output_path.exists():
+        if result is None:
             print(f"   ❌ Output file missing")
             validation_details.append((input_path.name, False, False, ["Output file not found"]))
+            run_log.file(input_path, None, 'missing', elapsed=file_stats.get('elapsed'),
+                         reason="Output file not found")
             continue
         
+        content_ok, content_msg, aciss_ok, aciss_issues = result
+        failures = []
+        if not content_ok:
+            failures.append("content preservation")
+        if not aciss_ok:
+            failures.append(f"{len(aciss_issues)} ACISS issues")
+        run_log.file(input_path, output_path, 'failed' if failures else 'passed', elapsed=file_stats.get('elapsed'),
+                     reason=", ".join(failures), cached='elapsed' not in file_stats, stats=file_stats)
+        
         # Validate content preservation
-        content_ok, content_msg = validate_file_content(input_path, output_path)
         if content_ok:
             print(f"   ✅ Content preservation: PASSED")
             content_preserved += 1
@@ -100,7 +191,6 @@ def main():
             print(f"   ⚠️  Content preservation: {content_msg}")
         
         # Check ACISS compliance
-        aciss_ok, aciss_issues = check_aciss_compliance(output_path)
         if aciss_ok:
             print(f"   ✅ ACISS compliance: PASSED")
             aciss_compliant += 1
@@ -155,11 +245,39 @@ def main():
     print(f"   📖 Chapters: {len(chapters)}")
     print(f"   📑 Part dividers: {len(parts)}")
     
+    run_log.summary(content_preserved=content_preserved, aciss_compliant=aciss_compliant,
+                    overall_success=overall_success)
     return overall_success
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Validate all processed files.")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count(),
+                        help="number of files checked concurrently (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="ignore the build cache and recheck every file")
+    parser.add_argument("--profile", action="store_true",
+                        help="time each stage of every file and print the slowest (implies --force and --jobs 1)")
+    parser.add_argument("--profile-file", metavar="NAME", help="also profile the checks of this file with cProfile")
+    parser.add_argument("--profile-output", metavar="PATH",
+                        help="where --profile-file writes: .prof for cProfile, .folded for flamegraph stacks "
+                             "(default: profiles/<name>.prof)")
+    add_log_arguments(parser)
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
     try:
-        success = main()
+        # Timings of threads sharing the interpreter lock would overlap, so profiling runs one file at a time
+        profiling = args.profile or args.profile_file
+        profile = StageProfiler() if profiling else NULL_PROFILER
+        success = main(jobs=1 if profiling else args.jobs, force=args.force or bool(profiling), profile=profile,
+                       profile_file=args.profile_file, profile_output=args.profile_output,
+                       run_log=open_run_log("validate-all", args.log, not args.no_log))
+        if profiling:
+            print()
+            for line in profile.report():
+                print(line)
+        if args.profile_file:
+            print(f"🔬 Profile of {args.profile_file}: {args.profile_output or default_profile_output(args.profile_file)}")
         sys.exit(0 if success else 1)
     except Exception as e:
         print(f"💥 Validation error: {e}")
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Watch Mode for the EPUB Build
+Re-transforms and re-validates a single input file when it is saved, publishes it to
+Complete/OEBPS and reloads a local preview of the book.
+"""
+import argparse
+import ctypes
+import ctypes.util
+import fnmatch
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, "/root/repo/epub-processing")
+from output_writer import write_if_changed
+from script_loader import load_script
+
+process_all_chapters = load_script("process-all-chapters.py")
+validate_all = load_script("validate-all.py", Path(__file__).resolve().parent)
+
+INPUT_DIR = Path("/root/repo/epub-processing/input")
+OUTPUT_DIR = Path("/root/repo/epub-processing/output")
+OEBPS_DIR = Path("/root/repo/Complete/OEBPS")
+PUBLISH_DIR = OEBPS_DIR / "text"
+
+# inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct('iIII')
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE
+
+# Editors often save with several writes and a rename; events this close together are one save
+DEBOUNCE_SECONDS = 0.03
+
+SSE_KEEPALIVE_SECONDS = 15
+
+RELOAD_SCRIPT = b"""(function () {
+  var source = new EventSource('/__events');
+  source.addEventListener('css', function () {
+    var links = document.querySelectorAll('link[rel~="stylesheet"]');
+    for (var i = 0; i < links.length; i++) {
+      var href = links[i].getAttribute('href').split('?')[0];
+      links[i].setAttribute('href', href + '?v=' + Date.now());
+    }
+  });
+  source.addEventListener('reload', function (event) {
+    if (event.data === '*' || location.pathname === '/' + event.data) {
+      location.reload();
+    }
+  });
+})();
+"""
+RELOAD_TAG = b'<script type="text/javascript" src="/__reload.js"></script>'
+
+def is_ignored(name):
+    """Editor swap files, backups and our own temporary files."""
+    return name.startswith('.') or name.endswith(('~', '.swp', '.swx', '.tmp'))
+
+class InotifyWatcher:
+    """Minimal inotify binding over ctypes, watching a fixed set of folders."""
+
+    def __init__(self, directories):
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError("libc not found; watch mode needs Linux inotify")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, 'inotify_init1'):
+            raise OSError("inotify is not available on this platform")
+
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self.directories = {}
+        for directory in directories:
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"Cannot watch {directory}")
+            self.directories[wd] = Path(directory)
+
+    def read(self, timeout=None):
+        """Wait for events and return the changed file paths; None if the event queue overflowed."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+
+        paths = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', 'surrogateescape')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if mask & IN_ISDIR or not name or is_ignored(name) or wd not in self.directories:
+                continue
+            paths.append(self.directories[wd] / name)
+        return paths
+
+    def wait(self):
+        """Block until something changes, then collect the rest of the burst."""
+        changed = self.read()
+        if changed is None:
+            return None
+        while True:
+            more = self.read(DEBOUNCE_SECONDS)
+            if more is None:
+                return None
+            if not more:
+                break
+            changed.extend(more)
+        return list(dict.fromkeys(changed))
+
+    def close(self):
+        os.close(self.fd)
+
+class PreviewHandler(SimpleHTTPRequestHandler):
+    """Serves Complete/OEBPS with a reload script injected into every page."""
+
+    extensions_map = {**SimpleHTTPRequestHandler.extensions_map,
+                      '.xhtml': 'application/xhtml+xml', '.css': 'text/css',
+                      '.woff2': 'font/woff2', '.ttf': 'font/ttf', '.otf': 'font/otf'}
+
+    def end_headers(self):
+        self.send_header('Cache-Control', 'no-store')
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/__events':
+            self.send_events()
+        elif path == '/__reload.js':
+            self.send_body(RELOAD_SCRIPT, 'text/javascript')
+        elif path == '/':
+            self.send_index()
+        elif path.endswith(('.xhtml', '.html')):
+            self.send_page(path)
+        else:
+            super().do_GET()
+
+    def send_body(self, body, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_page(self, path):
+        file_path = Path(self.translate_path(path))
+        try:
+            body = file_path.read_bytes()
+        except OSError:
+            self.send_error(404)
+            return
+        position = body.rfind(b'</body>')
+        if position >= 0:
+            body = body[:position] + RELOAD_TAG + body[position:]
+        content_type = 'application/xhtml+xml' if path.endswith('.xhtml') else 'text/html'
+        self.send_body(body, content_type)
+
+    def send_index(self):
+        links = ''.join(f'<li><a href="/text/{p.name}">{p.name}</a></li>\n'
+                        for p in sorted(PUBLISH_DIR.glob('*.xhtml')))
+        body = ('<!DOCTYPE html>\n<html><head><meta charset="utf-8"/><title>Preview</title></head>'
+                f'<body><h1>Complete/OEBPS</h1>\n<ul>\n{links}</ul>\n</body></html>\n').encode('utf-8')
+        body = body.replace(b'</body>', RELOAD_TAG + b'</body>')
+        self.send_body(body, 'text/html; charset=utf-8')
+
+    def send_events(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        events = self.server.preview.subscribe()
+        try:
+            self.wfile.write(b': connected\n\n')
+            self.wfile.flush()
+            while True:
+                try:
+                    event, data = events.get(timeout=SSE_KEEPALIVE_SECONDS)
+                    message = f"event: {event}\ndata: {data}\n\n"
+                except queue.Empty:
+                    message = ": keepalive\n\n"
+                self.wfile.write(message.encode('utf-8'))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.server.preview.unsubscribe(events)
+
+class PreviewServer:
+    """HTTP preview of Complete/OEBPS that pushes reloads over server-sent events."""
+
+    def __init__(self, root, host, port):
+        self.clients = set()
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), partial(PreviewHandler, directory=str(root)))
+        self.httpd.daemon_threads = True
+        self.httpd.preview = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def subscribe(self):
+        events = queue.Queue()
+        with self.lock:
+            self.clients.add(events)
+        return events
+
+    def unsubscribe(self, events):
+        with self.lock:
+            self.clients.discard(events)
+
+    def broadcast(self, event, data):
+        """Send an event to every open page; returns the number of pages notified."""
+        with self.lock:
+            clients = list(self.clients)
+        for events in clients:
+            events.put((event, data))
+        return len(clients)
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def classify(name):
+    """The processor kind of an input file name, or None if no transformer handles it."""
+    for kind, (pattern, _, _) in process_all_chapters.PROCESSORS.items():
+        if fnmatch.fnmatch(name, pattern):
+            return kind
+    return None
+
+def publish(output_path, own_writes):
+    """Copy a transformed file into Complete/OEBPS/text if it differs; return True if written."""
+    target = PUBLISH_DIR / output_path.name
+    # Recorded before the write so the watcher never mistakes it for an edit
+    own_writes.add(target)
+    if write_if_changed(target, output_path.read_bytes()):
+        return True
+    own_writes.discard(target)
+    return False
+
+def rebuild_input(input_path, preview, own_writes, publish_output=True):
+    """Transform, validate and publish one changed input file."""
+    kind = classify(input_path.name)
+    if kind is None:
+        return
+    if not input_path.exists():
+        print(f"🗑️  {input_path.name} removed; its output is left in place")
+        return
+
+    started = time.perf_counter()
+    print(f"\n🔄 {input_path.name} changed")
+    _, script_name, function_name = process_all_chapters.PROCESSORS[kind]
+    process = getattr(load_script(script_name), function_name)
+    output_path = OUTPUT_DIR / input_path.name
+
+    try:
+        if kind == 'chapter':
+            process(str(input_path), str(output_path), validate_all.MANIFEST)
+        else:
+            process(str(input_path), str(output_path))
+    except Exception as e:
+        print(f"❌ Transform failed: {e}")
+        return
+
+    result = validate_all.validate_pair(input_path, output_path)
+    validate_all.MANIFEST.save()
+    if result is None:
+        print(f"❌ No output written for {input_path.name}")
+        return
+    content_ok, content_msg, aciss_ok, aciss_issues = result
+    if content_ok:
+        print("✅ Content preservation: PASSED")
+    else:
+        print("⚠️  Content preservation: ISSUES")
+        for line in content_msg.splitlines():
+            print(f"   {line}")
+    if aciss_ok:
+        print("✅ ACISS compliance: PASSED")
+    else:
+        print(f"⚠️  ACISS compliance: {len(aciss_issues)} issues")
+        for issue in aciss_issues:
+            print(f"   - {issue}")
+
+    if publish_output:
+        if publish(output_path, own_writes):
+            pages = preview.broadcast('reload', f"text/{output_path.name}") if preview else 0
+            print(f"📤 Published to Complete/OEBPS/text ({pages} preview pages reloaded)")
+        else:
+            print("📤 Published copy already up to date")
+    print(f"⏱️  {(time.perf_counter() - started) * 1000:.0f} ms from save to preview")
+
+def refresh_package(path, preview):
+    """Push a changed stylesheet, page or asset of the package to the preview."""
+    relative = path.relative_to(OEBPS_DIR).as_posix()
+    if preview is None:
+        return
+    if path.suffix == '.css':
+        preview.broadcast('css', relative)
+    elif path.suffix in ('.xhtml', '.html'):
+        preview.broadcast('reload', relative)
+    else:
+        preview.broadcast('reload', '*')
+    print(f"🔄 {relative} changed; preview updated")
+
+def watched_directories():
+    directories = [INPUT_DIR, OEBPS_DIR]
+    directories.extend(sorted(p for p in OEBPS_DIR.iterdir() if p.is_dir() and not p.name.startswith('.')))
+    return directories
+
+def main(host="127.0.0.1", port=8000, serve=True, publish_output=True):
+    """Watch input/ and Complete/OEBPS until interrupted."""
+    print("👀 EPUB WATCH MODE")
+    print("=" * 50)
+
+    try:
+        watcher = InotifyWatcher(watched_directories())
+    except OSError as e:
+        print(f"❌ Cannot start watching: {e}")
+        return False
+
+    # Import the transformers up front so the first save is as fast as the rest
+    for _, script_name, _ in process_all_chapters.PROCESSORS.values():
+        load_script(script_name)
+
+    preview = None
+    if serve:
+        preview = PreviewServer(OEBPS_DIR, host, port)
+        preview.start()
+        print(f"🌐 Preview: http://{host}:{port}/")
+    for directory in watcher.directories.values():
+        print(f"📁 Watching {directory}")
+    print("Press Ctrl+C to stop")
+
+    # Files this process published, so their own events do not trigger another reload
+    own_writes = set()
+    try:
+        while True:
+            changed = watcher.wait()
+            if changed is None:
+                print("⚠️  Too many changes at once; run process-all.sh to catch up")
+                continue
+            for path in changed:
+                if path in own_writes:
+                    own_writes.discard(path)
+                elif path.parent == INPUT_DIR:
+                    rebuild_input(path, preview, own_writes, publish_output)
+                elif path.exists():
+                    refresh_package(path, preview)
+    except KeyboardInterrupt:
+        print("\n👋 Watch mode stopped")
+    finally:
+        watcher.close()
+        if preview:
+            preview.stop()
+    return True
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Rebuild and preview the EPUB as files change.")
+    parser.add_argument("--host", default="127.0.0.1", help="preview server address (default: 127.0.0.1)")
+    parser.add_argument("--port", "-p", type=int, default=8000, help="preview server port (default: 8000)")
+    parser.add_argument("--no-serve", action="store_true", help="rebuild and validate without the preview server")
+    parser.add_argument("--no-publish", action="store_true",
+                        help="leave Complete/OEBPS/text untouched; outputs stay in epub-processing/output")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    try:
+        args = parse_args()
+        success = main(host=args.host, port=args.port, serve=not args.no_serve,
+                       publish_output=not args.no_publish)
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"💥 Watch mode error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)